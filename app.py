@@ -2,31 +2,73 @@ from functools import partial
 import sys
 import os
 import re
+import json
 from PyQt5 import QtWidgets, QtGui, QtCore
 
 from libs import parser, htmlrenderer, jsonrenderer
 from layout import Ui_mainWindow
+from preview import PreviewWorker, PreviewRequest, PreviewScheduler, PREVIEW_PAGE, VIRTUALIZED_PREVIEW_SIZE, diffFragments, mergeEdits
+from textstats import TextStatistics
+from fileloader import FileLoader
 
 __version__ = "0.1.1"
 
+VISIBLE_LINES_UPDATE_DELAY = 50 # milliseconds; after scrolling the editor, the preview is told about the lines now visible once the scrolling has paused for this long
+LARGE_FILE_SIZE = 1048576 # bytes; larger files are read in the background & shown while they are being read (see fileloader.py)
+
+PLAIN_TEXT_REPLACEMENTS = str.maketrans({"\u2029": "\n", "\u2028": "\n", "\ufdd0": "\n", "\ufdd1": "\n", "\u00a0": " "})
+
 class MainWindow(QtWidgets.QMainWindow, Ui_mainWindow):
     def __init__(self, *args, obj=None, **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
         self.setupUi(self)
         
-        self.text = self.textEdit.toPlainText()
         self.current_open_file = "untitled"
-
-        self.parser = parser.Parser()
-        self.htmlRenderer = htmlrenderer.HTMLRenderer({"indent": 4, "include_html_backbone": True, "css_styling": ""})
-        self.ast = None
+        self.fileLoader: FileLoader = None # of the large file that is being opened
+        self.loadingProgressDialog: QtWidgets.QProgressDialog = None
+
+        self.htmlRenderer = htmlrenderer.HTMLRenderer({"indent": 4, "include_html_backbone": True, "css_styling": ""}) # for the exports; the preview is rendered by the PreviewWorker
+        self.pending_edit = None # (position, chars removed, chars added) covering the edits since the last update of the preview; lets the parser re-parse only the affected blocks
+        self.submitted_length: int = None # length of the text as of the last request to the PreviewWorker; None: the worker has not got the text yet
+
+        # the preview is parsed & rendered in a background thread (see preview.py); every edit increases the generation, and only the HTML of the latest one is shown
+        self.preview_generation = 0
+        self.previewThread = QtCore.QThread(self)
+        self.previewWorker = PreviewWorker()
+        self.previewWorker.moveToThread(self.previewThread)
+        self.previewWorker.rendered.connect(self.handlePreviewRendered)
+        self.previewWorker.failed.connect(self.handlePreviewFailed)
+        self.previewThread.start()
+
+        # edits are collected until the user stops typing for a moment (see PreviewScheduler), then handleInputChange() takes them on at once
+        self.previewScheduler = PreviewScheduler(self.handleInputChange, self)
+
+        # a virtualized preview renders only the blocks around the lines visible in the editor; scrolling the editor lets it render the blocks that come into view
+        self.visibleLinesTimer = QtCore.QTimer(self)
+        self.visibleLinesTimer.setSingleShot(True)
+        self.visibleLinesTimer.timeout.connect(self.submitVisibleLines)
+        self.textEdit.verticalScrollBar().valueChanged.connect(self.handleEditorScrolled)
+
+        # the web view loads PREVIEW_PAGE once & is patched block by block from then on
+        self.preview_fragments: list[str] = [] # HTML of the top-level blocks the page currently shows
+        self.latest_fragments: list[str] = [] # HTML of the top-level blocks of the latest generation
+        self.preview_page_ready = False # whether the page that is loaded is PREVIEW_PAGE (and not e.g. a link that has been followed in the preview)
+        self.preview_page_loading = False
+        self.preview_anchor_block = -1 # the block the virtualized preview has last been scrolled to (see preview.py)
+        self.webEngineView.loadStarted.connect(self.handlePreviewLoadStarted)
+        self.webEngineView.loadFinished.connect(self.handlePreviewLoadFinished)
+        self.loadPreviewPage()
 
         self.STYLESHEET_PATHS = {
             "GitHub": os.path.join(os.getcwd(), "stylesheets", "github-markdown.css"),
             "Foghorn": os.path.join(os.getcwd(), "stylesheets", "foghorn.css")
         }
 
-        self.textEdit.textChanged.connect(self.handleInputChange)
+        # the counts of the status bar are updated incrementally (see textstats.py)
+        self.textStatistics = TextStatistics(self.textEdit.document())
+        self.textEdit.document().contentsChange.connect(self.textStatistics.update)
+        self.textEdit.document().contentsChange.connect(self.handleContentsChange)
+        self.textEdit.textChanged.connect(self.handleTextChanged)
 
         self.actionSave.triggered.connect(self.menubar_save_clicked)
         self.actionSave_as.triggered.connect(self.menubar_save_as_clicked)
@@ -61,20 +103,130 @@ class MainWindow(QtWidgets.QMainWindow, Ui_mainWindow):
         self.splitter.setStretchFactor(1, 2)
         
 
+    def handleContentsChange(self, position: int, chars_removed: int, chars_added: int):
+        if self.pending_edit is None:
+            self.pending_edit = (position, chars_removed, chars_added)
+        else:
+            self.pending_edit = mergeEdits(self.pending_edit, (position, chars_removed, chars_added))
+
+    def handleTextChanged(self):
+        self.setWindowTitle(f"JAME: just another Markdown editor — {self.current_open_file}*")
+        self.updateLineNumbers()
+        self.previewScheduler.schedule()
+
+    # Hands the edits since the last update to the PreviewWorker: only the text they have inserted, if their range can be trusted, the whole text otherwise
     def handleInputChange(self):
-        self.text = self.textEdit.toPlainText()
+        document = self.textEdit.document()
+        text_length = document.characterCount() - 1 # without the final paragraph separator
+
+        self.preview_generation += 1
+        edit = self.pending_edit
+        # Qt reports some edits (e.g. setText()) including the final paragraph separator; only trust ranges that add up
+        if edit is not None and self.submitted_length is not None and self.submitted_length - edit[1] + edit[2] == text_length and edit[0] + edit[2] <= text_length:
+            position, chars_removed, chars_added = edit
+            self.previewWorker.submit(PreviewRequest(self.preview_generation, edit=(position, chars_removed, self.getDocumentText(position, position + chars_added)), visible_lines=self.getVisibleLines()))
+        else:
+            self.previewWorker.submit(PreviewRequest(self.preview_generation, text=document.toPlainText(), visible_lines=self.getVisibleLines()))
 
-        self.ast = self.parser.parse(self.text)
-        html_string = self.htmlRenderer.render(self.ast)
+        self.pending_edit = None
+        self.submitted_length = text_length
 
-        self.webEngineView.setHtml(html_string)
-        self.updateLineNumbers()
-        self.setWindowTitle(f"JAME: just another Markdown editor — {self.current_open_file}*")
+    def getVisibleLines(self):
+        viewport = self.textEdit.viewport()
+        first_line = self.textEdit.cursorForPosition(QtCore.QPoint(0, 0)).blockNumber()
+        last_line = self.textEdit.cursorForPosition(QtCore.QPoint(viewport.width() - 1, viewport.height() - 1)).blockNumber()
+
+        return first_line, last_line
+
+    def handleEditorScrolled(self, value: int):
+        if self.textEdit.document().characterCount() >= VIRTUALIZED_PREVIEW_SIZE: # only a virtualized preview depends on the visible lines
+            self.visibleLinesTimer.start(VISIBLE_LINES_UPDATE_DELAY)
+
+    def submitVisibleLines(self):
+        if self.submitted_length is None: # the worker has not got the text yet; the visible lines come with it
+            return
+
+        self.preview_generation += 1
+        self.previewWorker.submit(PreviewRequest(self.preview_generation, visible_lines=self.getVisibleLines()))
+
+    # The text between two positions of the document, just like toPlainText() would have it
+    def getDocumentText(self, start: int, end: int):
+        text_cursor = QtGui.QTextCursor(self.textEdit.document())
+        text_cursor.setPosition(start)
+        text_cursor.setPosition(end, QtGui.QTextCursor.MoveMode.KeepAnchor)
+
+        # selectedText() keeps the separators of paragraphs, lines & frames & non-breaking spaces, which toPlainText() replaces
+        return text_cursor.selectedText().translate(PLAIN_TEXT_REPLACEMENTS)
+
+    def handlePreviewRendered(self, generation: int, fragments: list[str], render_time: float, first_visible_block: int):
+        self.previewScheduler.recordRenderTime(render_time)
+        if generation != self.preview_generation: # the text has been edited again in the meantime; the HTML of that edit is on its way
+            return
+
+        self.latest_fragments = fragments
+        if self.preview_page_ready:
+            self.patchPreview()
+
+            # a virtualized preview follows the editor, as it shows little but placeholders anywhere else; it is only scrolled once the editor has been scrolled to another block, though, so that it can still be scrolled on its own while typing
+            if first_visible_block >= 0 and first_visible_block != self.preview_anchor_block:
+                self.webEngineView.page().runJavaScript(f"scrollToBlock({first_visible_block});")
+            self.preview_anchor_block = first_visible_block
+        elif not self.preview_page_loading:
+            self.loadPreviewPage()
+
+    def loadPreviewPage(self):
+        self.preview_page_ready = False
+        self.preview_page_loading = True
+        self.webEngineView.setHtml(PREVIEW_PAGE)
+
+    def handlePreviewLoadStarted(self):
+        self.preview_page_ready = False
+        self.preview_page_loading = True
+
+    def handlePreviewLoadFinished(self, ok: bool):
+        self.preview_page_loading = False
+        self.webEngineView.page().runJavaScript("typeof patchBlocks", self.handlePreviewPageChecked)
+
+    def handlePreviewPageChecked(self, result):
+        if result != "function": # a link in the preview has been followed; PREVIEW_PAGE is loaded again with the next edit
+            return
+
+        self.preview_page_ready = True
+        self.preview_fragments = [] # a freshly loaded page is empty
+        self.updatePreviewStyle()
+        self.patchPreview()
+
+    # Sends the blocks that differ between the page & the latest generation to the page
+    def patchPreview(self):
+        start, remove_count, inserted_fragments = diffFragments(self.preview_fragments, self.latest_fragments)
+        if not remove_count and not inserted_fragments:
+            return
+
+        self.webEngineView.page().runJavaScript(f"patchBlocks({start}, {remove_count}, {json.dumps(inserted_fragments)});")
+        self.preview_fragments = self.latest_fragments
+
+    def updatePreviewStyle(self):
+        if self.preview_page_ready: # otherwise, the style is set once the page has been loaded
+            self.webEngineView.page().runJavaScript(f"setStyle({json.dumps(self.htmlRenderer.options['css_styling'])});")
+
+    def handlePreviewFailed(self, generation: int, error_message: str):
+        if generation != self.preview_generation:
+            return
+
+        self.statusbar.showMessage(f"The preview could not be rendered ({error_message})")
+
+    def stopPreviewWorker(self): # waits for the worker to finish the request it is working on
+        self.previewThread.quit()
+        self.previewThread.wait()
+
+    def closeEvent(self, event: QtGui.QCloseEvent):
+        self.stopPreviewWorker()
+        super(MainWindow, self).closeEvent(event)
 
     def updateLineNumbers(self):
-        lines = len(self.text.splitlines())
-        words = len(self.text.split())
-        characters = len(self.text)
+        lines = self.textStatistics.lines
+        words = self.textStatistics.words
+        characters = self.textStatistics.characters
 
         self.statusbar.showMessage(f"{words} words (with {characters} characters) spanning {lines} lines.")
 
@@ -86,7 +238,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_mainWindow):
                 raw_css = stylesheet.read()
                 self.htmlRenderer.options["css_styling"] = raw_css
 
-        self.handleInputChange()
+        self.updatePreviewStyle()
 
     def insertMarkdown(self, what_to_insert: str):
         text_cursor = self.textEdit.textCursor()
@@ -130,7 +282,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_mainWindow):
             self.menubar_save_as_clicked()
         else:
             with open(self.current_open_file, "w") as file:
-                file.write(self.text)
+                file.write(self.textEdit.toPlainText())
 
             self.setWindowTitle(f"JAME: just another Markdown editor — {self.current_open_file}")
 
@@ -143,13 +295,13 @@ class MainWindow(QtWidgets.QMainWindow, Ui_mainWindow):
             file_name_to_save_to += ".md"
 
         with open(file_name_to_save_to, "w") as new_file:
-            new_file.write(self.text)
+            new_file.write(self.textEdit.toPlainText())
 
         self.current_open_file = file_name_to_save_to
         self.setWindowTitle(f"JAME: just another Markdown editor — {self.current_open_file}")
 
     def menubar_new_clicked(self):
-        if len(self.text) == 0: # nothing has been typed yet; hence trying to open a new file would be unnecessary
+        if self.textEdit.document().isEmpty(): # nothing has been typed yet; hence trying to open a new file would be unnecessary
             pass
         else:
             save_dialog = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Icon.Question, "Save or discard changes", "Do you want to save the current document before opening a new one?", QtWidgets.QMessageBox.StandardButton.Save | QtWidgets.QMessageBox.StandardButton.Discard | QtWidgets.QMessageBox.StandardButton.Cancel)
@@ -170,14 +322,10 @@ class MainWindow(QtWidgets.QMainWindow, Ui_mainWindow):
                     pass
 
     def menubar_open_clicked(self):
-        if len(self.text) == 0: # nothing has been typed yet; hence we can just open the user requested file without needing to save any edits
+        if self.textEdit.document().isEmpty(): # nothing has been typed yet; hence we can just open the user requested file without needing to save any edits
             file_name_to_open, filter_chosen = QtWidgets.QFileDialog.getOpenFileName(self, "Open a Markdown file", os.getcwd(), "Markdown files (*.md);;Text files (*.txt)", "Markdown files (*.md)")
 
-            with open(file_name_to_open, "r") as file_to_open:
-                self.textEdit.setText(file_to_open.read())
-
-            self.current_open_file = file_name_to_open
-            self.setWindowTitle(f"JAME: just another Markdown editor — {self.current_open_file}")
+            self.openFile(file_name_to_open)
         else:
             save_dialog = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Icon.Question, "Save or discard changes", "Do you want to save the current document before opening another one?", QtWidgets.QMessageBox.StandardButton.Save | QtWidgets.QMessageBox.StandardButton.Discard | QtWidgets.QMessageBox.StandardButton.Cancel)
             chosen_option = save_dialog.exec()
@@ -188,28 +336,97 @@ class MainWindow(QtWidgets.QMainWindow, Ui_mainWindow):
                     
                     file_name_to_open, filter_chosen = QtWidgets.QFileDialog.getOpenFileName(self, "Open a Markdown file", os.getcwd(), "Markdown files (*.md);;Text files (*.txt)", "Markdown files (*.md)")
 
-                    with open(file_name_to_open, "r") as file_to_open:
-                        self.textEdit.setText(file_to_open.read())
-
-                    self.current_open_file = file_name_to_open
-                    self.setWindowTitle(f"JAME: just another Markdown editor — {self.current_open_file}")
+                    self.openFile(file_name_to_open)
 
                 case QtWidgets.QMessageBox.StandardButton.Discard:
                     self.menubar_save_clicked()
                     
                     file_name_to_open, filter_chosen = QtWidgets.QFileDialog.getOpenFileName(self, "Open a Markdown file", os.getcwd(), "Markdown files (*.md);;Text files (*.txt)", "Markdown files (*.md)")
 
-                    with open(file_name_to_open, "r") as file_to_open:
-                        self.textEdit.setText(file_to_open.read())
-
-                    self.current_open_file = file_name_to_open
-                    self.setWindowTitle(f"JAME: just another Markdown editor — {self.current_open_file}")
+                    self.openFile(file_name_to_open)
                     
                 case QtWidgets.QMessageBox.StandardButton.Cancel:
                     pass
 
+    def openFile(self, file_name_to_open: str):
+        if not file_name_to_open: # User has chosen the "Cancel" option
+            return
+
+        if os.path.getsize(file_name_to_open) >= LARGE_FILE_SIZE:
+            self.openLargeFile(file_name_to_open)
+            return
+
+        with open(file_name_to_open, "r") as file_to_open:
+            self.textEdit.setText(file_to_open.read())
+
+        self.current_open_file = file_name_to_open
+        self.setWindowTitle(f"JAME: just another Markdown editor — {self.current_open_file}")
+
+    # Fills the editor chunk by chunk while a FileLoader reads the file in the background; the beginning of the file is shown (and previewed) right away, the preview catches up with the rest as it comes in
+    def openLargeFile(self, file_name_to_open: str):
+        self.textEdit.clear()
+        self.textEdit.document().setUndoRedoEnabled(False) # the chunks are not meant to be undone one by one; also clears the undo stack, just like setText() does
+
+        loader = FileLoader(file_name_to_open)
+        loader.chunkRead.connect(partial(self.handleChunkRead, loader))
+        loader.finished.connect(partial(self.handleFileLoaded, loader))
+        loader.failed.connect(partial(self.handleFileLoadFailed, loader))
+        self.fileLoader = loader
+
+        self.loadingProgressDialog = QtWidgets.QProgressDialog(f"Opening {file_name_to_open}", "Cancel", 0, os.path.getsize(file_name_to_open), self)
+        self.loadingProgressDialog.setWindowModality(QtCore.Qt.WindowModality.WindowModal) # no edits in between the chunks
+        self.loadingProgressDialog.setMinimumDuration(0)
+        self.loadingProgressDialog.canceled.connect(partial(self.cancelFileLoading, loader))
+
+        loader.start()
+
+    def handleChunkRead(self, loader: FileLoader, chunk: str, bytes_read: int):
+        if loader is not self.fileLoader: # the loading has been cancelled; this chunk was already on its way
+            return
+
+        text_cursor = QtGui.QTextCursor(self.textEdit.document())
+        text_cursor.movePosition(QtGui.QTextCursor.MoveOperation.End)
+        text_cursor.insertText(chunk)
+
+        self.loadingProgressDialog.setValue(min(bytes_read, self.loadingProgressDialog.maximum() - 1)) # the dialog would close itself once it reaches the maximum
+        loader.acknowledgeChunk()
+
+    def finishFileLoading(self):
+        self.fileLoader = None
+        self.loadingProgressDialog.reset()
+        self.loadingProgressDialog.deleteLater()
+        self.loadingProgressDialog = None
+        self.textEdit.document().setUndoRedoEnabled(True)
+
+    def handleFileLoaded(self, loader: FileLoader):
+        if loader is not self.fileLoader:
+            return
+
+        self.finishFileLoading()
+        self.current_open_file = loader.path
+        self.setWindowTitle(f"JAME: just another Markdown editor — {self.current_open_file}")
+
+    # A partly read file must not end up being saved in place of the whole one; hence the editor starts over with an empty, untitled document
+    def cancelFileLoading(self, loader: FileLoader):
+        if loader is not self.fileLoader:
+            return
+
+        loader.cancel()
+        self.finishFileLoading()
+        self.textEdit.clear()
+        self.current_open_file = "untitled"
+        self.setWindowTitle(f"JAME: just another Markdown editor — {self.current_open_file}")
+
+    def handleFileLoadFailed(self, loader: FileLoader, error_message: str):
+        if loader is not self.fileLoader:
+            return
+
+        self.cancelFileLoading(loader)
+        QtWidgets.QMessageBox.warning(self, "Could not open the file", f"{loader.path} could not be opened ({error_message})")
+
     def menubar_quit_clicked(self):
-        if len(self.text) == 0:
+        if self.textEdit.document().isEmpty():
+            self.stopPreviewWorker()
             sys.exit()
         else:
             save_dialog = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Icon.Question, "Save or discard changes", "Do you want to save the current document before quitting?", QtWidgets.QMessageBox.StandardButton.Save | QtWidgets.QMessageBox.StandardButton.Discard | QtWidgets.QMessageBox.StandardButton.Cancel)
@@ -218,9 +435,11 @@ class MainWindow(QtWidgets.QMainWindow, Ui_mainWindow):
             match chosen_option:
                 case QtWidgets.QMessageBox.StandardButton.Save:
                     self.menubar_save_clicked()
+                    self.stopPreviewWorker()
                     sys.exit()
 
                 case QtWidgets.QMessageBox.StandardButton.Discard:
+                    self.stopPreviewWorker()
                     sys.exit()
 
                 case QtWidgets.QMessageBox.StandardButton.Cancel:
@@ -237,13 +456,16 @@ class MainWindow(QtWidgets.QMainWindow, Ui_mainWindow):
         QtWidgets.QMessageBox.about(self, f"About JAME", about_string_with_version)
 
     # exporters
+    def parseForExport(self): # the document of the preview belongs to the PreviewWorker's thread (and may lag behind the text); exports parse the text on their own
+        return parser.Parser().parse(self.textEdit.toPlainText())
+
     def menubar_export_to_HTML_plain_clicked(self):
         file_name_to_save_to, filter_chosen = QtWidgets.QFileDialog.getSaveFileName(self, "Export to a file", os.getcwd() + "/untitled", "HTML files (*.html *.htm)")
         if not re.search(r'\.html$', file_name_to_save_to):
             file_name_to_save_to += ".html"
 
         with open(file_name_to_save_to, "w") as new_file:
-            new_file.write(self.htmlRenderer.renderWithoutStyling(self.ast))
+            new_file.write(self.htmlRenderer.renderWithoutStyling(self.parseForExport()))
 
     def menubar_export_to_HTML_styled_clicked(self):
         file_name_to_save_to, filter_chosen = QtWidgets.QFileDialog.getSaveFileName(self, "Export to a file", os.getcwd() + "/untitled", "HTML files (*.html *.htm)")
@@ -251,7 +473,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_mainWindow):
             file_name_to_save_to += ".html"
 
         with open(file_name_to_save_to, "w") as new_file:
-            new_file.write(self.htmlRenderer.render(self.ast))
+            new_file.write(self.htmlRenderer.render(self.parseForExport()))
 
     def menubar_export_to_JSON_clicked(self):
         file_name_to_save_to, filter_chosen = QtWidgets.QFileDialog.getSaveFileName(self, "Export to a file", os.getcwd() + "/untitled", "JSON files (*.json)")
@@ -260,7 +482,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_mainWindow):
 
         with open(file_name_to_save_to, "w") as new_file:
             json_renderer = jsonrenderer.JSONRenderer({"jsonIndent": 4, "debug_infos": False})
-            new_file.write(json_renderer.render(self.ast))
+            json_renderer.render_to(self.parseForExport(), new_file)
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
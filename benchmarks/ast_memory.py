@@ -0,0 +1,63 @@
+#!/bin/python3
+
+# Measures the peak memory (maximum resident set size) of parsing a large document into a tree of Nodes and into a NodeArena (Parser(arena=True)), and how long it takes to parse & render it either way
+# Every measurement runs in a fresh subprocess, as the peak RSS of a process never goes down again
+# Usage (from the root directory of this project): python -m benchmarks.ast_memory [number of repetitions of the sample document]
+import resource
+import subprocess
+import sys
+import time
+
+from libs.parser import Parser
+from libs.htmlrenderer import HTMLRenderer
+
+SAMPLE_DOCUMENT = """# A heading with *emphasis*
+
+Just a paragraph of text, with **strong emphasis**, `inline code` and [a link](https://example.com "title").
+It continues on a second line, with some _more_ emphasis.
+
+- a list item
+- another list item with `code`
+  - a nested item
+
+> a block quote with a [reference link][ref]
+> that spans two lines
+
+    indented code
+
+```python
+print("fenced code")
+```
+
+[ref]: https://example.com
+
+***
+
+"""
+
+def measure(mode: str, repetitions: int):
+    markdown_input = SAMPLE_DOCUMENT * repetitions
+    rss_before_parsing = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start_time = time.perf_counter()
+    document = Parser(arena=(mode == "arena")).parse(markdown_input)
+    parse_time = time.perf_counter() - start_time
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # in KiB (on Linux)
+
+    start_time = time.perf_counter()
+    HTMLRenderer().render(document)
+    render_time = time.perf_counter() - start_time
+
+    print(f"{mode:>5}: peak RSS {peak_rss / 1024:>8.1f} MiB (+{(peak_rss - rss_before_parsing) / 1024:.1f} MiB while parsing), parse {parse_time:.2f}s, render {render_time:.2f}s")
+
+if __name__ == "__main__":
+    repetitions = 2000
+    if len(sys.argv) > 1:
+        repetitions = int(sys.argv[1])
+
+    if len(sys.argv) > 2: # running as one of the subprocesses below
+        measure(sys.argv[2], repetitions)
+    else:
+        for mode in ["tree", "arena"]:
+            subprocess.run([sys.executable, "-m", "benchmarks.ast_memory", str(repetitions), mode], check=True)
@@ -0,0 +1,42 @@
+#!/bin/python3
+
+# Compares getting the AST of a large document by parsing it with loading it from a file written by libs.binary_ast.dump(), and rendering either of them
+# Usage (from the root directory of this project): python -m benchmarks.binary_ast [number of repetitions of the sample document]
+import os
+import sys
+import tempfile
+import time
+
+from libs.parser import Parser
+from libs.htmlrenderer import HTMLRenderer
+from libs.binary_ast import dump, load
+from benchmarks.ast_memory import SAMPLE_DOCUMENT
+
+def timed(function, *arguments):
+    start_time = time.perf_counter()
+    result = function(*arguments)
+    return result, time.perf_counter() - start_time
+
+if __name__ == "__main__":
+    repetitions = 2000
+    if len(sys.argv) > 1:
+        repetitions = int(sys.argv[1])
+
+    markdown_input = SAMPLE_DOCUMENT * repetitions
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "document.ast")
+
+        document, parse_time = timed(Parser().parse, markdown_input)
+        _, dump_time = timed(dump, document, path)
+        loaded_document, load_time = timed(load, path)
+
+        _, render_time = timed(HTMLRenderer().render, document)
+        _, loaded_render_time = timed(HTMLRenderer().render, loaded_document)
+
+        print(f"{len(markdown_input) / 1024:.0f} KiB of Markdown, {os.path.getsize(path) / 1024:.0f} KiB AST file")
+        print(f"parse {parse_time:.3f}s, dump {dump_time:.3f}s, load {load_time * 1000:.3f}ms ({parse_time / load_time:.0f}x faster than parsing)")
+        print(f"render parsed document {render_time:.3f}s, render loaded document {loaded_render_time:.3f}s")
+        print(f"parse + render {parse_time + render_time:.3f}s, load + render {load_time + loaded_render_time:.3f}s")
+
+        del loaded_document # releases the mapping of the file before the directory is removed
@@ -0,0 +1,100 @@
+#!/bin/python3
+
+# Compares how many lines per second can be classified by trying the block start patterns one after another (as openBlock() used to do) with the single combined BLOCK_START_RE, and how many lines per second the block parser handles as a whole
+# Usage (from the root directory of this project): python -m benchmarks.block_starts [number of lines]
+import re
+import sys
+import time
+
+from libs.parser import Parser
+from libs.regexps import *
+
+SAMPLE_LINES = [
+    "# A heading\n",
+    "\n",
+    "Just a line of paragraph text, as most lines in a document are.\n",
+    "And another one continuing the paragraph.\n",
+    "\n",
+    "Setext heading\n",
+    "==============\n",
+    "\n",
+    "- a list item\n",
+    "- another list item\n",
+    "\n",
+    "1. an ordered list item\n",
+    "\n",
+    "> a block quote\n",
+    "\n",
+    "    indented code\n",
+    "\n",
+    "```python\n",
+    "print(\"fenced code\")\n",
+    "```\n",
+    "\n",
+    "<div class=\"note\">\n",
+    "\n",
+    "***\n",
+    "\n"
+]
+
+def classifySequentially(line: str): # the chain of checks openBlock() performed for every line before BLOCK_START_RE existed
+    if re.search(ATX_HEADING, line):
+        return "atx_heading"
+    elif re.search(SETEXT_HEADING_UNDERLINE, line):
+        return "setext_heading_underline"
+    elif re.search(THEMATIC_BREAK, line):
+        return "thematic_break"
+    elif re.search(INDENTED_CODE_BLOCK, line):
+        return "indented_code_block"
+    elif re.search(FENCED_CODE_BLOCK_BEGINNING, line):
+        return "fenced_code_block"
+    elif re.search(re.compile(BLOCK_1_START, re.IGNORECASE), line):
+        return "html_block_1"
+    elif re.search(BLOCK_2_START, line):
+        return "html_block_2"
+    elif re.search(BLOCK_3_START, line):
+        return "html_block_3"
+    elif re.search(BLOCK_4_START, line):
+        return "html_block_4"
+    elif re.search(BLOCK_5_START, line):
+        return "html_block_5"
+    elif re.search(re.compile(BLOCK_6_START, re.IGNORECASE), line):
+        return "html_block_6"
+    elif re.search(BLOCK_7_START, line):
+        return "html_block_7"
+    elif re.search(BLOCK_QUOTE_MARKER, line):
+        return "block_quote"
+    elif re.search(BULLET_LIST_MARKER, line):
+        return "bullet_list"
+    elif re.search(ORDERED_LIST_MARKER, line):
+        return "ordered_list"
+    return None
+
+def classifyCombined(line: str):
+    block_start = BLOCK_START_RE.match(line)
+    if block_start:
+        return block_start.lastgroup
+    return None
+
+def linesPerSecond(function, lines: list[str]):
+    start_time = time.perf_counter()
+    for line in lines:
+        function(line)
+    return len(lines) / (time.perf_counter() - start_time)
+
+if __name__ == "__main__":
+    line_count = 100000
+    if len(sys.argv) > 1:
+        line_count = int(sys.argv[1])
+
+    lines = [SAMPLE_LINES[i % len(SAMPLE_LINES)] for i in range(line_count)]
+
+    for line in SAMPLE_LINES: # both ways of classifying a line have to agree
+        assert classifySequentially(line) == classifyCombined(line), line
+
+    print(f"sequential patterns (before): {linesPerSecond(classifySequentially, lines):>12,.0f} lines/s")
+    print(f"BLOCK_START_RE (after):       {linesPerSecond(classifyCombined, lines):>12,.0f} lines/s")
+
+    start_time = time.perf_counter()
+    Parser().parse("".join(lines))
+    print(f"Parser.parse:                 {line_count / (time.perf_counter() - start_time):>12,.0f} lines/s")
@@ -0,0 +1,138 @@
+# Generators for the synthetic documents of the benchmark suite (see suite.py). Every generator takes the approximate size of the document in characters & a random number generator (so that the same seed always gives the same document), and returns the Markdown input
+import random
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod", "tempor", "incididunt", "ut", "labore", "et", "dolore", "magna", "aliqua", "enim", "ad", "minim", "veniam", "quis", "nostrud", "exercitation", "ullamco", "laboris", "nisi", "aliquip", "ex", "ea", "commodo", "consequat"]
+
+def words(rng: random.Random, count: int):
+    return " ".join([rng.choice(WORDS) for _ in range(count)])
+
+def sentence(rng: random.Random):
+    return words(rng, rng.randint(6, 16)).capitalize() + "."
+
+def fillUpTo(size: int, generate_piece):
+    pieces = []
+    length = 0
+    while length < size:
+        piece = generate_piece()
+        pieces.append(piece)
+        length += len(piece)
+    return "".join(pieces)
+
+# Long paragraphs of plain text with the occasional heading, i.e. what most documents mostly consist of
+def prose(size: int, rng: random.Random):
+    def piece():
+        if rng.random() < 0.1:
+            return "#" * rng.randint(1, 3) + " " + words(rng, rng.randint(2, 6)).capitalize() + "\n\n"
+        lines = [" ".join([sentence(rng) for _ in range(rng.randint(1, 3))]) for _ in range(rng.randint(2, 8))]
+        return "\n".join(lines) + "\n\n"
+    return fillUpTo(size, piece)
+
+# Block quotes nested up to "depth" levels, each level continuing with a paragraph
+def deep_block_quotes(size: int, rng: random.Random, depth: int = 40):
+    def piece():
+        lines = []
+        for level in range(1, rng.randint(1, depth) + 1):
+            lines.append("> " * level + sentence(rng) + "\n")
+            lines.append("> " * level + "\n")
+        return "".join(lines) + "\n"
+    return fillUpTo(size, piece)
+
+# Bullet & ordered lists nested up to "depth" levels, tight and loose
+def deep_lists(size: int, rng: random.Random, depth: int = 20):
+    def piece():
+        lines = []
+        loose = rng.random() < 0.3
+        for level in range(rng.randint(1, depth)):
+            for item in range(rng.randint(1, 3)):
+                marker = rng.choice(["-", "*", "+"]) if rng.random() < 0.5 else f"{item + 1}."
+                lines.append("    " * level + marker + " " + sentence(rng) + "\n")
+                if loose:
+                    lines.append("\n")
+        return "".join(lines) + "\n"
+    return fillUpTo(size, piece)
+
+# Paragraphs full of emphasis, strong emphasis, inline code & escapes, including runs of delimiters that do not match
+def emphasis_heavy(size: int, rng: random.Random):
+    def word():
+        text = rng.choice(WORDS)
+        match rng.randint(0, 9):
+            case 0:
+                return f"*{text}*"
+            case 1:
+                return f"**{text}**"
+            case 2:
+                return f"_{text}_"
+            case 3:
+                return f"***{text}***"
+            case 4:
+                return f"*{text}"
+            case 5:
+                return f"`{text}`"
+            case 6:
+                return f"\\*{text}"
+            case _:
+                return text
+    def piece():
+        return "\n".join([" ".join([word() for _ in range(rng.randint(8, 20))]) for _ in range(rng.randint(1, 6))]) + "\n\n"
+    return fillUpTo(size, piece)
+
+# Thousands of link reference definitions, used by reference links in between
+def link_reference_definitions(size: int, rng: random.Random):
+    definitions = []
+    label_count = 0
+    def piece():
+        nonlocal label_count
+        label_count += 1
+        definitions.append(f"[label {label_count}]: https://example.com/{label_count} \"Title {label_count}\"\n")
+        return f"See [{words(rng, 2)}][label {rng.randint(1, label_count)}], [label {label_count}] and [missing {label_count}].\n\n"
+    paragraphs = fillUpTo(size // 2, piece)
+    return paragraphs + "\n" + "".join(definitions)
+
+# Large fenced code blocks with a language, plus some indented code
+def fenced_code(size: int, rng: random.Random):
+    def piece():
+        lines = [f"    {words(rng, rng.randint(2, 8))} = {rng.randint(0, 1000)} # *not* emphasis\n" for _ in range(rng.randint(50, 500))]
+        if rng.random() < 0.2:
+            return "Indented code:\n\n" + "".join(lines[:20]) + "\n"
+        return f"```{rng.choice(['python', 'c', 'js', ''])}\n" + "".join(lines) + "```\n\n"
+    return fillUpTo(size, piece)
+
+# Raw HTML blocks of all kinds & inline HTML
+def raw_html(size: int, rng: random.Random):
+    def piece():
+        match rng.randint(0, 4):
+            case 0:
+                return f"<div class=\"{rng.choice(WORDS)}\">\n{sentence(rng)}\n</div>\n\n"
+            case 1:
+                return f"<!-- {sentence(rng)} -->\n\n"
+            case 2:
+                return f"<pre>\n{sentence(rng)}\n\n{sentence(rng)}\n</pre>\n\n"
+            case 3:
+                return f"<table><tr><td>\n{sentence(rng)}\n</td></tr></table>\n\n"
+            case _:
+                return f"{words(rng, 4)} <span title=\"{rng.choice(WORDS)}\">{words(rng, 3)}</span> <a href=\"#\">{words(rng, 2)}</a>\n\n"
+    return fillUpTo(size, piece)
+
+# Inputs that are known to make naive implementations quadratic: long runs of unmatched openers, brackets & backticks
+def pathological(size: int, rng: random.Random):
+    quarter = size // 4
+    return "\n\n".join([
+        "*a " * (quarter // 3),
+        "[" * (quarter // 2) + "a" + "]" * (quarter // 4),
+        "`a ``b " * (quarter // 7),
+        "<a " * (quarter // 3),
+    ]) + "\n"
+
+CORPORA = {
+    "prose": prose,
+    "deep_block_quotes": deep_block_quotes,
+    "deep_lists": deep_lists,
+    "emphasis_heavy": emphasis_heavy,
+    "link_reference_definitions": link_reference_definitions,
+    "fenced_code": fenced_code,
+    "raw_html": raw_html,
+    "pathological": pathological,
+}
+
+def generate(name: str, size: int, seed: int = 0):
+    return CORPORA[name](size, random.Random(seed))
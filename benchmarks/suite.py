@@ -0,0 +1,113 @@
+#!/bin/python3
+
+# Times Parser.parse, HTMLRenderer.render and JSONRenderer.render on each of the synthetic documents of corpora.py, and writes the results to bench_output.txt (one JSON object per line)
+# With --compare, the results are compared with those of an earlier run (e.g. a copy of bench_output.txt made before a change), and the exit status is 1 if anything got slower by more than --threshold
+# Usage (from the root directory of this project): python -m benchmarks.suite [--size KIB] [--repeat N] [--only CORPUS ...] [--output PATH] [--compare BASELINE] [--threshold FRACTION]
+import argparse
+import json
+import platform
+import sys
+import time
+
+from libs.parser import Parser
+from libs.htmlrenderer import HTMLRenderer
+from libs.jsonrenderer import JSONRenderer
+from benchmarks.corpora import CORPORA, generate
+
+DEFAULT_OUTPUT = "bench_output.txt"
+NOISE_FLOOR = 0.002 # seconds; a time that differs from the baseline by less than this is never counted as a regression, however large the ratio
+
+# The fastest of "repeat" runs; the slower ones are mostly slowed down by whatever else the machine was doing
+def timeBest(function, repeat: int):
+    best_time = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        elapsed_time = time.perf_counter() - start_time
+        if best_time is None or elapsed_time < best_time:
+            best_time = elapsed_time
+    return best_time, result
+
+def runCorpus(name: str, size: int, repeat: int):
+    markdown_input = generate(name, size)
+
+    parse_time, document = timeBest(lambda: Parser().parse(markdown_input), repeat)
+    # a new renderer for every run, without fragment cache, so that every run renders all blocks
+    html_time, _ = timeBest(lambda: HTMLRenderer({"indent": 4, "include_html_backbone": False, "css_styling": "", "fragment_cache_size": 0}).render(document), repeat)
+    json_time, _ = timeBest(lambda: JSONRenderer({"jsonIndent": 4, "debug_infos": False, "compact": False}).render(document), repeat)
+
+    return {
+        "corpus": name,
+        "characters": len(markdown_input),
+        "parse": parse_time,
+        "html": html_time,
+        "json": json_time,
+    }
+
+def readResults(path: str):
+    with open(path, "r") as results_file:
+        return {result["corpus"]: result for result in map(json.loads, results_file) if "corpus" in result}
+
+def printHeader():
+    print(f"{'corpus':<28}{'KiB':>8}{'parse':>10}{'html':>10}{'json':>10}{'parse MiB/s':>13}")
+
+def printResult(result: dict):
+    print(f"{result['corpus']:<28}{result['characters'] / 1024:>8.0f}{result['parse']:>9.3f}s{result['html']:>9.3f}s{result['json']:>9.3f}s{result['characters'] / 1024 / 1024 / result['parse']:>13.2f}")
+
+# Prints the ratio of every time to the baseline's; returns whether anything got slower by more than "threshold" (e.g. 0.1 for 10%)
+def compareResults(results: list[dict], baseline: dict[str, dict], threshold: float):
+    regressed = False
+
+    print(f"\n{'corpus':<28}{'parse':>10}{'html':>10}{'json':>10}   (new time / baseline time)")
+    for result in results:
+        baseline_result = baseline.get(result["corpus"])
+        if baseline_result is None:
+            print(f"{result['corpus']:<28}{'not in baseline':>30}")
+            continue
+        if baseline_result["characters"] != result["characters"]:
+            print(f"{result['corpus']:<28}{'different size than in baseline':>30}")
+            continue
+
+        columns = []
+        for measurement in ["parse", "html", "json"]:
+            ratio = result[measurement] / baseline_result[measurement]
+            marker = " "
+            if ratio > 1 + threshold and result[measurement] - baseline_result[measurement] > NOISE_FLOOR:
+                marker = "!"
+                regressed = True
+            columns.append(f"{ratio:>8.2f}x{marker}")
+        print(f"{result['corpus']:<28}" + "".join(columns))
+
+    if regressed:
+        print(f"\n'!': slower than the baseline by more than {threshold:.0%}")
+    return regressed
+
+def main(argv: list[str] = None):
+    argument_parser = argparse.ArgumentParser(prog="python -m benchmarks.suite", description="Benchmarks the parser & renderers on synthetic documents.")
+    argument_parser.add_argument("--size", type=int, default=200, help="approximate size of every document in KiB (default: 200)")
+    argument_parser.add_argument("--repeat", type=int, default=3, help="number of runs of which the fastest counts (default: 3)")
+    argument_parser.add_argument("--only", nargs="+", choices=list(CORPORA), help="run only these corpora")
+    argument_parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"file to write the results to (default: {DEFAULT_OUTPUT})")
+    argument_parser.add_argument("--compare", metavar="BASELINE", help="results of an earlier run to compare with")
+    argument_parser.add_argument("--threshold", type=float, default=0.1, help="slowdown relative to the baseline that counts as a regression (default: 0.1)")
+    arguments = argument_parser.parse_args(argv)
+
+    baseline = readResults(arguments.compare) if arguments.compare else None # read first, in case it is the output file
+
+    printHeader()
+    results = []
+    for name in arguments.only or CORPORA:
+        results.append(runCorpus(name, arguments.size * 1024, arguments.repeat))
+        printResult(results[-1])
+
+    with open(arguments.output, "w") as output_file:
+        output_file.write(json.dumps({"python": platform.python_version(), "machine": platform.machine(), "size": arguments.size, "repeat": arguments.repeat}) + "\n")
+        for result in results:
+            output_file.write(json.dumps(result) + "\n")
+
+    if baseline is not None:
+        return 1 if compareResults(results, baseline, arguments.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import threading
+from PyQt5 import QtCore
+
+# Reads a (large) file in a background thread & hands it to the GUI thread chunk by chunk, so that the editor can be filled (and the beginning of the file be previewed) while the rest is still being read.
+# The thread waits for the GUI to take on a chunk (see acknowledgeChunk()) before it reads more than CHUNKS_IN_FLIGHT chunks ahead; this keeps the GUI's event queue from filling up with chunks, so that the window stays responsive while the file is read.
+# Usage: loader = FileLoader(path); connect chunkRead, finished & failed; loader.start(); call loader.acknowledgeChunk() for every chunk once it has been inserted; loader.cancel() to stop reading
+
+FIRST_CHUNK_SIZE = 16384 # characters; about a screenful or two, so that the beginning of the file shows up right away
+CHUNK_SIZE = 262144 # characters
+CHUNKS_IN_FLIGHT = 2
+
+class FileLoader(QtCore.QObject):
+    chunkRead = QtCore.pyqtSignal(str, int) # chunk, bytes of the file read so far
+    finished = QtCore.pyqtSignal()
+    failed = QtCore.pyqtSignal(str) # error message
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+        self.cancelled = threading.Event()
+        self.chunks_in_flight = threading.Semaphore(CHUNKS_IN_FLIGHT)
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.chunks_in_flight.release() # in case run() is waiting for the GUI
+
+    def acknowledgeChunk(self):
+        self.chunks_in_flight.release()
+
+    # Runs in the background thread; the signals are queued to the GUI thread, as the loader belongs to that one
+    def run(self):
+        try:
+            with open(self.path, "r") as file_to_open: # just like a small file is opened (i.e. with universal newlines; a "\r\n" split between two chunks is taken care of by the text wrapper)
+                chunk_size = FIRST_CHUNK_SIZE
+                while True:
+                    chunk = file_to_open.read(chunk_size)
+                    if not chunk:
+                        break
+                    chunk_size = CHUNK_SIZE
+
+                    self.chunks_in_flight.acquire()
+                    if self.cancelled.is_set():
+                        return
+                    self.chunkRead.emit(chunk, file_to_open.buffer.tell()) # the position of the binary buffer is ahead of the text by what the text wrapper has read ahead; close enough for a progress bar
+        except Exception as error:
+            if not self.cancelled.is_set():
+                self.failed.emit(f"{type(error).__name__}: {error}")
+            return
+
+        if not self.cancelled.is_set():
+            self.finished.emit()
@@ -0,0 +1,155 @@
+import io
+from array import array
+from .node import *
+
+# An alternative, compact representation of a parsed document: instead of one Python object per node, every node is a row in a handful of typed arrays (its type, its parent, first child & next sibling, and the spans of its content within one shared string).
+# Just like the Nodes, the arena keeps only the indices of the lines in the document's line buffer for the raw content of blocks, and joins them when "raw_content" is read.
+# Renderers work on ArenaNode objects, thin views that offer the same attributes as a Node. Use it by creating the parser with Parser(arena=True).
+
+NODE_TYPES_BY_VALUE = {node_type.value: node_type for node_type in NodeType}
+
+NO_NODE = -1
+
+class NodeArena:
+    def __init__(self):
+        self.node_types = array('b')
+        self.open = array('b')
+
+        self.parents = array('i')
+        self.first_children = array('i')
+        self.last_children = array('i') # needed to append a child without walking through all of its siblings
+        self.next_siblings = array('i')
+
+        # start & end of "content" and of the directly assigned part of "raw_content" within self.text
+        self.content_spans = array('i')
+        self.raw_content_spans = array('i')
+
+        self.text: str = ""
+        self.text_buffer = io.StringIO() # the contents added so far; turned into self.text by finish()
+        self.text_length = 0
+
+        # the rest of "raw_content": start & end of the node's line indices within self.line_indices
+        self.line_buffer: list[str] = []
+        self.line_indices = array('i')
+        self.line_index_spans = array('i')
+
+        self.attributes: dict[int, dict] = {} # the attributes the subclasses of Node add (e.g. "heading_level"), only for the nodes that have any
+
+    def addText(self, text: str, spans: array):
+        spans.append(self.text_length)
+        self.text_length += self.text_buffer.write(text)
+        spans.append(self.text_length)
+
+    def addNode(self, node: Node, parent_index: int):
+        index = len(self.node_types)
+
+        self.node_types.append(node.node_type.value)
+        self.open.append(node.open)
+
+        self.parents.append(parent_index)
+        self.first_children.append(NO_NODE)
+        self.last_children.append(NO_NODE)
+        self.next_siblings.append(NO_NODE)
+
+        if parent_index != NO_NODE:
+            if self.last_children[parent_index] == NO_NODE:
+                self.first_children[parent_index] = index
+            else:
+                self.next_siblings[self.last_children[parent_index]] = index
+            self.last_children[parent_index] = index
+
+        self.addText(node.content, self.content_spans)
+        self.addText(node.assigned_raw_content, self.raw_content_spans)
+
+        self.line_buffer = node.line_buffer # shared by all nodes of a document
+        self.line_index_spans.append(len(self.line_indices))
+        self.line_indices.extend(node.line_indices)
+        self.line_index_spans.append(len(self.line_indices))
+
+        if type(node) is not Node:
+            self.attributes[index] = {attribute: getattr(node, attribute) for attribute in type(node).__slots__}
+
+        return index
+
+    # Copies a node and all of its descendants into the arena; returns the index of the root.
+    # With "release" set, the nodes are unlinked from each other as they are copied: a parent and its children reference each other, so otherwise they could only be freed by the (rarely running) cyclic garbage collector
+    def addSubtree(self, root: Node, parent_index: int, release: bool = False):
+        root_index = NO_NODE
+        nodes_to_add = [(root, parent_index)]
+
+        while nodes_to_add: # no recursion, so deeply nested documents do not run into the recursion limit
+            node, node_parent_index = nodes_to_add.pop()
+            node_index = self.addNode(node, node_parent_index)
+
+            if root_index == NO_NODE:
+                root_index = node_index
+
+            for child in reversed(node.children):
+                nodes_to_add.append((child, node_index))
+
+            if release:
+                node.parent = None
+                node.children = []
+
+        return root_index
+
+    def finish(self):
+        self.text = self.text_buffer.getvalue()
+
+    def view(self, index: int = 0):
+        return ArenaNode(self, index)
+
+class ArenaNode:
+    __slots__ = ("arena", "index")
+
+    def __init__(self, arena: NodeArena, index: int):
+        self.arena = arena
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, ArenaNode) and self.arena is other.arena and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.arena), self.index))
+
+    @property
+    def node_type(self):
+        return NODE_TYPES_BY_VALUE[self.arena.node_types[self.index]]
+
+    @property
+    def open(self):
+        return bool(self.arena.open[self.index])
+
+    @property
+    def parent(self):
+        parent_index = self.arena.parents[self.index]
+        if parent_index == NO_NODE:
+            return None
+        return ArenaNode(self.arena, parent_index)
+
+    @property
+    def children(self):
+        children = []
+
+        child_index = self.arena.first_children[self.index]
+        while child_index != NO_NODE:
+            children.append(ArenaNode(self.arena, child_index))
+            child_index = self.arena.next_siblings[child_index]
+
+        return children
+
+    @property
+    def content(self):
+        return self.arena.text[self.arena.content_spans[2 * self.index]:self.arena.content_spans[2 * self.index + 1]]
+
+    @property
+    def raw_content(self):
+        assigned_raw_content = self.arena.text[self.arena.raw_content_spans[2 * self.index]:self.arena.raw_content_spans[2 * self.index + 1]]
+        line_indices = self.arena.line_indices[self.arena.line_index_spans[2 * self.index]:self.arena.line_index_spans[2 * self.index + 1]]
+        return assigned_raw_content + "".join([self.arena.line_buffer[line_index] for line_index in line_indices])
+
+    def __getattr__(self, name): # the attributes of the subclasses of Node
+        attributes = self.arena.attributes.get(self.index)
+        if attributes and name in attributes:
+            return attributes[name]
+        raise AttributeError(f"{self.node_type} node has no attribute '{name}'")
@@ -0,0 +1,210 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from enum import Enum
+from .node import *
+from .arena import ArenaNode, NO_NODE
+
+# A compact binary file format for parsed documents, so that the AST of a document does not have to be parsed again to be rendered.
+# The file is laid out just like a NodeArena: a node table of fixed-width columns (type, open, parent, first child, next sibling and the spans of the node's content, raw content & attributes), the line table of the document and a pool holding all strings encoded as UTF-8.
+# load() does not read anything but the header: it maps the file into memory and returns an ArenaNode for the document, whose columns are views into the mapped file. A node's content is only decoded when it is read.
+# Usage: dump(document, path) with a document from Parser.parse() (either mode), load(path) to get it back
+
+MAGIC = b"JAMEAST\x01"
+HEADER = struct.Struct("<8s8sII") # magic, byte order of the columns, number of nodes, number of lines
+ITEM_SIZE = array('i').itemsize
+
+SECTIONS = [ # (name, typecode, items per node); the columns follow the header in this order
+    ("node_types", 'b', 1),
+    ("open", 'b', 1),
+    ("parents", 'i', 1),
+    ("first_children", 'i', 1),
+    ("next_siblings", 'i', 1),
+    ("content_spans", 'i', 2),
+    ("raw_content_spans", 'i', 2),
+    ("line_index_spans", 'i', 2),
+    ("attribute_spans", 'i', 2),
+]
+
+ENUMS = {enum.__name__: enum for enum in [ListType, CodeBlockType]} # the enums that can be the value of an attribute
+
+def encodeAttribute(value):
+    if isinstance(value, Enum):
+        return {"enum": type(value).__name__, "value": value.value}
+    if isinstance(value, bytes): # the fingerprint of a top-level block
+        return {"bytes": value.hex()}
+    raise TypeError(f"attribute value {value!r} cannot be stored")
+
+def decodeAttribute(attribute: dict):
+    if attribute.keys() == {"enum", "value"}:
+        return ENUMS[attribute["enum"]](attribute["value"])
+    if attribute.keys() == {"bytes"}:
+        return bytes.fromhex(attribute["bytes"])
+    return attribute
+
+# The string pool of a file being written; spans are in bytes
+class StringPool:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def add(self, text: str, spans: array):
+        spans.append(len(self.buffer))
+        self.buffer += text.encode("utf-8", "surrogatepass") # lone surrogates from e.g. "&#xD800;" are kept as they are
+        spans.append(len(self.buffer))
+
+# Writes a document (or any other node and its descendants) to "path"
+def dump(document, path: str):
+    columns = {name: array(typecode) for name, typecode, _ in SECTIONS}
+    pool = StringPool()
+
+    line_spans = array('i')
+    line_indices = array('i')
+    line_buffer_offsets: dict[int, int] = {} # id of a line buffer -> index of its first line in the line table; a document parsed in streaming mode has one buffer per block
+
+    last_children = array('i')
+    nodes_to_add = [(document, NO_NODE)]
+
+    while nodes_to_add:
+        node, parent_index = nodes_to_add.pop()
+        index = len(columns["node_types"])
+
+        columns["node_types"].append(node.node_type.value)
+        columns["open"].append(node.open)
+
+        columns["parents"].append(parent_index)
+        columns["first_children"].append(NO_NODE)
+        columns["next_siblings"].append(NO_NODE)
+        last_children.append(NO_NODE)
+
+        if parent_index != NO_NODE:
+            if last_children[parent_index] == NO_NODE:
+                columns["first_children"][parent_index] = index
+            else:
+                columns["next_siblings"][last_children[parent_index]] = index
+            last_children[parent_index] = index
+
+        pool.add(node.content, columns["content_spans"])
+
+        columns["line_index_spans"].append(len(line_indices))
+        if isinstance(node, Node):
+            pool.add(node.assigned_raw_content, columns["raw_content_spans"])
+
+            if id(node.line_buffer) not in line_buffer_offsets:
+                line_buffer_offsets[id(node.line_buffer)] = len(line_spans) // 2
+                for line in node.line_buffer:
+                    pool.add(line, line_spans)
+
+            line_buffer_offset = line_buffer_offsets[id(node.line_buffer)]
+            line_indices.extend([line_buffer_offset + line_index for line_index in node.line_indices])
+
+            attributes = {attribute: getattr(node, attribute) for attribute in type(node).__slots__} if type(node) is not Node else {}
+            if node.fingerprint is not None: # kept, so that the HTMLRenderer can reuse what it rendered for the block before it was dumped
+                attributes["fingerprint"] = node.fingerprint
+        else: # an ArenaNode, e.g. from Parser(arena=True) or load()
+            pool.add(node.raw_content, columns["raw_content_spans"])
+            attributes = node.arena.attributes.get(node.index)
+        columns["line_index_spans"].append(len(line_indices))
+
+        if attributes:
+            pool.add(json.dumps(attributes, separators=(",", ":"), default=encodeAttribute), columns["attribute_spans"])
+        else:
+            columns["attribute_spans"].extend([NO_NODE, NO_NODE])
+
+        for child in reversed(node.children):
+            nodes_to_add.append((child, index))
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, sys.byteorder.encode("ascii"), len(columns["node_types"]), len(line_spans) // 2))
+        for name, _, _ in SECTIONS:
+            file.write(columns[name].tobytes())
+        file.write(line_spans.tobytes())
+        file.write(array('i', [len(line_indices)]).tobytes())
+        file.write(line_indices.tobytes())
+        file.write(pool.buffer)
+
+# Stands in for NodeArena.text: slicing it with a span decodes that part of the string pool
+class MappedText:
+    __slots__ = ("pool",)
+
+    def __init__(self, pool: memoryview):
+        self.pool = pool
+
+    def __getitem__(self, span: slice):
+        return str(self.pool[span], "utf-8", "surrogatepass")
+
+# Stands in for the line buffer of a NodeArena
+class MappedLines:
+    __slots__ = ("line_spans", "text")
+
+    def __init__(self, line_spans: memoryview, text: MappedText):
+        self.line_spans = line_spans
+        self.text = text
+
+    def __getitem__(self, line_index: int):
+        return self.text[self.line_spans[2 * line_index]:self.line_spans[2 * line_index + 1]]
+
+    def __len__(self):
+        return len(self.line_spans) // 2
+
+# Stands in for NodeArena.attributes: the attributes of a node are decoded when they are first read
+class MappedAttributes:
+    def __init__(self, attribute_spans: memoryview, text: MappedText):
+        self.attribute_spans = attribute_spans
+        self.text = text
+        self.decoded_attributes: dict[int, dict] = {}
+
+    def get(self, index: int):
+        if index in self.decoded_attributes:
+            return self.decoded_attributes[index]
+
+        attributes = None
+        if self.attribute_spans[2 * index] != NO_NODE:
+            attributes = json.loads(self.text[self.attribute_spans[2 * index]:self.attribute_spans[2 * index + 1]], object_hook=decodeAttribute)
+
+        self.decoded_attributes[index] = attributes
+        return attributes
+
+# The arena of a loaded file; offers the same attributes as a NodeArena, so ArenaNode works on it unchanged
+class MappedArena:
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) # the mapping stays valid after the file has been closed
+        data = memoryview(self.mapping)
+
+        if len(data) < HEADER.size:
+            raise ValueError(f"{path} is not a JAME AST file")
+        magic, byte_order, node_count, line_count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a JAME AST file")
+        if byte_order.rstrip(b"\x00").decode("ascii") != sys.byteorder:
+            raise ValueError(f"{path} has been written on a machine with a different byte order")
+
+        offset = HEADER.size
+        def takeSection(typecode: str, item_count: int):
+            nonlocal offset
+            size = item_count * (1 if typecode == 'b' else ITEM_SIZE)
+            if offset + size > len(data):
+                raise ValueError(f"{path} is truncated")
+            section = data[offset:offset + size].cast(typecode)
+            offset += size
+            return section
+
+        for name, typecode, items_per_node in SECTIONS:
+            setattr(self, name, takeSection(typecode, items_per_node * node_count))
+        line_spans = takeSection('i', 2 * line_count)
+
+        line_index_count = takeSection('i', 1)[0]
+        self.line_indices = takeSection('i', line_index_count)
+
+        self.text = MappedText(data[offset:])
+        self.line_buffer = MappedLines(line_spans, self.text)
+        self.attributes = MappedAttributes(self.attribute_spans, self.text)
+
+    def view(self, index: int = 0):
+        return ArenaNode(self, index)
+
+# Maps the file written by dump() into memory; returns (a view of) its root node
+def load(path: str):
+    return MappedArena(path).view()
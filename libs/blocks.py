@@ -1,21 +1,27 @@
 import re
 
-from .link_reference_definition import LinkReferenceDefinition
+from .link_reference_definition import LinkReferenceDefinition, LinkReferenceTable
 from .node import *
 from .regexps import *
 
+# the kinds of block starts (named after the groups of BLOCK_START_RE) that close an open paragraph
+PARAGRAPH_INTERRUPTING_BLOCK_STARTS = [
+    "setext_heading_underline", # needed for correct parsing of setext-headings -> we need it to be closed, so openBlock() can be called to correctly build the heading
+    "html_block_1", "html_block_2", "html_block_3", "html_block_4", "html_block_5", "html_block_6" # sec. 4.6: "An HTML block of types 1–6 can interrupt a paragraph"
+]
+
 def canRemainOpen(block: Node, line: str):
     match block.node_type:
         case NodeType.DOCUMENT:
             return True
         case NodeType.BLOCK_QUOTE:
-            if re.search(BLOCK_QUOTE_MARKER, line):
+            if BLOCK_QUOTE_MARKER_RE.search(line):
                 return True
             return False
 
         case NodeType.CODE_BLOCK:
             if block.type == CodeBlockType.FENCED:
-                search_result = re.search(FENCED_CODE_BLOCK_ENDING, line)
+                search_result = FENCED_CODE_BLOCK_ENDING_RE.search(line)
                 if not search_result:
                     return True
                 
@@ -24,18 +30,18 @@ def canRemainOpen(block: Node, line: str):
                     return False
                 return True
             else:
-                if re.search(BLANK_LINE, line):
+                if BLANK_LINE_RE.search(line):
                     return False
                 return True
 
         case NodeType.PARAGRAPH:
-            if re.search(BLANK_LINE, line):
-                return False
-            if re.search(SETEXT_HEADING_UNDERLINE, line): # needed for correct parsing of setext-headings -> we need it to be closed, so openBlock() can be called to correctly build the heading
+            if BLANK_LINE_RE.search(line):
                 return False
-            if re.search(BULLET_LIST_MARKER, line.lstrip()) or re.search(ORDERED_LIST_MARKER, line.lstrip()): # lists may interrupt a paragraph
+            if BULLET_LIST_MARKER_RE.search(line.lstrip()) or ORDERED_LIST_MARKER_RE.search(line.lstrip()): # lists may interrupt a paragraph
                 return False
-            if re.search(re.compile(BLOCK_1_START, re.IGNORECASE), line) or re.search(BLOCK_2_START, line) or re.search(BLOCK_3_START, line) or re.search(BLOCK_4_START, line) or re.search(BLOCK_5_START, line) or re.search(BLOCK_6_START, line): # sec. 4.6: "An HTML block of types 1–6 can interrupt a paragraph"
+
+            block_start = BLOCK_START_RE.match(line)
+            if block_start and block_start.lastgroup in PARAGRAPH_INTERRUPTING_BLOCK_STARTS:
                 return False
             return True
 
@@ -46,28 +52,16 @@ def canRemainOpen(block: Node, line: str):
             return False
 
         case NodeType.HTML_BLOCK:
-            if block.block_type == 1 and not re.search(re.compile(BLOCK_1_END, re.IGNORECASE), line):
-                return True
-            elif block.block_type == 2 and not re.search(BLOCK_2_END, line):
-                return True
-            elif block.block_type == 3 and not re.search(BLOCK_3_END, line):
-                return True
-            elif block.block_type == 4 and not re.search(BLOCK_4_END, line):
-                return True
-            elif block.block_type == 5 and not re.search(BLOCK_5_END, line):
-                return True
-            elif block.block_type == 6 and not re.search(re.compile(BLOCK_6_END, re.IGNORECASE), line):
-                return True
-            elif block.block_type == 7 and not re.search(BLOCK_7_END, line):
-                return True
-            return False
+            if HTML_BLOCK_END_RE[block.block_type].search(line):
+                return False
+            return True
             
         case NodeType.CUSTOM_BLOCK:
             return False
 
         case NodeType.LIST:
             if block.list_type == ListType.ORDERED:
-                list_marker_matchobj = re.search(ORDERED_LIST_MARKER, line)
+                list_marker_matchobj = ORDERED_LIST_MARKER_RE.search(line)
                 if not list_marker_matchobj:
                     return False
 
@@ -76,7 +70,7 @@ def canRemainOpen(block: Node, line: str):
                     return True
                 return False
             else:
-                list_marker_matchobj = re.search(BULLET_LIST_MARKER, line)
+                list_marker_matchobj = BULLET_LIST_MARKER_RE.search(line)
                 if not list_marker_matchobj:
                     return False
 
@@ -86,7 +80,7 @@ def canRemainOpen(block: Node, line: str):
                 return False
 
         case NodeType.LIST_ITEM:
-            if re.search(BLANK_LINE, line): # a blank line does not close a list item; however, it determines if the list is "tight" or "loose" as per sec. 5.3
+            if BLANK_LINE_RE.search(line): # a blank line does not close a list item; however, it determines if the list is "tight" or "loose" as per sec. 5.3
                 return True
 
             # reasoning for this is in sec. 5.2
@@ -105,162 +99,185 @@ def canRemainOpen(block: Node, line: str):
 
 # for paragraph continuation text: when a paragraph node is open, and "> some blockquote" is added to it, we need to remove the "> " block quote marker (same for lists)
 def removePossibleMarkers(line: str):
-    removed_block_quotes = re.sub(BLOCK_QUOTE_MARKER, "", line)
-    removed_ol_list_markers = re.sub(ORDERED_LIST_MARKER, "", removed_block_quotes)
-    removed_ul_list_markers = re.sub(BULLET_LIST_MARKER, "", removed_ol_list_markers)
+    removed_block_quotes = BLOCK_QUOTE_MARKER_RE.sub("", line)
+    removed_ol_list_markers = ORDERED_LIST_MARKER_RE.sub("", removed_block_quotes)
+    removed_ul_list_markers = BULLET_LIST_MARKER_RE.sub("", removed_ol_list_markers)
 
     return removed_ul_list_markers.lstrip()
 
-def openBlock(document: Node, line: str, deepest_open_child: Node = None):
-    if re.search(ATX_HEADING, line):
-        heading_level = len(re.search(ATX_HEADING, line).group().strip())
+# Every block that is opened (and stays open) is pushed onto "open_blocks", the parser's stack of open blocks
+def openBlock(document: Node, line: str, deepest_open_child: Node = None, open_blocks: list[Node] = None):
+    block_start = BLOCK_START_RE.match(line) # a single match decides which kind of block (if any) the line starts
+    block_kind = None
+    if block_start:
+        block_kind = block_start.lastgroup
 
-        removed_heading_marker = re.sub(ATX_HEADING, "", line)
-        removed_closing_seq = re.sub(ATX_HEADING_OPT_CLOSING_SEQ, "", removed_heading_marker)
-        removed_spaces = removed_closing_seq.strip()
+    match block_kind:
+        case "atx_heading":
+            heading_level = len(block_start.group().strip())
 
-        new_node = HeadingNode(document, heading_level, removed_spaces)
-        new_node.open = False
-    elif re.search(SETEXT_HEADING_UNDERLINE, line):
-        if document.children and document.getLastChild().node_type == NodeType.PARAGRAPH:
-            original_paragraph_text = document.getLastChild().raw_content
-            heading_level = 1
-            if line.strip()[0] == '-':
-                heading_level = 2
+            removed_heading_marker = line[block_start.end():]
+            removed_closing_seq = ATX_HEADING_OPT_CLOSING_SEQ_RE.sub("", removed_heading_marker)
+            removed_spaces = removed_closing_seq.strip()
 
-            del document.children[-1] # the new heading replaces the old paragraph
-
-            new_node = HeadingNode(document, heading_level, original_paragraph_text)
+            new_node = HeadingNode(document, heading_level, removed_spaces)
             new_node.open = False
-        elif re.search(THEMATIC_BREAK, line): # if a setext heading underline is in the first line of input, it could well be a thematic break
+        case "setext_heading_underline":
+            if document.children and document.getLastChild().node_type == NodeType.PARAGRAPH:
+                original_paragraph_text = document.getLastChild().raw_content
+                heading_level = 1
+                if line.strip()[0] == '-':
+                    heading_level = 2
+
+                del document.children[-1] # the new heading replaces the old paragraph
+
+                new_node = HeadingNode(document, heading_level, original_paragraph_text)
+                new_node.open = False
+            elif THEMATIC_BREAK_RE.search(line): # if a setext heading underline is in the first line of input, it could well be a thematic break
+                new_node = Node(document, NodeType.THEMATIC_BREAK)
+                new_node.open = False
+            else: # neither a setext heading nor a thematic break; return dashes as literal
+                new_node = Node(document, NodeType.PARAGRAPH, line)
+                open_blocks.append(new_node)
+        case "thematic_break":
             new_node = Node(document, NodeType.THEMATIC_BREAK)
             new_node.open = False
-        else: # neither a setext heading nor a thematic break; return dashes as literal
-            new_node = Node(document, NodeType.PARAGRAPH, line)
-    elif re.search(THEMATIC_BREAK, line):
-        new_node = Node(document, NodeType.THEMATIC_BREAK)
-        new_node.open = False
-    elif re.search(INDENTED_CODE_BLOCK, line):
-        code_text = line[4:]
-
-        new_node = CodeBlockNode(document, CodeBlockType.INDENTED, raw_content=code_text)
-    elif re.search(FENCED_CODE_BLOCK_BEGINNING, line):
-        info_text = None
-        if line.lstrip()[0] == '`':
-            info_text = line.replace("`", "").strip()
-        else:
-            info_text = re.sub(r'^[ ]{0,3}~+', "", line).strip()
-        if info_text == "":
-            info_text = None
-
-        indentation_match_obj = re.search(r'^[ ]{0,3}', line)
-        indentation_width = 0
-        if indentation_match_obj:
-            indentation_width = len(indentation_match_obj.group())
-
-        delimiter_char = line.lstrip()[0]
-        delimiter_count = len(re.sub(r'[^' + delimiter_char + ']', "", line).strip())
-
-        new_node = CodeBlockNode(document, CodeBlockType.FENCED, info_text, delimiter_char, delimiter_count, indentation_width)
-    
-    elif re.search(re.compile(BLOCK_1_START, re.IGNORECASE), line): # re.compile needed to have case-insensitive search as mandated in sec. 4.6
-        new_node = HTMLBlockNode(document, 1, line)
-
-        if re.search(re.compile(BLOCK_1_END, re.IGNORECASE), line): # an HTML block may be closed on the same line it has been opened
-            new_node.open = False
-    elif re.search(BLOCK_2_START, line):
-        new_node = HTMLBlockNode(document, 2, line)
+        case "indented_code_block":
+            code_text = line[4:]
 
-        if re.search(BLOCK_2_END, line):
-            new_node.open = False
-    elif re.search(BLOCK_3_START, line):
-        new_node = HTMLBlockNode(document, 3, line)
-
-        if re.search(BLOCK_3_END, line):
-            new_node.open = False
-    elif re.search(BLOCK_4_START, line):
-        new_node = HTMLBlockNode(document, 4, line)
-
-        if re.search(BLOCK_4_END, line):
-            new_node.open = False
-    elif re.search(BLOCK_5_START, line):
-        new_node = HTMLBlockNode(document, 5, line)
-
-        if re.search(BLOCK_5_END, line):
-            new_node.open = False
-    elif re.search(re.compile(BLOCK_6_START, re.IGNORECASE), line):
-        new_node = HTMLBlockNode(document, 6, line)
-
-        # block 6 cannot be closed on the same line it is opened as its closing condition is a blank line
-    elif re.search(BLOCK_7_START, line):
-        new_node = HTMLBlockNode(document, 7, line)
-
-        # block 7 cannot be closed on the same line it is opened as its closing condition is a blank line
-    elif re.search(BLOCK_QUOTE_MARKER, line):
-        line_without_marker = re.sub(BLOCK_QUOTE_MARKER, "", line)
-        new_node = Node(document, NodeType.BLOCK_QUOTE, line_without_marker)
-        openBlock(new_node, line_without_marker) # block quotes are container blocks
-    elif re.search(BULLET_LIST_MARKER, line):
-        line_without_marker = re.sub(BULLET_LIST_MARKER, "", line)
+            new_node = CodeBlockNode(document, CodeBlockType.INDENTED, raw_content=code_text)
+            open_blocks.append(new_node)
+        case "fenced_code_block":
+            info_text = None
+            if line.lstrip()[0] == '`':
+                info_text = line.replace("`", "").strip()
+            else:
+                info_text = re.sub(r'^[ ]{0,3}~+', "", line).strip()
+            if info_text == "":
+                info_text = None
+
+            indentation_match_obj = re.search(r'^[ ]{0,3}', line)
+            indentation_width = 0
+            if indentation_match_obj:
+                indentation_width = len(indentation_match_obj.group())
+
+            delimiter_char = line.lstrip()[0]
+            delimiter_count = len(re.sub(r'[^' + delimiter_char + ']', "", line).strip())
+
+            new_node = CodeBlockNode(document, CodeBlockType.FENCED, info_text, delimiter_char, delimiter_count, indentation_width)
+            open_blocks.append(new_node)
+        case "html_block_1" | "html_block_2" | "html_block_3" | "html_block_4" | "html_block_5" | "html_block_6" | "html_block_7":
+            block_type = int(block_kind[-1])
+            new_node = HTMLBlockNode(document, block_type, line)
+
+            if block_type <= 5 and HTML_BLOCK_END_RE[block_type].search(line): # an HTML block may be closed on the same line it has been opened (except for types 6 and 7, as their closing condition is a blank line)
+                new_node.open = False
+            else:
+                open_blocks.append(new_node)
+        case "block_quote":
+            line_without_marker = line[block_start.end():]
+            new_node = Node(document, NodeType.BLOCK_QUOTE, line_without_marker)
+            open_blocks.append(new_node)
 
-        continuation_indent_matchobj = re.search(BULLET_LIST_MARKER, line)
-        continuation_indent = len(continuation_indent_matchobj.group().lstrip())
+            openBlock(new_node, line_without_marker, open_blocks=open_blocks) # block quotes are container blocks
+        case "bullet_list":
+            line_without_marker = line[block_start.end():]
 
-        delimiter_char = re.search(BULLET_LIST_MARKER, line).group().strip()
+            continuation_indent = len(block_start.group().lstrip())
 
-        if deepest_open_child and deepest_open_child.node_type == NodeType.LIST and deepest_open_child.list_type == ListType.UNORDERED and deepest_open_child.delimiter == delimiter_char: # if another list of the same type **and the same delimiter** is already open, then just append the new list item to that one
-            new_node = ListItemNode(deepest_open_child, line_without_marker, continuation_indent)
+            delimiter_char = block_start.group().strip()
 
-            openBlock(new_node, line_without_marker)
-        else:      
-            new_list_node = ListNode(document, ListType.UNORDERED, delimiter_char)
-            new_node = ListItemNode(new_list_node, line_without_marker, continuation_indent)
+            if deepest_open_child and deepest_open_child.node_type == NodeType.LIST and deepest_open_child.list_type == ListType.UNORDERED and deepest_open_child.delimiter == delimiter_char: # if another list of the same type **and the same delimiter** is already open, then just append the new list item to that one
+                new_node = ListItemNode(deepest_open_child, line_without_marker, continuation_indent)
+                open_blocks.append(new_node)
 
-            openBlock(new_node, line_without_marker)
-    elif re.search(ORDERED_LIST_MARKER, line):
-        line_without_marker = re.sub(ORDERED_LIST_MARKER, "", line)
+                openBlock(new_node, line_without_marker, open_blocks=open_blocks)
+            else:      
+                new_list_node = ListNode(document, ListType.UNORDERED, delimiter_char)
+                new_node = ListItemNode(new_list_node, line_without_marker, continuation_indent)
+                open_blocks.append(new_list_node)
+                open_blocks.append(new_node)
 
-        list_marker = re.search(ORDERED_LIST_MARKER, line).group()
-        continuation_indent = len(list_marker.lstrip())
-        delimiter_char = re.sub(r'\d', "", list_marker.strip())
-        starting_number = int(re.sub(r'(\.|\))', "", list_marker.strip()))
+                openBlock(new_node, line_without_marker, open_blocks=open_blocks)
+        case "ordered_list":
+            line_without_marker = line[block_start.end():]
 
-        if deepest_open_child and deepest_open_child.node_type == NodeType.LIST and deepest_open_child.list_type == ListType.ORDERED and deepest_open_child.delimiter == delimiter_char: # same as bullet list
-            new_node = ListItemNode(deepest_open_child, line_without_marker, continuation_indent)
+            list_marker = block_start.group()
+            continuation_indent = len(list_marker.lstrip())
+            delimiter_char = re.sub(r'\d', "", list_marker.strip())
+            starting_number = int(re.sub(r'(\.|\))', "", list_marker.strip()))
 
-            openBlock(new_node, line_without_marker)
-        else:
-            new_list_node = ListNode(document, ListType.ORDERED, delimiter_char, starting_number)
-            new_node = ListItemNode(new_list_node, line_without_marker, continuation_indent)
+            if deepest_open_child and deepest_open_child.node_type == NodeType.LIST and deepest_open_child.list_type == ListType.ORDERED and deepest_open_child.delimiter == delimiter_char: # same as bullet list
+                new_node = ListItemNode(deepest_open_child, line_without_marker, continuation_indent)
+                open_blocks.append(new_node)
 
-            openBlock(new_node, line_without_marker)
-    else: # just a normal paragraph
-        if not re.search(BLANK_LINE, line):
-            new_node = Node(document, NodeType.PARAGRAPH, line.lstrip())
+                openBlock(new_node, line_without_marker, open_blocks=open_blocks)
+            else:
+                new_list_node = ListNode(document, ListType.ORDERED, delimiter_char, starting_number)
+                new_node = ListItemNode(new_list_node, line_without_marker, continuation_indent)
+                open_blocks.append(new_list_node)
+                open_blocks.append(new_node)
+
+                openBlock(new_node, line_without_marker, open_blocks=open_blocks)
+        case _: # just a normal paragraph
+            if not BLANK_LINE_RE.search(line):
+                new_node = Node(document, NodeType.PARAGRAPH, line.lstrip())
+                open_blocks.append(new_node)
+
+# The first match of a pattern in the text at or after a position, like pattern.search(text, position). The last match is kept and returned again as long as it does not lie before the position: without a match between the start of the last search and that match, there can be none between the position and the match either. Searching the rest of a paragraph for a link title, which may not come at all, for each of its link reference defs would take quadratic time otherwise
+class ForwardSearch:
+    def __init__(self, pattern: re.Pattern, text: str):
+        self.pattern = pattern
+        self.text = text
+
+        self.start: int = None # of the last search
+        self.match: re.Match = None
+
+    def search(self, position: int):
+        if self.start is None or position < self.start or (self.match is not None and self.match.start() < position):
+            self.start = position
+            self.match = self.pattern.search(self.text, position)
+        return self.match
+
+def parseLinkReferenceDefs(paragraph_node: Node, link_reference_defs: LinkReferenceTable):
+    original_raw_content = paragraph_node.raw_content
+    possible_reference_defs = LINK_REFERENCE_DEF_LABEL_RE.finditer(original_raw_content)
 
-def parseLinkReferenceDefs(paragraph_node: Node, link_reference_defs: list[LinkReferenceDefinition]):
-    possible_reference_defs = re.finditer(LINK_LABEL + r'\:', paragraph_node.raw_content)
+    # Everything is looked up by its position in the original raw content, and the definitions are removed from it in one go at the end; copying the rest of the paragraph & replacing in all of it for every single definition took quadratic time
+    destination_search = ForwardSearch(LINK_DESTINATION_RE, original_raw_content)
+    title_search = ForwardSearch(LINK_TITLE_RE, original_raw_content)
+    reference_def_spans: list[tuple[int, int]] = [] # start & end of the full reference definitions, i.e. of the text to remove from the paragraph node's raw content
 
-    original_raw_content = paragraph_node.raw_content
-    
     for definition in possible_reference_defs:
-        full_reference_def_string = definition.group() # save the full reference definition as a string so we can remove it from the paragraph node's raw content later
-
-        string_after_label = original_raw_content[definition.end():]
+        full_reference_def_end = definition.end()
         link_reference = None
 
-        if re.search(LINK_DESTINATION, string_after_label.lstrip()):
-            full_reference_def_string += string_after_label[:re.search(LINK_DESTINATION, string_after_label.lstrip()).end()]
+        # the destination & the title are searched for with the leading whitespace stripped off, but the length of a match counts from where the whitespace begins
+        destination_start = LEADING_WHITESPACE_RE.match(original_raw_content, full_reference_def_end).end()
+        link_destination = destination_search.search(destination_start)
+        if link_destination:
+            full_reference_def_end += link_destination.end() - destination_start
 
-            link_reference = LinkReferenceDefinition(definition.group().lstrip()[1:-2], re.search(LINK_DESTINATION, string_after_label.lstrip()).group())
+            link_reference = LinkReferenceDefinition(definition.group().lstrip()[1:-2], link_destination.group())
             link_reference_defs.append(link_reference)
 
-            string_after_label = string_after_label[re.search(LINK_DESTINATION, string_after_label.lstrip()).end():]
+        if link_reference:
+            title_start = LEADING_WHITESPACE_RE.match(original_raw_content, full_reference_def_end).end()
+            link_title = title_search.search(title_start)
+            if link_title:
+                full_reference_def_end += link_title.end() - title_start
+
+                link_reference.link_title = link_title.group()[1:-1] # remove the surrounding quotation marks or brackets
 
-        if link_reference and re.search(LINK_TITLE, string_after_label.lstrip()):
-            full_reference_def_string += string_after_label[:re.search(LINK_TITLE, string_after_label.lstrip()).end()]
+            reference_def_spans.append((definition.start(), full_reference_def_end))
 
-            link_reference.link_title = re.search(LINK_TITLE, string_after_label.lstrip()).group()[1:-1] # remove the surrounding quotation marks or brackets
+    if reference_def_spans: # delete the link reference defs from the node's raw content, as link reference definitions are not "a structural element of the document" (sec. 4.7)
+        remaining_raw_content = []
+        kept_from = 0
+        for span_start, span_end in reference_def_spans: # a definition whose title has been found far ahead overlaps the ones after it
+            if span_start > kept_from:
+                remaining_raw_content.append(original_raw_content[kept_from:span_start])
+            kept_from = max(kept_from, span_end)
+        remaining_raw_content.append(original_raw_content[kept_from:])
 
-        if link_reference:
-            paragraph_node.raw_content = paragraph_node.raw_content.replace(full_reference_def_string, "") # delete the link reference defs from the node's raw content, as link reference definitions are not "a structural element of the document" (sec. 4.7)
\ No newline at end of file
+        paragraph_node.raw_content = "".join(remaining_raw_content)
\ No newline at end of file
@@ -0,0 +1,200 @@
+#!/bin/python3
+
+# Command line interface for converting whole directory trees of Markdown files without the editor.
+# Usage (from the root directory of this project): python -m libs.cli convert SRC DST [--format html|json] [--jobs N] [--cache DIR] [--force] [--standalone]
+#                                                 python -m libs.cli profile SRC [--arena]
+# SRC may be a single file (DST is then the output file) or a directory, whose Markdown files are converted into the same relative paths below DST. Outputs that are newer than their source are skipped, unless --force is given.
+import argparse
+import contextlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .parser import Parser
+from .htmlrenderer import HTMLRenderer
+from .jsonrenderer import JSONRenderer
+from .parse_cache import ParseCache
+from .stats import Stats
+
+MARKDOWN_EXTENSIONS = [".md", ".markdown", ".mdown", ".mkd"]
+OUTPUT_EXTENSIONS = {"html": ".html", "json": ".json"}
+
+# outcome of the conversion of one file
+CONVERTED = "converted"
+FAILED = "failed"
+
+# Every worker process parses & renders all files it is given with the same parser and renderer (so that e.g. the fragment cache of the HTML renderer is shared between them)
+worker_state: dict = {}
+
+def initializeWorker(output_format: str, standalone: bool, cache_directory: str):
+    cache = None
+    if cache_directory:
+        cache = ParseCache(cache_directory)
+    worker_state["parser"] = Parser(cache=cache)
+
+    if output_format == "json":
+        worker_state["renderer"] = JSONRenderer({"jsonIndent": 4, "debug_infos": False, "compact": False}) # the same options as the editor's JSON export
+    else:
+        worker_state["renderer"] = HTMLRenderer({"indent": 4, "include_html_backbone": standalone, "css_styling": "", "fragment_cache_size": 4096})
+
+# The Markdown files below "source" & their output paths below "destination", in the order of the directory tree
+def findSourceFiles(source: str, destination: str, output_format: str):
+    if os.path.isfile(source):
+        if os.path.isdir(destination):
+            destination = os.path.join(destination, os.path.splitext(os.path.basename(source))[0] + OUTPUT_EXTENSIONS[output_format])
+        return [(source, destination)]
+
+    files = []
+    for directory, subdirectories, file_names in os.walk(source):
+        subdirectories.sort()
+        for file_name in sorted(file_names):
+            base_name, extension = os.path.splitext(file_name)
+            if extension.lower() not in MARKDOWN_EXTENSIONS:
+                continue
+
+            relative_directory = os.path.relpath(directory, source)
+            output_path = os.path.normpath(os.path.join(destination, relative_directory, base_name + OUTPUT_EXTENSIONS[output_format]))
+            files.append((os.path.join(directory, file_name), output_path))
+    return files
+
+def isUpToDate(source_path: str, output_path: str):
+    try:
+        return os.path.getmtime(output_path) >= os.path.getmtime(source_path)
+    except FileNotFoundError:
+        return False
+
+# Converts a single file; runs in a worker process. Returns the outcome, the size of the source in bytes and an error message for failures
+def convertFile(paths: tuple[str, str]):
+    source_path, output_path = paths
+
+    try:
+        with open(source_path, "r", encoding="utf-8", newline="") as source_file:
+            markdown_input = source_file.read()
+        document = worker_state["parser"].parse(markdown_input)
+
+        output_directory = os.path.dirname(output_path) or "."
+        os.makedirs(output_directory, exist_ok=True)
+
+        # write to a temporary file next to the output & move it into place, so that an interrupted conversion never leaves a partially written output behind (which would then be "newer than its source")
+        temporary_path = os.path.join(output_directory, f".{os.path.basename(output_path)}.{os.getpid()}.tmp") # unique per process; not created with tempfile, as that would make the output readable only by its owner
+        try:
+            with open(temporary_path, "w", encoding="utf-8", newline="") as output_file:
+                worker_state["renderer"].render_to(document, output_file)
+            os.replace(temporary_path, output_path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError): # open() may have failed before creating it (e.g. in a directory that is not writable)
+                os.remove(temporary_path)
+            raise
+    except Exception as error: # one broken file should not stop the conversion of all the others
+        return FAILED, 0, f"{source_path}: {error}"
+
+    return CONVERTED, os.path.getsize(source_path), None
+
+def getSize(path: str):
+    try:
+        return os.path.getsize(path)
+    except OSError: # reported when the file is converted
+        return 0
+
+def getCPUCount():
+    if hasattr(os, "sched_getaffinity"): # the CPUs this process may actually run on
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# Splits the files into chunks that are large enough to make handing them to a worker process cheap, but small enough that all workers stay busy until the end
+def getChunkSize(file_count: int, jobs: int):
+    return max(1, min(64, file_count // (jobs * 8)))
+
+def convert(arguments: argparse.Namespace):
+    start_time = time.perf_counter()
+
+    files = findSourceFiles(arguments.source, arguments.destination, arguments.format)
+    if not arguments.force:
+        files_to_convert = [paths for paths in files if not isUpToDate(*paths)]
+    else:
+        files_to_convert = files
+    skipped_count = len(files) - len(files_to_convert)
+
+    files_to_convert.sort(key=lambda paths: getSize(paths[0]), reverse=True) # largest files first, so that no worker is still busy with a large file when all others are done
+
+    jobs = arguments.jobs or getCPUCount()
+    initializer_arguments = (arguments.format, arguments.standalone, arguments.cache)
+
+    if jobs == 1 or len(files_to_convert) <= 1:
+        initializeWorker(*initializer_arguments)
+        results = map(convertFile, files_to_convert)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=initializeWorker, initargs=initializer_arguments)
+        results = executor.map(convertFile, files_to_convert, chunksize=getChunkSize(len(files_to_convert), jobs))
+
+    converted_count = 0
+    failed_count = 0
+    total_bytes = 0
+    try:
+        for outcome, size, error_message in results:
+            if outcome == FAILED:
+                failed_count += 1
+                print(f"error: {error_message}", file=sys.stderr)
+            else:
+                converted_count += 1
+                total_bytes += size
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+    elapsed_time = time.perf_counter() - start_time
+    print(f"{len(files)} files: {converted_count} converted, {skipped_count} up to date, {failed_count} failed")
+    print(f"{total_bytes} bytes of Markdown in {elapsed_time:.2f}s ({total_bytes / 1024 / 1024 / max(elapsed_time, 1e-9):.2f} MiB/s, {converted_count / max(elapsed_time, 1e-9):.1f} files/s)")
+
+    return 1 if failed_count else 0
+
+# Parses & renders a single file with stats enabled and prints where the time went
+def profile(arguments: argparse.Namespace):
+    with open(arguments.source, "r", encoding="utf-8", newline="") as source_file:
+        markdown_input = source_file.read()
+
+    stats = Stats()
+    document = Parser(arena=arguments.arena, stats=stats).parse(markdown_input)
+    for _ in HTMLRenderer({"indent": 4, "include_html_backbone": False, "css_styling": "", "fragment_cache_size": 0}, stats=stats).iter_render(document):
+        pass
+    for _ in JSONRenderer({"jsonIndent": 4, "debug_infos": False, "compact": False}, stats=stats).iter_render(document):
+        pass
+
+    print(stats.report())
+    return 0
+
+def main(argv: list[str] = None):
+    argument_parser = argparse.ArgumentParser(prog="python -m libs.cli", description="Converts Markdown files to HTML or JSON.")
+    subcommands = argument_parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subcommands.add_parser("convert", help="convert a Markdown file or all Markdown files below a directory")
+    convert_parser.add_argument("source", metavar="SRC", help="Markdown file or directory")
+    convert_parser.add_argument("destination", metavar="DST", help="output file or directory")
+    convert_parser.add_argument("--format", choices=list(OUTPUT_EXTENSIONS), default="html", help="output format (default: html)")
+    convert_parser.add_argument("--jobs", "-j", type=int, default=0, help="number of worker processes (default: number of CPUs)")
+    convert_parser.add_argument("--cache", metavar="DIR", help="directory of a parse cache shared between runs")
+    convert_parser.add_argument("--force", action="store_true", help="also convert files whose output is newer than the source")
+    convert_parser.add_argument("--standalone", action="store_true", help="wrap HTML output in a complete HTML document")
+
+    profile_parser = subcommands.add_parser("profile", help="parse & render a Markdown file and print the time per phase and other counters")
+    profile_parser.add_argument("source", metavar="SRC", help="Markdown file")
+    profile_parser.add_argument("--arena", action="store_true", help="parse into a NodeArena")
+
+    arguments = argument_parser.parse_args(argv)
+    if getattr(arguments, "jobs", 0) < 0:
+        argument_parser.error("--jobs must not be negative")
+
+    match arguments.command:
+        case "convert":
+            if not os.path.exists(arguments.source):
+                argument_parser.error(f"{arguments.source} does not exist")
+            return convert(arguments)
+        case "profile":
+            if not os.path.isfile(arguments.source):
+                argument_parser.error(f"{arguments.source} is not a file")
+            return profile(arguments)
+
+if __name__ == "__main__":
+    sys.exit(main())
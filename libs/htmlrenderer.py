@@ -1,107 +1,70 @@
+from collections import OrderedDict
 from .node import *
+from .stats import Stats
 
 DEFAULT_OPTIONS = {
     "indent": 4,
     "include_html_backbone": False,
     "css_styling": "",
-    "softbreak_rendering": "" # TODO: actually implement this into the renderer
+    "softbreak_rendering": "", # TODO: actually implement this into the renderer
+    "fragment_cache_size": 65536, # number of top-level blocks whose HTML is kept for the next render; 0 disables the cache
+    "fragment_cache_characters": 16777216 # total length of the HTML kept in the fragment cache; the least recently used fragments are dropped beyond it, and a single fragment longer than this is not kept at all
 }
 
+# Every function returns the HTML before & after the children of a node; the children themselves are rendered by iterRenderNodes(), without recursion (so that deeply nested block quotes or lists cannot hit the recursion limit)
 def block_quote(block_quote_node: Node):
-    output = "<blockquote>"
-    for child in block_quote_node.children:
-        output += ASSOCIATED_FUNCTION[child.node_type](child)
-    output += "</blockquote>"
-
-    return output
+    return "<blockquote>", "</blockquote>"
 
 def code_block(code_block_node: CodeBlockNode):
-    return f"<pre><code>{code_block_node.raw_content}</code></pre>"
+    return f"<pre><code>{code_block_node.raw_content}</code></pre>", ""
 
 def paragraph(paragraph_node: Node):
     if not paragraph_node.children:
-        return ""
-
-    output = "<p>"
-    for child in paragraph_node.children:
-        output += ASSOCIATED_FUNCTION[child.node_type](child)
-    output += "</p>"
+        return "", ""
 
-    return output
+    return "<p>", "</p>"
 
 def heading(heading_node: HeadingNode):
-    output = f"<h{heading_node.heading_level}>"
-    for child in heading_node.children:
-        output += ASSOCIATED_FUNCTION[child.node_type](child)
-    output += f"</h{heading_node.heading_level}>"
-
-    return output
+    return f"<h{heading_node.heading_level}>", f"</h{heading_node.heading_level}>"
 
 def thematic_break(thematic_break_node: Node):
-    return "<hr/>"
+    return "<hr/>", ""
 
 def html_block(html_block_node: HTMLBlockNode):
-    return html_block_node.raw_content
+    return html_block_node.raw_content, ""
 
 def list(list_node: ListNode):
     tag_name = "ul"
     if list_node.list_type == ListType.ORDERED:
         tag_name = "ol"
 
-    output = f"<{tag_name}>"
-    for child in list_node.children:
-        output += ASSOCIATED_FUNCTION[child.node_type](child)
-    output += f"</{tag_name}>"
-
-    return output
+    return f"<{tag_name}>", f"</{tag_name}>"
 
 def list_item(list_item_node: ListItemNode): # TODO: implement list tightness
-    output = "<li>"
-    for child in list_item_node.children:
-        output += ASSOCIATED_FUNCTION[child.node_type](child)
-    output += "</li>"
-
-    return output
+    return "<li>", "</li>"
 
 def text(text_node: Node):
-    return text_node.content
+    return text_node.content, ""
 
 def softbreak(softbreak_node: Node):
-    return "\n"
+    return "\n", ""
 
 def linebreak(linebreak_node: Node):
-    return "<br/>"
+    return "<br/>", ""
 
 def inline_code(inline_code_node: Node):
-    return f"<code>{inline_code_node.raw_content}</code>"
+    return f"<code>{inline_code_node.raw_content}</code>", ""
 
 def emphasis(emphasis_node: Node):
-    output = "<em>"
-    for child in emphasis_node.children:
-        output += ASSOCIATED_FUNCTION[child.node_type](child)
-    output += "</em>"
-
-    return output
+    return "<em>", "</em>"
 
 def strong(strong_node: Node):
-    output = "<strong>"
-    for child in strong_node.children:
-        output += ASSOCIATED_FUNCTION[child.node_type](child)
-    output += "</strong>"
-
-    return output
+    return "<strong>", "</strong>"
 
 def link(link_node: LinkOrImageNode):
     if link_node.title:
-        output = f"<a href=\"{link_node.link_destination}\" title=\"{link_node.title}\">"
-    else:
-        output = f"<a href=\"{link_node.link_destination}\">"
-
-    for child in link_node.children:
-        output += ASSOCIATED_FUNCTION[child.node_type](child)
-    output += "</a>"
-
-    return output
+        return f"<a href=\"{link_node.link_destination}\" title=\"{link_node.title}\">", "</a>"
+    return f"<a href=\"{link_node.link_destination}\">", "</a>"
 
 def image(image_node: LinkOrImageNode):
     alt_text = ""
@@ -109,11 +72,11 @@ def image(image_node: LinkOrImageNode):
         alt_text += child.content
 
     if image_node.title:
-        return f"<img src=\"{image_node.link_destination}\" alt=\"{alt_text}\" title=\"{image_node.title}\" />"
-    return f"<img src=\"{image_node.link_destination}\" alt=\"{alt_text}\" />"
+        return f"<img src=\"{image_node.link_destination}\" alt=\"{alt_text}\" title=\"{image_node.title}\" />", ""
+    return f"<img src=\"{image_node.link_destination}\" alt=\"{alt_text}\" />", ""
 
 def html_inline(html_inline_node: Node):
-    return f"{html_inline_node.raw_content}"
+    return f"{html_inline_node.raw_content}", ""
 
 ASSOCIATED_FUNCTION = {
     NodeType.BLOCK_QUOTE: block_quote,
@@ -139,38 +102,129 @@ ASSOCIATED_FUNCTION = {
     NodeType.CUSTOM_INLINE: None   
 }
 
-class HTMLRenderer:
-    def __init__(self, options: dict = DEFAULT_OPTIONS):
-        self.options = options
+# the node types whose children are rendered in between their opening & closing HTML (the others either have no children or render them on their own, like the alt text of an image)
+RENDERS_CHILDREN = [NodeType.BLOCK_QUOTE, NodeType.PARAGRAPH, NodeType.HEADING, NodeType.LIST, NodeType.LIST_ITEM, NodeType.EMPHASIS, NodeType.STRONG, NodeType.LINK]
 
-        self.output = ""
-        
-    def render(self, document_node: Node):
-        self.output = ""
+CHUNK_SIZE = 65536 # iter_render() & render_to() pass the output on in chunks of (at least) this many characters
 
-        if self.options["include_html_backbone"]:
-            self.output = f"<!DOCTYPE html>\n<html>\n<head>\n<style>" + self.options["css_styling"] + "</style>\n</head>\n<body>\n"
+# Yields the HTML of the nodes (and all of their descendants) piece by piece; the stack holds the nodes still to render and the closing HTML of the nodes that have been opened
+def iterRenderNodes(nodes): # "nodes" is a list of Nodes (not annotated as such, as "list" is one of the renderer functions above)
+    stack = [*reversed(nodes)]
 
-        if document_node.children:
-            for child in document_node.children:
-                self.output += ASSOCIATED_FUNCTION[child.node_type](child)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            yield node
+            continue
 
-        if self.options["include_html_backbone"]:
-            self.output += "\n</body>\n</html>"
+        opening, closing = ASSOCIATED_FUNCTION[node.node_type](node)
+        yield opening
 
-        return self.output
+        if closing:
+            stack.append(closing)
+        if node.node_type in RENDERS_CHILDREN:
+            stack.extend(reversed(node.children))
+
+class HTMLRenderer:
+    def __init__(self, options: dict = DEFAULT_OPTIONS, stats = False):
+        self.options = options
+
+        # time spent rendering & counters (see stats.py); True creates a new Stats object, pass the parser's to get a single report
+        self.stats: Stats = None
+        if stats is True:
+            self.stats = Stats()
+        elif stats:
+            self.stats = stats
 
-    def renderWithoutStyling(self, document_node: Node):
         self.output = ""
 
+        # HTML of top-level blocks by their fingerprint (see Parser.getFingerprint()), least recently used first; after an edit, only the blocks that changed need to be rendered again
+        self.fragment_cache: OrderedDict[bytes, str] = OrderedDict()
+        self.fragment_cache_size: int = self.options.get("fragment_cache_size", DEFAULT_OPTIONS["fragment_cache_size"])
+        self.fragment_cache_characters: int = self.options.get("fragment_cache_characters", DEFAULT_OPTIONS["fragment_cache_characters"])
+        self.cached_characters = 0 # total length of the fragments in the cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def iterRenderBlocks(self, blocks):
+        for block in blocks:
+            fingerprint = getattr(block, "fingerprint", None) # not every block has one (e.g. the blocks of a NodeArena)
+            if fingerprint is None or not self.fragment_cache_size:
+                yield from iterRenderNodes([block])
+                continue
+
+            fragment = self.fragment_cache.get(fingerprint)
+            if fragment is None:
+                self.cache_misses += 1
+
+                fragment = "".join(iterRenderNodes([block]))
+                if len(fragment) <= self.fragment_cache_characters: # bounding the number of fragments alone is not enough: e.g. every edit of a huge code block leaves the HTML of the whole block behind
+                    self.fragment_cache[fingerprint] = fragment
+                    self.cached_characters += len(fragment)
+                    while len(self.fragment_cache) > self.fragment_cache_size or self.cached_characters > self.fragment_cache_characters:
+                        self.cached_characters -= len(self.fragment_cache.popitem(last=False)[1])
+            else:
+                self.cache_hits += 1
+                self.fragment_cache.move_to_end(fingerprint)
+
+            yield fragment
+
+    # The HTML of a single top-level block (through the fragment cache), e.g. to update only the blocks of a preview that have changed
+    def renderFragment(self, block: Node):
+        return "".join(self.iterRenderBlocks([block]))
+
+    # Drops the HTML of all blocks but the given ones (e.g. the top-level blocks of the document being edited) from the fragment cache. For a renderer that only ever renders one document, like the editor's preview: the fragments of blocks that have since been edited away would only be used again by an undo. The cache is not pruned on its own, as a renderer may be shared by several documents (see cli.py)
+    def retainFragments(self, blocks):
+        fingerprints = {getattr(block, "fingerprint", None) for block in blocks}
+        for fingerprint in [fingerprint for fingerprint in self.fragment_cache if fingerprint not in fingerprints]:
+            self.cached_characters -= len(self.fragment_cache.pop(fingerprint))
+
+    # Yields the HTML of the document in chunks of about CHUNK_SIZE characters
+    def iter_render(self, document_node: Node, include_styling: bool = True):
+        if self.stats is not None:
+            return self.iterRenderWithStats(document_node, include_styling)
+        return self.iterRenderDocument(document_node, include_styling)
+
+    def iterRenderWithStats(self, document_node: Node, include_styling: bool):
+        cache_hits, cache_misses = self.cache_hits, self.cache_misses
+        yield from self.stats.timeIterator("html_rendering", self.iterRenderDocument(document_node, include_styling))
+
+        self.stats.counts["html_rendering.fragment_cache_hits"] += self.cache_hits - cache_hits
+        self.stats.counts["html_rendering.fragment_cache_misses"] += self.cache_misses - cache_misses
+        self.stats.countNodes(document_node, "html_rendering.")
+
+    def iterRenderDocument(self, document_node: Node, include_styling: bool):
         if self.options["include_html_backbone"]:
-            self.output = f"<!DOCTYPE html>\n<html>\n<body>\n"
-
-        if document_node.children:
-            for child in document_node.children:
-                self.output += ASSOCIATED_FUNCTION[child.node_type](child)
+            if include_styling:
+                yield f"<!DOCTYPE html>\n<html>\n<head>\n<style>" + self.options["css_styling"] + "</style>\n</head>\n<body>\n"
+            else:
+                yield f"<!DOCTYPE html>\n<html>\n<body>\n"
+
+        chunk = []
+        chunk_size = 0
+        for piece in self.iterRenderBlocks(document_node.children):
+            chunk.append(piece)
+            chunk_size += len(piece)
+
+            if chunk_size >= CHUNK_SIZE:
+                yield "".join(chunk)
+                chunk = []
+                chunk_size = 0
+        if chunk:
+            yield "".join(chunk)
 
         if self.options["include_html_backbone"]:
-            self.output += "\n</body>\n</html>"
+            yield "\n</body>\n</html>"
+
+    # Writes the HTML of the document to a file-like object, without ever holding all of it in memory
+    def render_to(self, document_node: Node, writer, include_styling: bool = True):
+        for chunk in self.iter_render(document_node, include_styling):
+            writer.write(chunk)
 
-        return self.output
\ No newline at end of file
+    def render(self, document_node: Node):
+        self.output = "".join(self.iter_render(document_node))
+        return self.output
+
+    def renderWithoutStyling(self, document_node: Node):
+        self.output = "".join(self.iter_render(document_node, False))
+        return self.output
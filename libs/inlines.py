@@ -1,11 +1,13 @@
 import re
 
-from .link_reference_definition import LinkReferenceDefinition
+from .link_reference_definition import LinkReferenceTable
 from .node import *
 from .regexps import *
 from enum import Enum
 
 
+LINK_LABEL_LOOKAHEAD = 1 + 2 + 2 * 1000 + 1 # the characters after a "]" that a (full or collapsed) reference link can look at: "[", then a link label (see LINK_LABEL), i.e. a line ending, "[", at most 1000 (possibly backslash-escaped) characters and "]"
+
 class DelimiterFunction(Enum):
     OPENING = 1
     CLOSING = 2
@@ -16,8 +18,14 @@ class DelimiterStackEntry:
         self.referenced_text_node = referenced_text_node
         self.delimiter_type = delimiter_type
         self.delimiter_count = delimiter_count
+        self.original_delimiter_count = delimiter_count # length of the whole delimiter run; needed for the "multiple of 3" rule (sec. 6.2, rules 9 & 10)
         self.function = function    # one of the values in "DelimiterFunction" enum
         self.active = active
+        self.node_index: int = None # index of the referenced text node among the children of the block; only kept for link & image openers (see look_for_link_or_image()). A link only ever replaces the children from its opener on, so the ones before an opener keep their places
+
+        # neighbours on the delimiter stack
+        self.previous: DelimiterStackEntry = None
+        self.next: DelimiterStackEntry = None
 
     def __eq__(self, other):
         return (self.referenced_text_node == other.referenced_text_node)
@@ -25,422 +33,412 @@ class DelimiterStackEntry:
     def __str__(self):
         return f'{repr(self)}:\n(referenced_text_node:{self.referenced_text_node}\nself.delimiter_type:{self.delimiter_type}\n\t↳count:{self.delimiter_count}\nfunction:{self.function}\nactive:{self.active})'
 
-def parseInlines(root_block: Node, raw_content: str, link_reference_defs: list[LinkReferenceDefinition]):
-    current_char_index = 0
-    raw_content_from_index = root_block.raw_content[current_char_index:]
+    def canOpen(self):
+        return self.function == DelimiterFunction.OPENING or self.function == DelimiterFunction.BOTH
 
-    delimiter_stack: list[DelimiterStackEntry] = []
+    def canClose(self):
+        return self.function == DelimiterFunction.CLOSING or self.function == DelimiterFunction.BOTH
 
-    while current_char_index < len(root_block.raw_content):
-        if re.match(r"\\", raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
-
-            if len(raw_content_from_index) == 1: # if the '\' is the end of input
-                next_char = ""
-            else:
-                next_char = raw_content_from_index[1]
+# The delimiter stack as a doubly linked list, so that entries can be removed from anywhere in it in constant time (process_emphasis() removes a lot of them)
+class DelimiterStack:
+    def __init__(self):
+        self.top: DelimiterStackEntry = None
 
-            if re.match(f"[{ASCII_PUNCTUATION_CHARS}]", next_char):
-                new_node = Node(root_block, NodeType.TEXT)
-                new_node.content = next_char
-                new_node.open = False
+    def __bool__(self):
+        return self.top is not None
 
-                current_char_index += 2
-                raw_content_from_index = root_block.raw_content[current_char_index:]
-            elif re.match(LINE_ENDING, next_char):
-                new_node = Node(root_block, NodeType.LINEBREAK)
-                new_node.open = False
+    def push(self, entry: DelimiterStackEntry):
+        entry.previous = self.top
+        entry.next = None
+        if self.top:
+            self.top.next = entry
+        self.top = entry
 
-                current_char_index += 2
-                raw_content_from_index = root_block.raw_content[current_char_index:]
-            else:
-                new_node = Node(root_block, NodeType.TEXT)
-                new_node.content = "\\"
-                new_node.open = False
+    def remove(self, entry: DelimiterStackEntry):
+        if entry.previous:
+            entry.previous.next = entry.next
+        if entry.next:
+            entry.next.previous = entry.previous
+        else:
+            self.top = entry.previous
+
+    def removeAbove(self, bottom: DelimiterStackEntry): # removes all entries above "bottom"; all of them if "bottom" is None
+        if bottom:
+            bottom.next = None
+        self.top = bottom
+
+    def removeBetween(self, lower: DelimiterStackEntry, upper: DelimiterStackEntry): # removes all entries between "lower" and "upper"
+        lower.next = upper
+        upper.previous = lower
+
+# Every inline node but literal text is complete (and closed) as soon as it has been created, and literal text is closed before anything else gets added; hence only the last child of the block can be open. Saves getDeepestOpenChild() from going through all the (closed) children every time
+def getDeepestOpenInline(root_block: Node):
+    if root_block.children and root_block.children[-1].open:
+        return root_block.children[-1]
+    return root_block
+
+# All backtick strings of a block by their length, so that finding the closer of a code span does not mean scanning the rest of the block again for every opener (which made a block with many unmatched backtick strings quadratic).
+# The openers are looked up from left to right, so the cursor for each length only ever moves forward: every backtick string is passed over at most once (this is how cmark does it)
+class BacktickRunIndex:
+    def __init__(self, text: str):
+        self.starts_by_length: dict[int, list[int]] = {}
+        for backtick_string in BACKTICK_STRING_RE.finditer(text):
+            self.starts_by_length.setdefault(backtick_string.end() - backtick_string.start(), []).append(backtick_string.start())
+
+        self.cursors: dict[int, int] = {}
+
+    def findCloser(self, length: int, start: int): # the position of the first backtick string of exactly "length" backticks at or after "start"; None if there is none
+        starts = self.starts_by_length.get(length)
+        if not starts:
+            return None
+
+        cursor = self.cursors.get(length, 0)
+        while cursor < len(starts) and starts[cursor] < start:
+            cursor += 1
+        self.cursors[length] = cursor
+
+        if cursor < len(starts):
+            return starts[cursor]
+        return None
+
+def parseInlines(root_block: Node, raw_content: str, link_reference_defs: LinkReferenceTable):
+    current_char_index = 0
+    text = root_block.raw_content
 
-                current_char_index += 1
-                raw_content_from_index = root_block.raw_content[current_char_index:]
+    delimiter_stack = DelimiterStack()
+    backtick_runs: BacktickRunIndex = None # built when the first backtick string is found
 
-        elif re.match(URI_AUTOLINK, raw_content_from_index): # re.match NOT re.search, as we're searching for matches only in the beginning of the string to ensure a correct order of parsing
-            root_block.getDeepestOpenChild().open = False
+    # Instead of matching every pattern against the rest of the string, dispatch on the current character (every inline construct begins with a specific one) and match the fitting patterns at the current position
+    while current_char_index < len(text):
+        next_char_index = None # stays None if no inline construct starts here; the text up to the next special character is then literal text
 
-            link_dest = re.match(URI_AUTOLINK, raw_content_from_index).group().replace("<", "").replace(">", "")
+        match text[current_char_index]:
+            case "\\":
+                getDeepestOpenInline(root_block).open = False
 
-            new_node = LinkOrImageNode(root_block, NodeType.LINK, link_dest, link_dest, "")
-            new_node.open = False
-            link_text_node = Node(new_node, NodeType.TEXT)
-            link_text_node.content = link_dest
-            link_text_node.open = False
+                next_char = text[current_char_index + 1:current_char_index + 2] # empty if the '\' is the end of input
 
-            current_char_index += re.match(URI_AUTOLINK, raw_content_from_index).end() # advance the inline parser to the next relevant position in the string
-            raw_content_from_index = root_block.raw_content[current_char_index:]
-        elif re.match(EMAIL_AUTOLINK, raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
+                if ASCII_PUNCTUATION_RE.match(next_char):
+                    new_node = Node(root_block, NodeType.TEXT)
+                    new_node.content = next_char
+                    new_node.open = False
 
-            link_dest = re.match(EMAIL_AUTOLINK, raw_content_from_index).group().replace("<", "").replace(">", "")
+                    next_char_index = current_char_index + 2
+                elif LINE_ENDING_RE.match(next_char):
+                    new_node = Node(root_block, NodeType.LINEBREAK)
+                    new_node.open = False
 
-            new_node = LinkOrImageNode(root_block, NodeType.LINK, "mailto:" + link_dest, link_dest, "")
-            new_node.open = False
-            link_text_node = Node(new_node, NodeType.TEXT)
-            link_text_node.content = link_dest
-            link_text_node.open = False
+                    next_char_index = current_char_index + 2
+                else:
+                    new_node = Node(root_block, NodeType.TEXT)
+                    new_node.content = "\\"
+                    new_node.open = False
 
-            current_char_index += re.match(EMAIL_AUTOLINK, raw_content_from_index).end()
-            raw_content_from_index = root_block.raw_content[current_char_index:]
+                    next_char_index = current_char_index + 1
 
-        elif re.match(OPEN_TAG, raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
+            case "<":
+                if match_obj := URI_AUTOLINK_RE.match(text, current_char_index):
+                    getDeepestOpenInline(root_block).open = False
 
-            new_node = Node(root_block, NodeType.HTML_INLINE, re.match(OPEN_TAG, raw_content_from_index).group())
-            new_node.open = False
+                    link_dest = match_obj.group().replace("<", "").replace(">", "")
 
-            current_char_index += re.match(OPEN_TAG, raw_content_from_index).end()
-            raw_content_from_index = root_block.raw_content[current_char_index:]
+                    new_node = LinkOrImageNode(root_block, NodeType.LINK, link_dest, link_dest, "")
+                    new_node.open = False
+                    link_text_node = Node(new_node, NodeType.TEXT)
+                    link_text_node.content = link_dest
+                    link_text_node.open = False
 
-        elif re.match(CLOSING_TAG, raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
+                    next_char_index = match_obj.end() # advance the inline parser to the next relevant position in the string
+                elif match_obj := EMAIL_AUTOLINK_RE.match(text, current_char_index):
+                    getDeepestOpenInline(root_block).open = False
 
-            new_node = Node(root_block, NodeType.HTML_INLINE, re.match(CLOSING_TAG, raw_content_from_index).group())
-            new_node.open = False
+                    link_dest = match_obj.group().replace("<", "").replace(">", "")
 
-            current_char_index += re.match(CLOSING_TAG, raw_content_from_index).end()
-            raw_content_from_index = root_block.raw_content[current_char_index:]
-            
-        elif re.match(HTML_COMMENT, raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
+                    new_node = LinkOrImageNode(root_block, NodeType.LINK, "mailto:" + link_dest, link_dest, "")
+                    new_node.open = False
+                    link_text_node = Node(new_node, NodeType.TEXT)
+                    link_text_node.content = link_dest
+                    link_text_node.open = False
 
-            new_node = Node(root_block, NodeType.HTML_INLINE, re.match(HTML_COMMENT, raw_content_from_index).group())
-            new_node.open = False
+                    next_char_index = match_obj.end()
+                else:
+                    for raw_html_pattern in [OPEN_TAG_RE, CLOSING_TAG_RE, HTML_COMMENT_RE, PROCESSING_INSTRUCTION_RE, DECLARATION_RE, CDATA_SECTION_RE]:
+                        match_obj = raw_html_pattern.match(text, current_char_index)
+                        if match_obj:
+                            getDeepestOpenInline(root_block).open = False
 
-            current_char_index += re.match(HTML_COMMENT, raw_content_from_index).end()
-            raw_content_from_index = root_block.raw_content[current_char_index:]
+                            new_node = Node(root_block, NodeType.HTML_INLINE, match_obj.group())
+                            new_node.open = False
 
-        elif re.match(PROCESSING_INSTRUCTION, raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
+                            next_char_index = match_obj.end()
+                            break
 
-            new_node = Node(root_block, NodeType.HTML_INLINE, re.match(PROCESSING_INSTRUCTION, raw_content_from_index).group())
-            new_node.open = False
+            case "`":
+                getDeepestOpenInline(root_block).open = False
 
-            current_char_index += re.match(PROCESSING_INSTRUCTION, raw_content_from_index).end()
-            raw_content_from_index = root_block.raw_content[current_char_index:]
+                delimiter_length = BACKTICK_STRING_RE.match(text, current_char_index).end() - current_char_index
 
-        elif re.match(DECLARATION, raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
+                # the closer is the next backtick string of exactly the same length; backtick strings of other lengths are part of the code
+                if backtick_runs is None:
+                    backtick_runs = BacktickRunIndex(text)
+                closer_start = backtick_runs.findCloser(delimiter_length, current_char_index + delimiter_length)
 
-            new_node = Node(root_block, NodeType.HTML_INLINE, re.match(DECLARATION, raw_content_from_index).group())
-            new_node.open = False
+                if closer_start is not None:
+                    raw_code = text[current_char_index + delimiter_length:closer_start]
+                    raw_code = LINE_ENDING_RE.sub(" ", raw_code)
 
-            current_char_index += re.match(DECLARATION, raw_content_from_index).end()
-            raw_content_from_index = root_block.raw_content[current_char_index:]
+                    if raw_code[0] == " " and raw_code[-1] == " " and not re.match("^[ ]+$", raw_code):
+                        raw_code = raw_code[1:-1]
 
-        elif re.match(CDATA_SECTION, raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
+                    new_node = Node(root_block, NodeType.INLINE_CODE, raw_code)
+                    new_node.open = False
 
-            new_node = Node(root_block, NodeType.HTML_INLINE, re.match(CDATA_SECTION, raw_content_from_index).group())
-            new_node.open = False
+                    next_char_index = closer_start + delimiter_length
+                else: # We have not found a matching closer until the end of the block; hence we append literal backticks to the root block
+                    new_node = Node(root_block, NodeType.TEXT)
+                    new_node.content = "`" * delimiter_length
+                    new_node.open = False
 
-            current_char_index += re.match(CDATA_SECTION, raw_content_from_index).end()
-            raw_content_from_index = root_block.raw_content[current_char_index:]
+                    next_char_index = current_char_index + delimiter_length
 
-        elif re.match(BACKTICK_STRING, raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
+            case "\n" | "\r":
+                getDeepestOpenInline(root_block).open = False
 
-            delimiter_length = len(re.match(BACKTICK_STRING, raw_content_from_index).group())
-            raw_code = ""
+                new_node = Node(root_block, NodeType.SOFTBREAK)
+                new_node.open = False
 
-            matching_closer_found = False
-            starting_index = current_char_index
+                next_char_index = LINE_ENDING_RE.match(text, current_char_index).end()
 
-            current_char_index += delimiter_length
-            raw_content_from_index = root_block.raw_content[current_char_index:]
+            case " ":
+                match_obj = HARD_LINE_BREAK_RE.match(text, current_char_index)
+                if match_obj:
+                    getDeepestOpenInline(root_block).open = False
 
-            while not current_char_index >= len(root_block.raw_content):
-                if re.match(BACKTICK_STRING, raw_content_from_index):
-                    if len(re.match(BACKTICK_STRING, raw_content_from_index).group()) == delimiter_length:
-                        matching_closer_found = True
-                        break
-                    else: # We have found a delimiter string; however, it does not match the length requirement: hence append it at once so the parser does not get confused and tries to parse this string "one by one"
-                        raw_code += re.match(BACKTICK_STRING, raw_content_from_index).group()
-                        current_char_index += len(re.match(BACKTICK_STRING, raw_content_from_index).group())
-                        raw_content_from_index = root_block.raw_content[current_char_index:]
-                if not current_char_index >= len(root_block.raw_content): # No, this test is not redundant, as the else block above can result in advancing the parser state such that current_char_index >= len(root_block.raw_content) is true and consequently throwing an IndexError
-                    raw_code += raw_content_from_index[0]
-                    current_char_index += 1
-                    raw_content_from_index = root_block.raw_content[current_char_index:]
+                    new_node = Node(root_block, NodeType.LINEBREAK)
+                    new_node.open = False
 
-            if matching_closer_found:
-                raw_code = re.sub(LINE_ENDING, " ", raw_code)
+                    next_char_index = match_obj.end()
 
-                if raw_code[0] == " " and raw_code[-1] == " " and not re.match("^[ ]+$", raw_code):
-                    raw_code = raw_code[1:-1]
+            case "*" | "_":
+                getDeepestOpenInline(root_block).open = False
 
-                new_node = Node(root_block, NodeType.INLINE_CODE, raw_code)
-                new_node.open = False
-            
-                current_char_index += delimiter_length
-                raw_content_from_index = root_block.raw_content[current_char_index:]
-            else: # We have not found a matching closer until the end of the block; hence we append literal backticks to the root block
-                current_char_index = starting_index
-                raw_content_from_index = root_block.raw_content[current_char_index:]
+                run_end = DELIMITER_RUN_RE.match(text, current_char_index).end()
 
                 new_node = Node(root_block, NodeType.TEXT)
-                new_node.content = "`" * delimiter_length
+                new_node.content = text[current_char_index:run_end]
                 new_node.open = False
 
-                current_char_index += delimiter_length
-                raw_content_from_index = root_block.raw_content[current_char_index:]
-        elif re.match(LINE_ENDING, raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
-
-            new_node = Node(root_block, NodeType.SOFTBREAK)
-            new_node.open = False
-
-            current_char_index += re.match(LINE_ENDING, raw_content_from_index).end()
-            raw_content_from_index = root_block.raw_content[current_char_index:]
-        elif re.match(HARD_LINE_BREAK, raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
-
-            new_node = Node(root_block, NodeType.LINEBREAK)
-            new_node.open = False
-
-            current_char_index += re.match(HARD_LINE_BREAK, raw_content_from_index).end()
-            raw_content_from_index = root_block.raw_content[current_char_index:]
-
-        elif re.match(DELIMITER_RUN, raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
-
-            new_node = Node(root_block, NodeType.TEXT)
-            new_node.content = re.match(DELIMITER_RUN, raw_content_from_index).group()
-            new_node.open = False
-
-            # determine whether it is a left flanking delimiter run or a right flanking delimiter run (or both)
-            previous_char = root_block.raw_content[(current_char_index-1)]
-            if current_char_index + len(new_node.content) >= len(root_block.raw_content):
-                next_char = ""
-            else:
-                next_char = root_block.raw_content[(current_char_index + len(new_node.content))]
-            delim_stack_entry = None
-
-            # left-flanking case 1 + 2a
-            if not re.match(UNICODE_WHITESPACE, next_char) and not re.match(r'[' + UNICODE_PUNCTUATION_CHARS + r']', next_char):
-                delim_stack_entry = DelimiterStackEntry(new_node, new_node.content[0], len(new_node.content), DelimiterFunction.OPENING)
-                delimiter_stack.append(delim_stack_entry)
-            # left-flanking case 1 + 2b
-            elif not re.match(UNICODE_WHITESPACE, next_char) and re.match(r'[' + UNICODE_PUNCTUATION_CHARS + r']', next_char) and (re.match(UNICODE_WHITESPACE, previous_char) or re.match(r'[' + UNICODE_PUNCTUATION_CHARS + r']', previous_char)):
-                delim_stack_entry = DelimiterStackEntry(new_node, new_node.content[0], len(new_node.content), DelimiterFunction.OPENING)
-                delimiter_stack.append(delim_stack_entry)
-
-            # right-flanking case 1 + 2a
-            # *if*, not *elif*, as a delimiter run can be both left and right flanking at the same time
-            if not re.match(UNICODE_WHITESPACE, previous_char) and not re.match(r'[' + UNICODE_PUNCTUATION_CHARS + r']', previous_char):
-                if delim_stack_entry:
-                    delim_stack_entry.function = DelimiterFunction.BOTH # if a delimiter stack entry was created by the previous if-statement, then just change the function accordingly
-                else:
-                    delim_stack_entry = DelimiterStackEntry(new_node, new_node.content[0], len(new_node.content), DelimiterFunction.CLOSING)
-                    delimiter_stack.append(delim_stack_entry)
-            # right-flanking case 1 + 2b
-            elif not re.match(UNICODE_WHITESPACE, previous_char) and re.match(r'[' + UNICODE_PUNCTUATION_CHARS + r']', previous_char) and (re.match(UNICODE_WHITESPACE, next_char) or re.match(r'[' + UNICODE_PUNCTUATION_CHARS + r']', next_char)):
-                if delim_stack_entry:
-                    delim_stack_entry.function = DelimiterFunction.BOTH
-                else:
-                    delim_stack_entry = DelimiterStackEntry(new_node, new_node.content[0], len(new_node.content), DelimiterFunction.CLOSING)
-                    delimiter_stack.append(delim_stack_entry)
-
-            current_char_index += re.match(DELIMITER_RUN, raw_content_from_index).end()
-            raw_content_from_index = root_block.raw_content[current_char_index:]
-        elif re.match(r'(?<!\\)\!?\[', raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
-
-            new_node = Node(root_block, NodeType.TEXT)
-            new_node.content = re.match(r'\!?\[', raw_content_from_index).group()
-            new_node.open = False
-
-            delim_stack_entry = DelimiterStackEntry(new_node, new_node.content, 1, DelimiterFunction.OPENING)
-            delimiter_stack.append(delim_stack_entry)
-
-            current_char_index += re.match(r'\!?\[', raw_content_from_index).end()
-            raw_content_from_index = root_block.raw_content[current_char_index:]
-        elif re.match(r']', raw_content_from_index):
-            root_block.getDeepestOpenChild().open = False
-
-            look_for_link_or_image(root_block, delimiter_stack, raw_content_from_index[1:], link_reference_defs)
-
-            current_char_index += 1
-            raw_content_from_index = root_block.raw_content[current_char_index:]
-        else:
-            deepest_open_child = root_block.getDeepestOpenChild()
+                # determine whether it is a left flanking delimiter run or a right flanking delimiter run (or both)
+                # "the beginning and the end of the line count as Unicode whitespace" (sec. 6.2)
+                previous_char = text[current_char_index - 1] if current_char_index > 0 else "\n"
+                next_char = text[run_end:run_end + 1] or "\n"
+                delim_stack_entry = None
+
+                # left-flanking case 1 + 2a
+                if not UNICODE_WHITESPACE_RE.match(next_char) and not UNICODE_PUNCTUATION_RE.match(next_char):
+                    delim_stack_entry = DelimiterStackEntry(new_node, new_node.content[0], len(new_node.content), DelimiterFunction.OPENING)
+                    delimiter_stack.push(delim_stack_entry)
+                # left-flanking case 1 + 2b
+                elif not UNICODE_WHITESPACE_RE.match(next_char) and UNICODE_PUNCTUATION_RE.match(next_char) and (UNICODE_WHITESPACE_RE.match(previous_char) or UNICODE_PUNCTUATION_RE.match(previous_char)):
+                    delim_stack_entry = DelimiterStackEntry(new_node, new_node.content[0], len(new_node.content), DelimiterFunction.OPENING)
+                    delimiter_stack.push(delim_stack_entry)
+
+                # right-flanking case 1 + 2a
+                # *if*, not *elif*, as a delimiter run can be both left and right flanking at the same time
+                if not UNICODE_WHITESPACE_RE.match(previous_char) and not UNICODE_PUNCTUATION_RE.match(previous_char):
+                    if delim_stack_entry:
+                        delim_stack_entry.function = DelimiterFunction.BOTH # if a delimiter stack entry was created by the previous if-statement, then just change the function accordingly
+                    else:
+                        delim_stack_entry = DelimiterStackEntry(new_node, new_node.content[0], len(new_node.content), DelimiterFunction.CLOSING)
+                        delimiter_stack.push(delim_stack_entry)
+                # right-flanking case 1 + 2b
+                elif not UNICODE_WHITESPACE_RE.match(previous_char) and UNICODE_PUNCTUATION_RE.match(previous_char) and (UNICODE_WHITESPACE_RE.match(next_char) or UNICODE_PUNCTUATION_RE.match(next_char)):
+                    if delim_stack_entry:
+                        delim_stack_entry.function = DelimiterFunction.BOTH
+                    else:
+                        delim_stack_entry = DelimiterStackEntry(new_node, new_node.content[0], len(new_node.content), DelimiterFunction.CLOSING)
+                        delimiter_stack.push(delim_stack_entry)
+
+                # a "_" run that is both left and right flanking can only open emphasis if it is preceded by punctuation, and only close emphasis if it is followed by punctuation (sec. 6.2, rules 2 & 4)
+                if delim_stack_entry and delim_stack_entry.delimiter_type == "_" and delim_stack_entry.function == DelimiterFunction.BOTH:
+                    if UNICODE_PUNCTUATION_RE.match(previous_char) and not UNICODE_PUNCTUATION_RE.match(next_char):
+                        delim_stack_entry.function = DelimiterFunction.OPENING
+                    elif UNICODE_PUNCTUATION_RE.match(next_char) and not UNICODE_PUNCTUATION_RE.match(previous_char):
+                        delim_stack_entry.function = DelimiterFunction.CLOSING
+                    elif not UNICODE_PUNCTUATION_RE.match(previous_char) and not UNICODE_PUNCTUATION_RE.match(next_char):
+                        delimiter_stack.remove(delim_stack_entry) # neither opens nor closes (e.g. "snake_case")
+
+                next_char_index = run_end
+
+            case "[" | "!":
+                opener = "["
+                if text[current_char_index] == "!":
+                    opener = "!["
+
+                if text.startswith(opener, current_char_index):
+                    getDeepestOpenInline(root_block).open = False
+
+                    new_node = Node(root_block, NodeType.TEXT)
+                    new_node.content = opener
+                    new_node.open = False
+
+                    delim_stack_entry = DelimiterStackEntry(new_node, new_node.content, 1, DelimiterFunction.OPENING)
+                    delim_stack_entry.node_index = len(root_block.children) - 1
+                    delimiter_stack.push(delim_stack_entry)
+
+                    next_char_index = current_char_index + len(opener)
+
+            case "]":
+                getDeepestOpenInline(root_block).open = False
+
+                # only an inline link can reach to the end of the block; a reference link looks at its link label at most, and a shortcut reference link at nothing but the next character. Passing just as much keeps a block full of reference links from being copied over & over
+                match text[current_char_index + 1:current_char_index + 2]:
+                    case "(":
+                        string_after_bracket = text[current_char_index + 1:]
+                    case "[":
+                        string_after_bracket = text[current_char_index + 1:current_char_index + 1 + LINK_LABEL_LOOKAHEAD]
+                    case next_char:
+                        string_after_bracket = next_char
+
+                look_for_link_or_image(root_block, delimiter_stack, string_after_bracket, link_reference_defs)
+                if root_block.raw_content is not text: # an inline link removes its destination and title from the raw content; the positions of the backtick strings after it have moved
+                    text = root_block.raw_content
+                    backtick_runs = None
+
+                next_char_index = current_char_index + 1
+
+        if next_char_index is None:
+            next_special_char = INLINE_SPECIAL_CHAR_RE.search(text, current_char_index + 1)
+            next_char_index = next_special_char.start() if next_special_char else len(text)
+
+            deepest_open_child = getDeepestOpenInline(root_block)
             if deepest_open_child and deepest_open_child.node_type == NodeType.TEXT:
-                deepest_open_child.content += raw_content_from_index[0]
+                deepest_open_child.content += text[current_char_index:next_char_index]
             else:
-                root_block.getDeepestOpenChild().open = False
+                getDeepestOpenInline(root_block).open = False
 
                 new_node = Node(root_block, NodeType.TEXT)
-                new_node.content = raw_content_from_index[0]
+                new_node.content = text[current_char_index:next_char_index]
 
-            current_char_index += 1
-            raw_content_from_index = root_block.raw_content[current_char_index:]
+        current_char_index = next_char_index
 
     process_emphasis(root_block, delimiter_stack)
             
 # Implementation of the "*process emphasis*" procedure described in the [Appendix of the CommonMark 0.30 spec](https://spec.commonmark.org/0.30/#appendix-a-parsing-strategy). Credit goes to the respective authors.
-# TODO: refactor this mess
-def process_emphasis(block_node_to_modify: Node, delimiter_stack: list[DelimiterStackEntry], stack_bottom: DelimiterStackEntry = None):
-    if not delimiter_stack or len(delimiter_stack) == 1:
-        return
+# Every closer only looks back as far as the "openers_bottom" for its kind of delimiter run, and every entry is removed in constant time, so the procedure takes linear time in the number of delimiters (instead of quadratic time for a paragraph full of unmatched "*"s)
+def process_emphasis(block_node_to_modify: Node, delimiter_stack: DelimiterStack, stack_bottom: DelimiterStackEntry = None):
+    # The children of the node as a doubly linked list as well: the emphasis nodes are created in the order their closers are found, each wrapping the nodes between its opener and its closer; the children are only put back into a list at the end
+    # Index 0 & 1 are the start & the end of the list
+    inline_nodes = [None, None] + block_node_to_modify.children
+    next_inline = [None] * len(inline_nodes)
+    previous_inline = [None] * len(inline_nodes)
+    inline_order = [0] + list(range(2, len(inline_nodes))) + [1]
+    for index in range(len(inline_order) - 1):
+        next_inline[inline_order[index]] = inline_order[index + 1]
+        previous_inline[inline_order[index + 1]] = inline_order[index]
+    inline_index = {id(node): index for index, node in enumerate(inline_nodes) if node is not None}
+    children_changed = False
+
+    def removeInline(index: int):
+        next_inline[previous_inline[index]] = next_inline[index]
+        previous_inline[next_inline[index]] = previous_inline[index]
+
+    openers_bottom = {} # "openers_bottom" for each delimiter type, whether the closer can also open emphasis & its original length modulo 3; nothing below it can be an opener for such a closer
 
-    current_position_index = 0
     if stack_bottom:
-        current_position_index = (delimiter_stack.index(stack_bottom) + 1)
-
-    if current_position_index >= len(delimiter_stack): # if we have not found a closing delimiter, there is nothing to parse
-        return
+        current_position = stack_bottom.next
+    else: # the bottom of the stack
+        current_position = delimiter_stack.top
+        while current_position and current_position.previous:
+            current_position = current_position.previous
 
-    current_position = delimiter_stack[current_position_index]
-    openers_bottom_star = stack_bottom
-    openers_bottom_underscore = stack_bottom
+    while current_position: # while we have not run out of potential closers
+        if not (current_position.canClose() and (current_position.delimiter_type == "*" or current_position.delimiter_type == "_")):
+            current_position = current_position.next
+            continue
 
-    while True: # this - due to the break in "if not current_position" - will result in actually meaning: While we have not run out of potential closers, as suggested by the reference in the appendix
-        if not delimiter_stack or len(delimiter_stack) == 1:
-            break
-
-        if current_position_index >= len(delimiter_stack):
-            current_position = delimiter_stack[-1]
-        else:
-            current_position = delimiter_stack[current_position_index] # reset current position just for security
+        openers_bottom_key = (current_position.delimiter_type, current_position.canOpen(), current_position.original_delimiter_count % 3)
+        bottom = openers_bottom.get(openers_bottom_key, stack_bottom)
 
-        while not ((current_position.function == DelimiterFunction.CLOSING or current_position.function == DelimiterFunction.BOTH) and (current_position.delimiter_type == "*" or current_position.delimiter_type == "_")): # move current_position forward until we find a potential closer
-            if (current_position_index >= len(delimiter_stack) - 1) or (current_position_index == 0 and len(delimiter_stack) == 1): # avoid IndexErrors
-                current_position = None
-                break
-            else:
-                current_position_index += 1
-                current_position = delimiter_stack[current_position_index]
-
-        if not current_position:
-            break
-        
-        matching_opener = None
-        tmp_index = current_position_index
-        tmp = current_position
         # look back in the delimiter stack for a matching opener
-        if current_position.delimiter_type == "*":
-            while True: # one could fuse this "while True" loop and the if block with "tmp.delimiter_type == ...." together; however, I chose against this because - in my opinion - the current version is easier to understand & debug
-                if tmp_index == -1:
-                    tmp = None
-                    break
-                else:
-                    if tmp.delimiter_type == "*" and (tmp.function == DelimiterFunction.OPENING or tmp.function == DelimiterFunction.BOTH) and not (current_position == tmp):
-                        break
-                    else:
-                        tmp_index -= 1
-                        tmp = delimiter_stack[tmp_index]
-
-            if not tmp:
-                pass
-            elif not openers_bottom_star:
-                matching_opener = tmp
-            elif tmp_index > delimiter_stack.index(openers_bottom_star):
-                matching_opener = tmp
-        else:
-            while True:
-                if tmp_index == -1:
-                    tmp = None
+        matching_opener = current_position.previous
+        while matching_opener is not None and matching_opener is not stack_bottom and matching_opener is not bottom:
+            if matching_opener.delimiter_type == current_position.delimiter_type and matching_opener.canOpen():
+                # "If one of the delimiters can both open and close emphasis, then the sum of the lengths of the delimiter runs containing the opening and closing delimiters must not be a multiple of 3 unless both lengths are multiples of 3" (sec. 6.2, rules 9 & 10)
+                if not ((matching_opener.canClose() or current_position.canOpen()) and (matching_opener.original_delimiter_count + current_position.original_delimiter_count) % 3 == 0 and not (matching_opener.original_delimiter_count % 3 == 0 and current_position.original_delimiter_count % 3 == 0)):
                     break
-                else:
-                    if tmp.delimiter_type == "_" and (tmp.function == DelimiterFunction.OPENING or tmp.function == DelimiterFunction.BOTH) and not (current_position == tmp):
-                        break
-                    else:
-                        tmp_index -= 1
-                        tmp = delimiter_stack[tmp_index]
-
-            if not tmp:
-                pass
-            elif not openers_bottom_underscore:
-                matching_opener = tmp
-            elif tmp_index > delimiter_stack.index(openers_bottom_underscore):
-                matching_opener = tmp
-
-        if matching_opener: # we have found a potential opener
-            if (not matching_opener.referenced_text_node in block_node_to_modify.children) or (not current_position.referenced_text_node in block_node_to_modify.children): # it is possible that the matching opener is not actually a delimiter for emphasis, but rather raw textual context of another emphasis; see sec. 6.2, rule #15 for an example of this; also, the "emphasis delimiter" could be inside a link (or link reference definition), which leads to it not being an actual delimiter
-                    break
-            if matching_opener.delimiter_count >= 2 and current_position.delimiter_count >= 2:
-                opener_text_node_index = block_node_to_modify.children.index(matching_opener.referenced_text_node)
-                closer_text_node_index = block_node_to_modify.children.index(current_position.referenced_text_node)
-
-                nodes_between_opener_and_closer = block_node_to_modify.children[opener_text_node_index +1:closer_text_node_index]
-                del block_node_to_modify.children[opener_text_node_index + 1:closer_text_node_index]
-
-                new_node = Node(block_node_to_modify, NodeType.STRONG)
-                block_node_to_modify.children.remove(new_node)
-                block_node_to_modify.children.insert(opener_text_node_index + 1, new_node)
-                new_node.children.extend(nodes_between_opener_and_closer)
-            else:
-                opener_text_node_index = block_node_to_modify.children.index(matching_opener.referenced_text_node)
-                closer_text_node_index = block_node_to_modify.children.index(current_position.referenced_text_node)
+            matching_opener = matching_opener.previous
 
-                nodes_between_opener_and_closer = block_node_to_modify.children[opener_text_node_index + 1:closer_text_node_index]
-                del block_node_to_modify.children[opener_text_node_index + 1:closer_text_node_index]
+        if matching_opener is None or matching_opener is stack_bottom or matching_opener is bottom: # we have not found a matching opener
+            openers_bottom[openers_bottom_key] = current_position.previous
 
-                new_node = Node(block_node_to_modify, NodeType.EMPHASIS)
-                block_node_to_modify.children.remove(new_node)
-                block_node_to_modify.children.insert(opener_text_node_index + 1, new_node)
-                new_node.children.extend(nodes_between_opener_and_closer)
-
-            matching_opener_index = delimiter_stack.index(matching_opener)
-            del delimiter_stack[matching_opener_index + 1:current_position_index - 1]
-
-            if matching_opener.delimiter_count >= 2 and current_position.delimiter_count >= 2:
-                matching_opener.delimiter_count -= 2
-                current_position.delimiter_count -= 2
-            else:
-                matching_opener.delimiter_count -= 1
-                current_position.delimiter_count -= 1
-
-            if matching_opener.delimiter_count <= 0:
-                block_node_to_modify.children.remove(matching_opener.referenced_text_node)
-                delimiter_stack.remove(matching_opener)
-
-            current_position_index = delimiter_stack.index(current_position)
-
-            if current_position.delimiter_count <= 0:
-                block_node_to_modify.children.remove(current_position.referenced_text_node)
+            next_position = current_position.next
+            if not current_position.canOpen():
                 delimiter_stack.remove(current_position)
+            current_position = next_position
+            continue
+
+        # strong emphasis if both delimiter runs have at least two delimiters left, regular emphasis otherwise
+        used_delimiters = 1
+        new_node = Node(None, NodeType.EMPHASIS)
+        if matching_opener.delimiter_count >= 2 and current_position.delimiter_count >= 2:
+            used_delimiters = 2
+            new_node = Node(None, NodeType.STRONG)
+        new_node.parent = block_node_to_modify
+        new_node.open = False
 
-        else: # we have not found a matching opener
-            if current_position.delimiter_type == "*":
-                if current_position_index == 0: # necessary because else it would lead to delimiter_stack[-1] being called, which is the *last* element in the list, hence destroying this parsing algorithm
-                    openers_bottom_star = None
-                else:
-                    openers_bottom_star = delimiter_stack[current_position_index - 1]
-            else:
-                if current_position_index == 0:
-                    openers_bottom_underscore = None
-                else:
-                    openers_bottom_underscore = delimiter_stack[current_position_index - 1]
-
-            if current_position.function == DelimiterFunction.CLOSING:
-                delimiter_stack.remove(current_position)
-            else:
-                if current_position_index >= len(delimiter_stack) - 1:
-                    return
-                else:
-                    current_position_index += 1
-                    current_position = delimiter_stack[current_position_index]
+        matching_opener.delimiter_count -= used_delimiters
+        matching_opener.referenced_text_node.content = matching_opener.referenced_text_node.content[used_delimiters:]
+        current_position.delimiter_count -= used_delimiters
+        current_position.referenced_text_node.content = current_position.referenced_text_node.content[used_delimiters:]
+
+        # move the inlines between the delimiters into the new node, which takes their place
+        opener_index = inline_index[id(matching_opener.referenced_text_node)]
+        closer_index = inline_index[id(current_position.referenced_text_node)]
+
+        index = next_inline[opener_index]
+        while index != closer_index:
+            inline_nodes[index].parent = new_node
+            new_node.children.append(inline_nodes[index])
+            index = next_inline[index]
+
+        inline_nodes.append(new_node)
+        next_inline.append(closer_index)
+        previous_inline.append(opener_index)
+        next_inline[opener_index] = len(inline_nodes) - 1
+        previous_inline[closer_index] = len(inline_nodes) - 1
+        children_changed = True
+
+        delimiter_stack.removeBetween(matching_opener, current_position)
+
+        if matching_opener.delimiter_count == 0:
+            removeInline(opener_index)
+            delimiter_stack.remove(matching_opener)
+
+        if current_position.delimiter_count == 0:
+            removeInline(closer_index)
+            next_position = current_position.next
+            delimiter_stack.remove(current_position)
+            current_position = next_position
+
+    if children_changed:
+        block_node_to_modify.children = []
+        index = next_inline[0]
+        while index != 1:
+            block_node_to_modify.children.append(inline_nodes[index])
+            index = next_inline[index]
 
     # cleanup; last step of the procedure in the appendix
-    if stack_bottom:
-        del delimiter_stack[delimiter_stack.index(stack_bottom) + 1:]
-    else:
-        del delimiter_stack[:]
+    delimiter_stack.removeAbove(stack_bottom)
 
 # Implementation of the "*look for link or image*" procedure described in the [Appendix of the CommonMark 0.30 spec](https://spec.commonmark.org/0.30/#appendix-a-parsing-strategy). Credit goes to the respective authors.
-def look_for_link_or_image(block_node_to_modify: Node, delimiter_stack: list[DelimiterStackEntry], string_after_bracket: str, link_reference_defs: list[LinkReferenceDefinition]):
+def look_for_link_or_image(block_node_to_modify: Node, delimiter_stack: DelimiterStack, string_after_bracket: str, link_reference_defs: LinkReferenceTable):
     original_string_after_bracket = string_after_bracket
-    found_opener = None
-    for child in reversed(delimiter_stack): # "look backwards through the stack"
-        if child.delimiter_type == "[" or child.delimiter_type == "![":
-            found_opener = child
+    found_opener = delimiter_stack.top
+    while found_opener: # "look backwards through the stack"
+        if found_opener.delimiter_type == "[" or found_opener.delimiter_type == "![":
             break
+        found_opener = found_opener.previous
     
     if not found_opener:
         new_node = Node(block_node_to_modify, NodeType.TEXT)
@@ -470,15 +468,11 @@ def look_for_link_or_image(block_node_to_modify: Node, delimiter_stack: list[Del
                 full_inline_string += string_after_bracket[:re.match(LINK_DESTINATION, string_after_bracket.lstrip()).end()]
                 string_after_bracket = string_after_bracket.replace(link_destination, "")
 
-            if re.match(r'[ \t]*' + LINE_ENDING + r'?', string_after_bracket):
-                re.sub(r'[ \t]*' + LINE_ENDING + r'?', "", string_after_bracket)
             if re.match(LINK_TITLE, string_after_bracket.lstrip()):
                 link_title = re.match(LINK_TITLE, string_after_bracket.lstrip()).group()
 
                 full_inline_string += string_after_bracket[:re.match(LINK_TITLE, string_after_bracket.lstrip()).end() + 1]
                 string_after_bracket = string_after_bracket.replace(link_title, "")
-            if re.match(r'[ \t]*' + LINE_ENDING + r'?', string_after_bracket):
-                re.sub(r'[ \t]*' + LINE_ENDING + r'?', "", string_after_bracket)
 
             if string_after_bracket.lstrip()[0] == ")":
                 block_node_to_modify.raw_content = block_node_to_modify.raw_content.replace(full_inline_string + ")", "") # we need to remove the inline declaration afterwards, so that it does not appear as normal text after the link
@@ -488,60 +482,60 @@ def look_for_link_or_image(block_node_to_modify: Node, delimiter_stack: list[Del
             if re.match(LINK_LABEL, string_after_bracket):
                 possible_link_label = re.match(LINK_LABEL, string_after_bracket).group()
 
-                for reference_def in link_reference_defs:
-                    if reference_def.link_label.casefold().strip() == possible_link_label.casefold().strip():
-                        link_destination = reference_def.link_destination
-                        link_title = reference_def.link_title
-                        break
-                re.sub(LINK_LABEL, "", string_after_bracket)
+                reference_def = link_reference_defs.lookup(possible_link_label)
+                if reference_def:
+                    link_destination = reference_def.link_destination
+                    link_title = reference_def.link_title
             else:
-                possible_link_label = "".join([node.raw_content for node in block_node_to_modify.children[block_node_to_modify.children.index(found_opener.referenced_text_node) - 1:]])
+                possible_link_label = "".join([node.raw_content for node in block_node_to_modify.children[found_opener.node_index - 1:]])
                 
-                for reference_def in link_reference_defs:
-                    if reference_def.link_label.casefold().strip() == possible_link_label.casefold().strip():
-                        link_destination = reference_def.link_destination
-                        link_title = reference_def.link_title
-                        break
+                reference_def = link_reference_defs.lookup(possible_link_label)
+                if reference_def:
+                    link_destination = reference_def.link_destination
+                    link_title = reference_def.link_title
 
             if string_after_bracket[0] == "]":
                 matched_link_syntax = True
         else: # shortcut reference link
-            possible_link_label = "".join([node.content for node in block_node_to_modify.children[block_node_to_modify.children.index(found_opener.referenced_text_node) - 1:]])
+            possible_link_label = "".join([node.content for node in block_node_to_modify.children[found_opener.node_index - 1:]])
 
-            for reference_def in link_reference_defs:
-                    if reference_def.link_label.casefold().strip() == possible_link_label.casefold().strip():
-                        link_destination = reference_def.link_destination
-                        link_title = reference_def.link_title
-                        break
+            reference_def = link_reference_defs.lookup(possible_link_label)
+            if reference_def:
+                link_destination = reference_def.link_destination
+                link_title = reference_def.link_title
 
             matched_link_syntax = True
 
         if matched_link_syntax:
             if found_opener.delimiter_type == "![":
-                inlines_after_opener = block_node_to_modify.children[block_node_to_modify.children.index(found_opener.referenced_text_node) + 1:]
+                inlines_after_opener = block_node_to_modify.children[found_opener.node_index + 1:]
 
-                del block_node_to_modify.children[block_node_to_modify.children.index(found_opener.referenced_text_node) + 1:]
+                del block_node_to_modify.children[found_opener.node_index + 1:]
 
                 new_node = LinkOrImageNode(block_node_to_modify, NodeType.IMAGE, link_destination, link_text, link_title)
+                new_node.open = False
                 new_node.children.extend(inlines_after_opener)
 
                 process_emphasis(new_node, delimiter_stack, found_opener)
 
-                block_node_to_modify.children.remove(found_opener.referenced_text_node)
+                del block_node_to_modify.children[found_opener.node_index] # the opener; only the new node comes after it
                 delimiter_stack.remove(found_opener)
             else:
-                inlines_after_opener = block_node_to_modify.children[block_node_to_modify.children.index(found_opener.referenced_text_node) + 1:]
-                del block_node_to_modify.children[block_node_to_modify.children.index(found_opener.referenced_text_node) + 1:]
+                inlines_after_opener = block_node_to_modify.children[found_opener.node_index + 1:]
+                del block_node_to_modify.children[found_opener.node_index + 1:]
 
                 new_node = LinkOrImageNode(block_node_to_modify, NodeType.LINK, link_destination, link_text, link_title)
+                new_node.open = False
                 new_node.children.extend(inlines_after_opener)
 
                 process_emphasis(new_node, delimiter_stack, found_opener)
 
-                for entry in delimiter_stack[:delimiter_stack.index(found_opener)]:
+                entry = found_opener.previous
+                while entry and entry.active: # the entries below an inactive one have been deactivated along with it
                     entry.active = False
+                    entry = entry.previous
                 
-                block_node_to_modify.children.remove(found_opener.referenced_text_node)
+                del block_node_to_modify.children[found_opener.node_index] # the opener; only the new node comes after it
                 delimiter_stack.remove(found_opener)
         else:
             delimiter_stack.remove(found_opener)
@@ -1,9 +1,11 @@
 import json
 from .node import *
+from .stats import Stats
 
 DEFAULT_OPTIONS = {
     "jsonIndent": 3,
-    "debug_infos": True
+    "debug_infos": True,
+    "compact": False # no new-lines & no spaces at all; overrides "jsonIndent"
 }
 
 # The method of splitting the renderer into a "node walker", which then calls the appropriate rendering option for each block type stems from [the official JS CommonMark implementation](https://github.com/commonmark/commonmark.js/blob/master/lib/render/renderer.js)
@@ -241,30 +243,82 @@ ASSOCIATED_FUNCTION = {
     NodeType.CUSTOM_INLINE: None
 }
 
-def recursiveRender(root_node: Node, current_ast_as_dict: dict, debug: bool):
-    this_node_as_dict = ASSOCIATED_FUNCTION[root_node.node_type](root_node, debug)
-    if root_node.children:
-        for child in root_node.children:
-            recursiveRender(child, this_node_as_dict, debug)
-    current_ast_as_dict["children"].append(this_node_as_dict)
+# The functions above only describe a single node (their "children" are always empty, and always the last key). The encoder writes these descriptions out one by one while walking the tree with an explicit stack, so it never builds the nested dicts of the whole document; its output is the same as json.dumps() of those nested dicts would be
+def iterEncode(document_node: Node, debug: bool, indent: int, compact: bool):
+    item_separator = ", " if indent is None else ","
+    key_separator = ": "
+    if compact:
+        item_separator = ","
+        key_separator = ":"
+
+    def newLine(depth: int):
+        if compact or indent is None:
+            return ""
+        return "\n" + " " * (indent * depth)
+
+    stack = [((document_node, {"node_type": "document", "children": []}), 0, "")]
+
+    while stack:
+        item, depth, prefix = stack.pop()
+        if isinstance(item, str): # the closing brackets of a node
+            yield item
+            continue
+
+        node, node_as_dict = item
+        if node_as_dict is None:
+            node_as_dict = ASSOCIATED_FUNCTION[node.node_type](node, debug)
+
+        output = prefix + "{"
+        separator = ""
+        for key, value in node_as_dict.items():
+            if key == "children":
+                continue
+            output += separator + newLine(depth + 1) + json.dumps(key) + key_separator + json.dumps(value)
+            separator = item_separator
+
+        if "children" not in node_as_dict:
+            yield output + newLine(depth) + "}"
+            continue
+
+        output += separator + newLine(depth + 1) + "\"children\"" + key_separator
+        if not node.children:
+            yield output + "[]" + newLine(depth) + "}"
+            continue
+
+        yield output + "["
+        stack.append((newLine(depth + 1) + "]" + newLine(depth) + "}", depth, ""))
+        for child_index in range(len(node.children) - 1, -1, -1):
+            child_prefix = newLine(depth + 2)
+            if child_index > 0:
+                child_prefix = item_separator + child_prefix
+            stack.append(((node.children[child_index], None), depth + 2, child_prefix))
 
 class JSONRenderer:
-    def __init__(self, options: dict = DEFAULT_OPTIONS):
+    def __init__(self, options: dict = DEFAULT_OPTIONS, stats = False):
         self.options = options
 
-        self.ast_as_dict = {
-            "node_type": "document",
-            "children": []
-        }
+        # time spent rendering & counters (see stats.py); True creates a new Stats object, pass the parser's to get a single report
+        self.stats: Stats = None
+        if stats is True:
+            self.stats = Stats()
+        elif stats:
+            self.stats = stats
+
+    # Yields the JSON of the document piece by piece; every call starts from scratch, so a renderer can be used for any number of documents
+    def iter_render(self, document_node: Node):
+        indent = self.options["jsonIndent"]
+        if not indent: # as before, no indentation means new-lines without any indentation (json.dumps(..., indent=0)), rather than everything on one line
+            indent = 0
+
+        pieces = iterEncode(document_node, self.options["debug_infos"], indent, self.options.get("compact", False))
+        if self.stats is not None:
+            pieces = self.stats.timeIterator("json_rendering", pieces)
+        yield from pieces
+
+    # Writes the JSON of the document to a file-like object; besides the output, this takes memory proportional to the depth of the document only
+    def render_to(self, document_node: Node, writer):
+        for piece in self.iter_render(document_node):
+            writer.write(piece)
 
     def render(self, document_node: Node):
-        if document_node.children:
-            for child in document_node.children:
-                if self.options["debug_infos"]:
-                    recursiveRender(child, self.ast_as_dict, True)
-                else:
-                    recursiveRender(child, self.ast_as_dict, False)
-
-        if self.options["jsonIndent"]:
-            return json.dumps(self.ast_as_dict, indent=self.options["jsonIndent"])
-        return json.dumps(self.ast_as_dict, indent=0)
\ No newline at end of file
+        return "".join(self.iter_render(document_node))
@@ -1,5 +1,48 @@
+import re
+
 class LinkReferenceDefinition:
     def __init__(self, link_label, link_destination, link_title = ""):
         self.link_label: str = link_label
         self.link_destination: str = link_destination
-        self.link_title: str = link_title
\ No newline at end of file
+        self.link_title: str = link_title
+
+# "One label matches another just in case their normalized forms are equal. To normalize a label, strip off the opening and closing brackets, perform the Unicode case fold, strip leading and trailing whitespace and collapse consecutive internal whitespace to a single space." (sec. 4.7)
+def normalizeLinkLabel(link_label: str):
+    return re.sub(r'\s+', " ", link_label.strip()).casefold()
+
+# All link reference defs of a document, in the order they have been defined, plus an index by normalized label, so that looking up the definition of a link does not mean comparing it with every single definition
+class LinkReferenceTable:
+    def __init__(self, definitions: list[LinkReferenceDefinition] = None):
+        self.definitions: list[LinkReferenceDefinition] = []
+        self.definitions_by_label: dict[str, LinkReferenceDefinition] = {}
+        self.missing_labels: set[str] = set() # normalized labels that have been looked up before any definition for them was known; see Parser.feed()
+        self.looked_up_labels: set[str] = set() # all normalized labels that have been looked up; see Parser.getFingerprint()
+
+        if definitions:
+            self.extend(definitions)
+
+    def append(self, definition: LinkReferenceDefinition):
+        self.definitions.append(definition)
+        self.definitions_by_label.setdefault(normalizeLinkLabel(definition.link_label), definition) # "If there are several matching link reference definitions, the one that comes first in the document is used" (sec. 4.7)
+
+    def extend(self, definitions: list[LinkReferenceDefinition]):
+        for definition in definitions:
+            self.append(definition)
+
+    def lookup(self, link_label: str): # the definition matching the label, or None
+        normalized_label = normalizeLinkLabel(link_label)
+        self.looked_up_labels.add(normalized_label)
+
+        definition = self.definitions_by_label.get(normalized_label)
+        if definition is None:
+            self.missing_labels.add(normalized_label)
+        return definition
+
+    def __len__(self):
+        return len(self.definitions)
+
+    def __iter__(self):
+        return iter(self.definitions)
+
+    def __getitem__(self, index): # indices & slices refer to the definitions in document order
+        return self.definitions[index]
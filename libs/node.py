@@ -36,18 +36,32 @@ class CodeBlockType(Enum):
     INDENTED = 1
     FENCED = 2
 
+BLOCK_NODE_TYPES = [NodeType.BLOCK_QUOTE, NodeType.CODE_BLOCK, NodeType.PARAGRAPH, NodeType.HEADING, NodeType.THEMATIC_BREAK, NodeType.HTML_BLOCK, NodeType.CUSTOM_BLOCK, NodeType.LIST, NodeType.LIST_ITEM]
+
 class Node():
+    __slots__ = ("node_type", "parent", "children", "line_buffer", "line_indices", "assigned_raw_content", "cached_raw_content", "content", "open", "fingerprint") # a document has a *lot* of nodes; without a __dict__ per node, each of them takes a lot less memory
+
     def __init__(self, parent, node_type, raw_content = ""):
         self.node_type: int = node_type
 
         self.parent: Node = parent
         self.children : list[Node] = []
 
-        self.raw_content: str = ""
+        # A line added to a block is also part of the raw content of all its ancestors. Instead of copying it into every one of them, the line is stored once in a buffer shared by the whole document, and the nodes only remember its index; "raw_content" joins the lines when it is read
+        if parent:
+            self.line_buffer: list[str] = parent.line_buffer
+        else:
+            self.line_buffer: list[str] = []
+        self.line_indices: list[int] = []
+        self.assigned_raw_content: str = "" # raw content that has been set directly; the lines in "line_indices" follow it
+        self.cached_raw_content: str = ""
+
         self.content: str = ""
 
         self.open: bool = True
 
+        self.fingerprint: bytes = None # set by the parser for top-level blocks; identifies the block by its source, see Parser.getFingerprint()
+
         if parent:
             parent.children.append(self)
 
@@ -75,21 +89,43 @@ class Node():
             return self
         return last_open_child
 
+    @property
+    def raw_content(self):
+        if self.cached_raw_content is None:
+            self.cached_raw_content = self.assigned_raw_content + "".join([self.line_buffer[line_index] for line_index in self.line_indices])
+        return self.cached_raw_content
+
+    @raw_content.setter
+    def raw_content(self, new_raw_content: str):
+        self.assigned_raw_content = new_raw_content
+        self.line_indices = []
+        self.cached_raw_content = new_raw_content
+
     def addLine(self, line_to_add): # adds a line to the nodes "raw_content" *as well as all of its parents "raw_content"* (needed to determine list tightness)
         if not line_to_add:
             return
 
-        self.raw_content += line_to_add
-
-        if self.node_type not in [NodeType.BLOCK_QUOTE, NodeType.CODE_BLOCK, NodeType.PARAGRAPH, NodeType.HEADING, NodeType.THEMATIC_BREAK, NodeType.HTML_BLOCK, NodeType.CUSTOM_BLOCK, NodeType.LIST, NodeType.LIST_ITEM]: # prevent addition to parents' raw content if we are parsing inlines
+        if self.node_type not in BLOCK_NODE_TYPES: # prevent addition to parents' raw content if we are parsing inlines
+            self.raw_content += line_to_add
             return
 
-        if self.parent:
-            self.parent.addLine(line_to_add)
+        self.line_buffer.append(line_to_add)
+        line_index = len(self.line_buffer) - 1
 
-        # NOTE: For whatever reason, every time a line gets added to a list, it gets added twice; it doesn't affect any parsing work, so I will fix it at a later stage
+        node = self
+        while node:
+            node.line_indices.append(line_index)
+            node.cached_raw_content = None
+
+            if node.node_type not in BLOCK_NODE_TYPES: # the document (or any other non-block) gets the line, but does not pass it on
+                break
+            node = node.parent
+
+        # NOTE: For whatever reason, every time a line gets added to a list, it gets added twice; it doesn't affect any parsing work, so I will fix it at a later stage (as the ancestors only store the index of a line, the duplicate costs an index instead of a copy of the line)
 
 class CodeBlockNode(Node):
+    __slots__ = ("type", "language", "delimiter_char", "delimiter_count", "indentation_width")
+
     def __init__(self, parent, type, language = None, delimiter_char = "", delimiter_count = 0, indentation_width = 0, raw_content = ""):
         super().__init__(parent, NodeType.CODE_BLOCK)
 
@@ -103,18 +139,24 @@ class CodeBlockNode(Node):
         self.raw_content = raw_content
 
 class HeadingNode(Node):
+    __slots__ = ("heading_level",)
+
     def __init__(self, parent, heading_level, raw_content):
         super().__init__(parent, NodeType.HEADING, raw_content)
 
         self.heading_level = heading_level
 
 class HTMLBlockNode(Node):
+    __slots__ = ("block_type",)
+
     def __init__(self, parent, block_type, raw_content = ""):
         super().__init__(parent, NodeType.HTML_BLOCK, raw_content)
 
         self.block_type: int = block_type # value between 1 and 7 (inclusive); indicating the "kind of HTML block" as described in sec. 4.6
 
 class ListNode(Node):
+    __slots__ = ("list_type", "delimiter", "starting_number", "is_tight")
+
     def __init__(self, parent, list_type, delimiter, starting_number = None):
         super().__init__(parent, NodeType.LIST)
 
@@ -124,12 +166,16 @@ class ListNode(Node):
         self.is_tight: bool = True
 
 class ListItemNode(Node):
+    __slots__ = ("continuation_indent",)
+
     def __init__(self, parent, raw_content, continuation_indent):
         super().__init__(parent, NodeType.LIST_ITEM, raw_content)
 
         self.continuation_indent = continuation_indent # characters of indentation needed for the next line to be part of the last list item (see sec. 5.2)
 
 class LinkOrImageNode(Node):
+    __slots__ = ("link_destination", "title")
+
     def __init__(self, parent, node_type, link_destination, text, title):
         super().__init__(parent, node_type, text)
 
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import tempfile
+import time
+from .binary_ast import dump, load, MAGIC
+from .parser import PARSER_VERSION
+
+# An on-disk cache of parsed documents, for re-rendering many files of which most have not changed since the last run: the AST of a document is stored (in the format of binary_ast.py) in a file named after a hash of its input and the parser version.
+# Several processes may share the directory: entries are written to a temporary file first and then renamed, so that no process ever reads a partially written entry, and an entry that disappears (because another process evicted it) is simply a miss.
+# Use it by creating the parser with Parser(cache=ParseCache(directory)); on a hit, parse() returns the loaded document (an ArenaNode) instead of parsing the input.
+
+ENTRY_SUFFIX = ".ast"
+TEMPORARY_SUFFIX = ".tmp"
+STALE_TEMPORARY_FILE_AGE = 3600 # seconds after which a temporary file is considered left behind by a process that crashed while writing it
+
+class ParseCache:
+    def __init__(self, directory: str, max_size: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size # in bytes; the least recently used entries are evicted once the entries take up more than this
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.estimated_size: int = None # size of all entries, as of the last scan plus what this process has written since; the directory is only scanned again once this exceeds "max_size"
+
+        os.makedirs(directory, exist_ok=True)
+
+    def getKey(self, markdown_input: str):
+        key_hash = hashlib.blake2b(digest_size=20)
+        key_hash.update(f"{PARSER_VERSION}|{MAGIC.hex()}|".encode("ascii"))
+        key_hash.update(markdown_input.encode("utf-8", "surrogatepass"))
+        return key_hash.hexdigest()
+
+    def getPath(self, key: str):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    # The cached document for "key", or None
+    def get(self, key: str):
+        path = self.getPath(key)
+
+        try:
+            document = load(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except ValueError: # not an AST file, a truncated one or one written by a different version of binary_ast.py
+            self.removeEntry(path)
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path) # the modification time marks when an entry has last been used; access times are not reliable, as many file systems are mounted with "noatime"
+        except OSError: # e.g. evicted by another process in the meantime, which does not affect the mapping
+            pass
+
+        self.hits += 1
+        return document
+
+    def put(self, key: str, document):
+        file_descriptor, temporary_path = tempfile.mkstemp(suffix=TEMPORARY_SUFFIX, dir=self.directory)
+        os.close(file_descriptor)
+
+        try:
+            dump(document, temporary_path)
+            size = os.path.getsize(temporary_path)
+            os.replace(temporary_path, self.getPath(key)) # atomic, even if another process writes the same entry at the same time
+        except PermissionError: # on Windows, an entry cannot be replaced while another process has mapped it; as the key is the same, so is its content
+            self.removeEntry(temporary_path)
+            return
+        except BaseException:
+            self.removeEntry(temporary_path)
+            raise
+
+        if self.estimated_size is None:
+            self.scanAndEvict()
+        else:
+            self.estimated_size += size
+            if self.estimated_size > self.max_size:
+                self.scanAndEvict()
+
+    # Removes the least recently used entries until all of them fit into "max_size" again
+    def scanAndEvict(self):
+        entries = []
+        total_size = 0
+
+        for directory_entry in os.scandir(self.directory):
+            try:
+                stat = directory_entry.stat()
+            except FileNotFoundError: # removed by another process in the meantime
+                continue
+
+            if directory_entry.name.endswith(TEMPORARY_SUFFIX):
+                if stat.st_mtime < time.time() - STALE_TEMPORARY_FILE_AGE:
+                    self.removeEntry(directory_entry.path)
+            elif directory_entry.name.endswith(ENTRY_SUFFIX):
+                entries.append((stat.st_mtime, stat.st_size, directory_entry.path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            if self.removeEntry(path):
+                self.evictions += 1
+            total_size -= size
+
+        self.estimated_size = total_size
+
+    def removeEntry(self, path: str): # whether the file has been removed by this process
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError: # removed by another process
+            return False
+        except PermissionError: # on Windows, a file cannot be removed while another process has mapped it; it will be evicted by a later scan
+            return False
+
+    def clear(self):
+        for directory_entry in os.scandir(self.directory):
+            if directory_entry.name.endswith(ENTRY_SUFFIX):
+                self.removeEntry(directory_entry.path)
+        self.estimated_size = 0
@@ -1,14 +1,23 @@
+import bisect
+import hashlib
 import re
 from .node import *
 from .regexps import *
 from .blocks import *
 from .inlines import *
-from .link_reference_definition import LinkReferenceDefinition
+from .link_reference_definition import LinkReferenceTable
+from .arena import NodeArena
+from .stats import Stats, instrumented
+
+PARSER_VERSION = 1 # increase this whenever a change to the parser changes the AST it produces; the parse cache (see parse_cache.py) keys its entries on it
 
 # This implementation follows the guidelines set out in the [Appendix of the CommonMark 0.30 spec](https://spec.commonmark.org/0.30/#appendix-a-parsing-strategy). Credit goes to the respective authors.
 
-def parseBlocks(document: Node, line: str, link_reference_defs: list[LinkReferenceDefinition]):
-    deepest_open_child = document.getDeepestOpenChild()
+# "open_blocks" holds all open blocks in the order they have been opened, starting with the document. Blocks are only ever opened below a block on the path to the deepest open child, and only that child is ever closed; hence the last entry is always the deepest open child, without walking down from the document
+def parseBlocks(document: Node, line: str, link_reference_defs: LinkReferenceTable, open_blocks: list[Node]):
+    while not open_blocks[-1].open: # drop the blocks that have been closed right after being opened (or at the end of the last line)
+        open_blocks.pop()
+    deepest_open_child = open_blocks[-1]
 
     # paragraph continuation text/"lazy continuation" (sec. 5.1)
     if deepest_open_child.node_type == NodeType.PARAGRAPH and canRemainOpen(deepest_open_child, line):
@@ -24,7 +33,7 @@ def parseBlocks(document: Node, line: str, link_reference_defs: list[LinkReferen
                 deepest_open_child.addLine(line)
 
             if deepest_open_child.node_type == NodeType.LIST_ITEM:             
-                openBlock(deepest_open_child, line[deepest_open_child.continuation_indent:], deepest_open_child)
+                openBlock(deepest_open_child, line[deepest_open_child.continuation_indent:], deepest_open_child, open_blocks)
         else: # block cannot remain open; hence close it and open a new fitting block
             while not canRemainOpen(deepest_open_child, line): # back up to the deepest block that *can* remain open
                 if deepest_open_child.node_type == NodeType.PARAGRAPH: # if we are about to close a paragraph, parse all link reference defs for later use
@@ -35,19 +44,19 @@ def parseBlocks(document: Node, line: str, link_reference_defs: list[LinkReferen
                     return # However, this means that the line cannot include any other relevant tokens; hence stop block parsing for this line here
 
                 deepest_open_child.open = False
-                deepest_open_child = document.getDeepestOpenChild()
+                open_blocks.pop()
+                deepest_open_child = open_blocks[-1]
 
             if deepest_open_child.node_type == NodeType.LIST_ITEM: # needed to make sub-lists possible
-                openBlock(deepest_open_child, line[deepest_open_child.continuation_indent:], deepest_open_child)
+                openBlock(deepest_open_child, line[deepest_open_child.continuation_indent:], deepest_open_child, open_blocks)
             elif document.getLastChild().node_type == NodeType.CODE_BLOCK: # if we just closed a code block, we do not want the closing sequence of backticks to be interpreted as the beginning of a new code block; hence skip it
                 pass
             else:
-                openBlock(document, line, deepest_open_child)
+                openBlock(document, line, deepest_open_child, open_blocks)
     else: # no lazy continuation and no open block: open a new one...
-        deepest_open_child = document.getDeepestOpenChild()
-        openBlock(document, line, deepest_open_child)
+        openBlock(document, line, deepest_open_child, open_blocks)
 
-def recursiveInlineParsing(node_to_parse_inlines: Node, link_reference_defs: list):
+def recursiveInlineParsing(node_to_parse_inlines: Node, link_reference_defs: LinkReferenceTable):
     if node_to_parse_inlines.node_type == NodeType.PARAGRAPH or node_to_parse_inlines.node_type == NodeType.HEADING:
         node_to_parse_inlines.raw_content = node_to_parse_inlines.raw_content.rstrip()
         parseInlines(node_to_parse_inlines, node_to_parse_inlines.raw_content.rstrip(), link_reference_defs)
@@ -55,26 +64,383 @@ def recursiveInlineParsing(node_to_parse_inlines: Node, link_reference_defs: lis
         for child in node_to_parse_inlines.children:
             recursiveInlineParsing(child, link_reference_defs)
 
+# the lines of a document, as they are fed into the block parser
+def splitIntoLines(markdownInput: str):
+    markdownInput = re.sub(r'\\uOOOO', r'\\uFFFD', markdownInput) # as per sec. 2.3
+    markdownInput = markdownInput.rstrip() # ignore new-lines & spaces at the end of the document
+    return markdownInput.splitlines(True)
+
+class BlockBoundary: # the line at which a top-level block has been opened; needed to restart block parsing in Parser.reparse()
+    def __init__(self, line_index: int, link_reference_def_count: int, clean: bool):
+        self.line_index = line_index
+        self.link_reference_def_count = link_reference_def_count # number of link reference defs known right after this line has been parsed
+        self.clean = clean # whether all blocks before this one had already been closed; only then can block parsing be restarted at this line
+
+def getInlineBlocks(node: Node): # the blocks below (and including) "node" that contain inlines
+    if node.node_type == NodeType.PARAGRAPH or node.node_type == NodeType.HEADING:
+        return [node]
+
+    inline_blocks = []
+    for child in node.children:
+        inline_blocks.extend(getInlineBlocks(child))
+    return inline_blocks
+
+class StreamedBlock: # a finished top-level block that Parser.feed() has not returned yet
+    def __init__(self, block: Node):
+        self.block = block
+        self.inline_blocks = getInlineBlocks(block)
+        self.raw_contents = [inline_block.raw_content for inline_block in self.inline_blocks] # needed to parse the inlines once more
+        self.missing_labels: set[str] = set() # link labels without a definition when the inlines were parsed
+
+    def parseInlines(self, link_reference_defs: LinkReferenceTable):
+        link_reference_defs.missing_labels = set()
+
+        for inline_block, raw_content in zip(self.inline_blocks, self.raw_contents):
+            inline_block.children = []
+            inline_block.raw_content = raw_content
+            recursiveInlineParsing(inline_block, link_reference_defs)
+
+        self.missing_labels = link_reference_defs.missing_labels
+
 class Parser:
-    def __init__(self):
+    def __init__(self, arena: bool = False, cache = None, stats = False):
+        self.arena = arena # if set, parse() returns a compact, read-only view of the document (see arena.py) instead of a tree of Nodes
+        self.cache = cache # a ParseCache (see parse_cache.py); documents found in it are loaded instead of parsed
+
+        # time per phase & counters of the last parse() or reparse() (see stats.py); True creates a new Stats object, which can then be shared with the renderers
+        self.stats: Stats = None
+        if stats is True:
+            self.stats = Stats()
+        elif stats:
+            self.stats = stats
         self.document = None
-        self.link_reference_defs: list[LinkReferenceDefinition] = None
+        self.link_reference_defs: LinkReferenceTable = None
+
+        # state of the last parse; needed for incremental re-parsing
+        self.markdown_input: str = None
+        self.lines: list[str] = None
+        self.block_boundaries: list[BlockBoundary] = None
+        self.open_blocks: list[Node] = None # stack of the blocks that are currently open; see parseBlocks()
+        self.full_parse_line_buffer_size: int = 0
 
+        # state of a streaming parse; see feed()
+        self.unsplit_input: str = None # input after the last complete line
+        self.held_back_lines: list[str] = None
+        self.streamed_blocks: list[StreamedBlock] = None
+        self.streamed_link_reference_def_count: int = 0 # number of link reference defs the held back blocks have been checked against
+
+    @instrumented("parse")
     def parse(self, markdownInput: str):
+        if self.cache is not None:
+            cache_key = self.cache.getKey(markdownInput)
+            cached_document = self.cache.get(cache_key)
+
+            if cached_document is not None:
+                # just like the arena, a loaded document cannot be re-parsed incrementally
+                self.markdown_input = markdownInput
+                self.lines = None
+                self.block_boundaries = None
+                self.open_blocks = None
+                self.document = cached_document
+
+                return self.document
+
+            document = self.parseWithoutCache(markdownInput)
+            self.cache.put(cache_key, document)
+            return document
+
+        return self.parseWithoutCache(markdownInput)
+
+    def parseWithoutCache(self, markdownInput: str):
         self.document = Node(None, NodeType.DOCUMENT)
-        self.link_reference_defs: list[LinkReferenceDefinition] = []
+        self.link_reference_defs = LinkReferenceTable()
 
-        markdownInput = re.sub(r'\\uOOOO', r'\\uFFFD', markdownInput) # as per sec. 2.3
-        markdownInput = markdownInput.rstrip() # ignore new-lines & spaces at the end of the document
-        lines = markdownInput.splitlines(True)
+        self.markdown_input = markdownInput
+        self.lines = splitIntoLines(markdownInput)
+        self.block_boundaries = []
 
-        for line in lines:
-            parseBlocks(self.document, line, self.link_reference_defs)
+        self.parseLines(0)
+        self.finishDocument()
+
+        if self.arena:
+            return self.moveIntoArena()
+
+        for child_index in range(len(self.document.children)):
+            self.parseBlockInlines(child_index)
+
+        self.full_parse_line_buffer_size = len(self.document.line_buffer)
+
+        return self.document
+
+    # Parses the inlines of one top-level block at a time and copies it into a NodeArena right away, so that the Nodes of only one block are alive at any point
+    def moveIntoArena(self):
+        arena = NodeArena()
+        document_index = arena.addNode(self.document, -1)
+
+        children = self.document.children
+        self.document.children = []
+        for child_index in range(len(children)):
+            recursiveInlineParsing(children[child_index], self.link_reference_defs)
+            arena.addSubtree(children[child_index], document_index, release=True)
+            children[child_index] = None
+
+        arena.finish()
+
+        # the arena cannot be re-parsed incrementally; reparse() falls back to parse()
+        self.lines = None
+        self.block_boundaries = None
+        self.open_blocks = None
+        self.document = arena.view(document_index)
+
+        return self.document
+
+    # Re-parses the document after the characters [edit_start, edit_start + removed_len) of the last input have been replaced by "inserted_text".
+    # Block parsing restarts at the last top-level block boundary before the edit and stops as soon as a block boundary lines up with one of the last parse again; all top-level blocks outside of that range are reused as they are.
+    @instrumented("reparse")
+    def reparse(self, edit_start: int, removed_len: int, inserted_text: str):
+        if self.document is None:
+            return self.parse(inserted_text)
+
+        old_input = self.markdown_input
+        new_input = old_input[:edit_start] + inserted_text + old_input[edit_start + removed_len:]
+
+        if self.lines is None: # the document is an arena or has been loaded from the cache
+            return self.parse(new_input)
+
+        # the lines of discarded blocks stay in the document's shared line buffer; once it has doubled in size, start over with a full parse to get rid of them
+        if len(self.document.line_buffer) > 2 * self.full_parse_line_buffer_size:
+            return self.parse(new_input)
+
+        old_lines = self.lines
+        new_lines = splitIntoLines(new_input)
+
+        # sec. 2.3 replaces sequences of equal length and rstrip() only cuts off the end, so character offsets into the input are also offsets into the lines
+        line_starts = [0]
+        for line in old_lines:
+            line_starts.append(line_starts[-1] + len(line))
+
+        # rstrip() may also cut off lines before the edit, if the edit leaves only whitespace behind them
+        new_length = sum([len(line) for line in new_lines])
+        first_changed_line = max(bisect.bisect_right(line_starts, min(edit_start, line_starts[-1], new_length)) - 1, 0)
+        last_changed_line = min(bisect.bisect_right(line_starts, edit_start + removed_len) - 1, len(old_lines))
+        line_delta = len(new_lines) - len(old_lines)
+
+        # the lines after the edit have to be identical for the old blocks to be reused (this is not the case if the edit changes the end of the document, because of the rstrip())
+        first_unchanged_line = last_changed_line + 1
+        if old_lines[first_unchanged_line:] != new_lines[first_unchanged_line + line_delta:]:
+            return self.parse(new_input)
+
+        # restart at the block *before* the one containing the edit, as the edited line may belong to that block now (e.g. a setext heading underline or lazy continuation text)
+        old_boundaries = self.block_boundaries
+        restart_index = bisect.bisect_right(old_boundaries, first_changed_line, key=lambda boundary: boundary.line_index) - 2
+        while restart_index > 0 and not old_boundaries[restart_index].clean:
+            restart_index -= 1
+        restart_index = max(restart_index, 0)
+
+        restart_line = 0
+        old_link_reference_defs = self.link_reference_defs
+        link_reference_def_count = 0
+        if restart_index > 0:
+            restart_line = old_boundaries[restart_index].line_index
+            link_reference_def_count = old_boundaries[restart_index].link_reference_def_count
+
+        old_children = self.document.children[restart_index:]
+        del self.document.children[restart_index:]
+
+        self.markdown_input = new_input
+        self.lines = new_lines
+        self.block_boundaries = old_boundaries[:restart_index]
+        self.link_reference_defs = LinkReferenceTable(old_link_reference_defs[:link_reference_def_count])
+
+        converged_at = self.parseLines(restart_line, old_boundaries, first_unchanged_line + line_delta, line_delta)
+
+        if converged_at is None:
+            self.finishDocument()
+            new_children = self.document.children[restart_index:]
+        else: # the rest of the document parses exactly like last time: replace the block that has just been opened by the old ones
+            del self.document.children[-1]
+            del self.block_boundaries[-1]
+            new_children = self.document.children[restart_index:]
+
+            link_reference_def_delta = len(self.link_reference_defs) - old_boundaries[converged_at].link_reference_def_count
+            self.link_reference_defs.extend(old_link_reference_defs[old_boundaries[converged_at].link_reference_def_count:])
+
+            for boundary in old_boundaries[converged_at:]:
+                boundary.line_index += line_delta
+                boundary.link_reference_def_count += link_reference_def_delta
+            self.block_boundaries.extend(old_boundaries[converged_at:])
 
+            self.document.children.extend(old_children[converged_at - restart_index:])
+
+        # the inlines of the reused blocks have been parsed with the old link reference defs; if those changed, everything needs to be parsed again
+        if [(definition.link_label, definition.link_destination, definition.link_title) for definition in self.link_reference_defs] != [(definition.link_label, definition.link_destination, definition.link_title) for definition in old_link_reference_defs]:
+            return self.parse(new_input)
+
+        for child_index in range(restart_index, restart_index + len(new_children)):
+            self.parseBlockInlines(child_index)
+
+        return self.document
+
+    def parseBlockInlines(self, child_index: int): # parses the inlines of a top-level block & fingerprints it
+        child = self.document.children[child_index]
+
+        self.link_reference_defs.looked_up_labels = set()
+        recursiveInlineParsing(child, self.link_reference_defs)
+
+        child.fingerprint = self.getFingerprint(child_index, self.link_reference_defs.looked_up_labels)
+
+    # A top-level block that starts & ends at clean boundaries parses the same way wherever it appears in a document (this is what reparse() relies on, too); hence its source lines, together with the link reference defs it has looked up, identify its HTML. HTMLRenderer caches the HTML of blocks by this fingerprint
+    # Returns None if the block cannot be identified this way
+    def getFingerprint(self, child_index: int, looked_up_labels: set[str]):
+        boundary = self.block_boundaries[child_index]
+        end_line = len(self.lines)
+        if child_index + 1 < len(self.block_boundaries):
+            if not self.block_boundaries[child_index + 1].clean: # the block was still open when the next one started
+                return None
+            end_line = self.block_boundaries[child_index + 1].line_index
+
+        if not boundary.clean:
+            return None
+
+        source_lines = self.lines[boundary.line_index:end_line]
+
+        fingerprint = hashlib.blake2b(digest_size=16)
+        fingerprint.update(f"{self.document.children[child_index].node_type.value}|{sum([len(line) for line in source_lines])}|".encode())
+        for line in source_lines:
+            fingerprint.update(line.encode("utf-8", "surrogatepass"))
+        for label in sorted(looked_up_labels):
+            definition = self.link_reference_defs.definitions_by_label.get(label)
+            if definition:
+                fingerprint.update(repr((label, definition.link_destination, definition.link_title)).encode("utf-8", "surrogatepass"))
+            else:
+                fingerprint.update(repr((label, None)).encode("utf-8", "surrogatepass"))
+
+        return fingerprint.digest()
+
+    # Feeds self.lines[first_line:] to the block parser and records a BlockBoundary for every top-level block that gets opened.
+    # If the boundaries of a previous parse are given, parsing stops at the first boundary (at or after "first_comparable_line") that matches one of them; the index of the matching old boundary is returned in that case.
+    def parseLines(self, first_line: int, old_boundaries: list[BlockBoundary] = None, first_comparable_line: int = 0, line_delta: int = 0):
+        self.open_blocks = [self.document] # all blocks before the first line are closed
+
+        for line_index in range(first_line, len(self.lines)):
+            child_count = len(self.document.children)
+            parseBlocks(self.document, self.lines[line_index], self.link_reference_defs, self.open_blocks)
+
+            if len(self.document.children) <= child_count: # no new top-level block
+                continue
+
+            # open blocks are stacked in the order they have been opened, so any top-level block left open before the new one would come right after the document
+            clean = len(self.open_blocks) == 1 or self.open_blocks[1] is self.document.children[-1]
+
+            boundary = BlockBoundary(line_index, len(self.link_reference_defs), clean)
+            self.block_boundaries.append(boundary)
+
+            if old_boundaries and boundary.clean and line_index >= first_comparable_line:
+                old_index = bisect.bisect_left(old_boundaries, line_index - line_delta, key=lambda old_boundary: old_boundary.line_index)
+                if old_index < len(old_boundaries) and old_boundaries[old_index].line_index == line_index - line_delta and old_boundaries[old_index].clean:
+                    return old_index
+
+        return None
+
+    def finishDocument(self):
         if self.document and self.document.getLastChild() and self.document.getLastChild().node_type == NodeType.PARAGRAPH:
             parseLinkReferenceDefs(self.document.getLastChild(), self.link_reference_defs) # at the end of input, it is possible to have an open paragraph node that has not been checked for link reference definitions
 
-        for child in self.document.children:
-            recursiveInlineParsing(child, self.link_reference_defs)
+    # Streaming alternative to parse(): the input can be fed in chunks of any size, and every top-level block is returned as soon as it is finished (with its inlines parsed); close() returns the rest.
+    # The Parser only holds on to the blocks that are still open, except for blocks referring to link labels that have not been defined (yet): as a definition may follow anywhere later in the document, these blocks (and, to keep the order, all blocks after them) are held back until the definition shows up or the input ends
+    def feed(self, chunk: str):
+        if self.unsplit_input is None: # first chunk
+            self.document = Node(None, NodeType.DOCUMENT)
+            self.link_reference_defs = LinkReferenceTable()
+            self.open_blocks = [self.document]
+
+            self.unsplit_input = ""
+            self.held_back_lines = []
+            self.streamed_blocks = []
+            self.streamed_link_reference_def_count = 0
+
+        lines = (self.unsplit_input + chunk).splitlines(True)
+        self.unsplit_input = ""
+        if lines and (lines[-1].splitlines()[0] == lines[-1] or lines[-1].endswith("\r")): # an incomplete line (or possibly a "\r\n" cut in half) is kept until the next chunk
+            self.unsplit_input = lines.pop()
+
+        for line in lines:
+            self.feedLine(line)
+
+        return self.getFinishedBlocks()
+
+    def close(self):
+        if self.unsplit_input is None: # nothing has been fed
+            self.feed("")
+
+        if self.unsplit_input:
+            self.feedLine(self.unsplit_input)
+
+        if self.held_back_lines and self.held_back_lines[0].strip(): # the last line with content, without the whitespace at its end
+            parseBlocks(self.document, self.held_back_lines[0].rstrip(), self.link_reference_defs, self.open_blocks)
+        self.finishDocument()
+
+        finished_blocks = self.getFinishedBlocks(True)
+
+        self.unsplit_input = None
+        self.held_back_lines = None
+        self.streamed_blocks = None
+
+        return finished_blocks
+
+    def iter_blocks(self, file_obj):
+        for line in file_obj:
+            yield from self.feed(line)
+        yield from self.close()
+
+    def feedLine(self, line: str):
+        line = re.sub(r'\\uOOOO', r'\\uFFFD', line) # as per sec. 2.3
+
+        # parse() cuts off all whitespace at the end of the document; hence whitespace-only lines (and the last line with content before them) are held back until the next line with content shows up
+        if not line.strip():
+            self.held_back_lines.append(line)
+            return
+
+        for held_back_line in self.held_back_lines:
+            parseBlocks(self.document, held_back_line, self.link_reference_defs, self.open_blocks)
+        self.held_back_lines = [line]
+
+    def getFinishedBlocks(self, end_of_input: bool = False):
+        children = self.document.children
+
+        finished_count = len(children)
+        if not end_of_input:
+            finished_count -= 1 # the last block might still change (e.g. a paragraph into a setext heading)
+            if len(self.open_blocks) > 1: # a top-level block left open, and all blocks after it, are not finished either
+                for child_index in range(len(children) - 1, -1, -1):
+                    if children[child_index] is self.open_blocks[1]:
+                        finished_count = min(finished_count, child_index)
+                        break
+
+        if finished_count > 0:
+            for child in children[:finished_count]:
+                streamed_block = StreamedBlock(child)
+                streamed_block.parseInlines(self.link_reference_defs)
+                self.streamed_blocks.append(streamed_block)
+            del children[:finished_count]
+
+            # the blocks opened from now on get a line buffer of their own, so that the lines of the finished blocks are not kept alive by the document
+            self.document.line_buffer = []
+            self.document.line_indices = []
+            self.document.cached_raw_content = None
+
+        # blocks waiting for link reference defs are parsed once more as soon as a definition for one of their labels is known (or no definition can come anymore)
+        if end_of_input or len(self.link_reference_defs) > self.streamed_link_reference_def_count:
+            for streamed_block in self.streamed_blocks:
+                if streamed_block.missing_labels and (end_of_input or any(label in self.link_reference_defs.definitions_by_label for label in streamed_block.missing_labels)):
+                    streamed_block.parseInlines(self.link_reference_defs)
+            self.streamed_link_reference_def_count = len(self.link_reference_defs)
+
+        returned_count = 0
+        while returned_count < len(self.streamed_blocks) and (end_of_input or not self.streamed_blocks[returned_count].missing_labels):
+            returned_count += 1
+
+        returned_blocks = [streamed_block.block for streamed_block in self.streamed_blocks[:returned_count]]
+        del self.streamed_blocks[:returned_count]
 
-        return self.document
\ No newline at end of file
+        return returned_blocks
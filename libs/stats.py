@@ -0,0 +1,296 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from .node import *
+
+# Opt-in instrumentation of the parser & the renderers: wall time per phase, counts of lines, blocks, inline nodes & delimiter stack operations, and regex match attempts by pattern name.
+# Use it by creating the parser with Parser(stats=True) (and the renderers with HTMLRenderer(options, stats=parser.stats), so that all of it ends up in one report); print(parser.stats.report()) after parsing & rendering.
+# Nothing in the parser checks whether stats are enabled: while an instrumented parse runs, instrument() replaces the functions, compiled patterns & classes the parser looks up in its modules with counting wrappers, and puts the originals back afterwards. Hence the instrumentation costs nothing while no instrumented parse runs.
+# The wrappers are shared by all Stats objects: they are installed by the first instrumented parse to start (in any thread) and removed by the last one to finish, and they count into the Stats of the thread that calls them. Other threads parsing at the same time (e.g. the editor's preview worker) are not counted; they only pass through the wrappers.
+
+# functions timed as a phase: (phase, module name, function name); phases may be nested (e.g. process_emphasis runs within inline_parsing), so their times add up to more than the total
+TIMED_FUNCTIONS = [
+    ("block_parsing", "parser", "parseBlocks"), # called once per line
+    ("link_reference_definitions", "parser", "parseLinkReferenceDefs"),
+    ("inline_parsing", "parser", "parseInlines"),
+    ("process_emphasis", "inlines", "process_emphasis"),
+]
+COUNTED_METHODS = [("inlines", "DelimiterStack", method_name) for method_name in ["push", "remove", "removeAbove", "removeBetween"]]
+INSTRUMENTED_MODULES = ["parser", "blocks", "inlines"] # the modules whose compiled patterns (and uses of the re module) are counted
+
+instrumentation_lock = threading.Lock() # guards the two below
+instrumented_parse_count = 0 # instrumented parses running, in all threads; the wrappers are installed while it is above 0
+installed_originals = [] # (namespace, name, original) of everything the wrappers have replaced
+
+active = threading.local() # active.stats: the Stats of the instrumented parse running in this thread (if any)
+
+def getActiveStats():
+    return getattr(active, "stats", None)
+
+# Stands in for a compiled pattern; counts every attempt to match it
+class CountingPattern:
+    def __init__(self, name: str, pattern: re.Pattern):
+        self.name = name
+        self.pattern = pattern
+
+    def countAttempt(self):
+        stats = getActiveStats()
+        if stats is not None:
+            stats.regex_attempts[self.name] += 1
+
+    def __getattr__(self, attribute): # e.g. "groupindex"; everything but the matching methods below is passed on unchanged
+        return getattr(self.pattern, attribute)
+
+    def match(self, *arguments):
+        self.countAttempt()
+        return self.pattern.match(*arguments)
+
+    def search(self, *arguments):
+        self.countAttempt()
+        return self.pattern.search(*arguments)
+
+    def fullmatch(self, *arguments):
+        self.countAttempt()
+        return self.pattern.fullmatch(*arguments)
+
+    def finditer(self, *arguments):
+        self.countAttempt()
+        return self.pattern.finditer(*arguments)
+
+    def findall(self, *arguments):
+        self.countAttempt()
+        return self.pattern.findall(*arguments)
+
+    def sub(self, *arguments):
+        self.countAttempt()
+        return self.pattern.sub(*arguments)
+
+    def split(self, *arguments):
+        self.countAttempt()
+        return self.pattern.split(*arguments)
+
+# Stands in for the re module in the instrumented modules, to count the patterns that are used as strings (e.g. re.match(LINK_DESTINATION, ...)); they are named after their constant in regexps.py, if they have one
+class CountingReModule:
+    def __init__(self):
+        from . import regexps
+        self.pattern_names = {value: name for name, value in vars(regexps).items() if name.isupper() and isinstance(value, str)}
+
+    def __getattr__(self, attribute):
+        return getattr(re, attribute)
+
+    def countAttempt(self, pattern):
+        stats = getActiveStats()
+        if stats is None:
+            return
+
+        if isinstance(pattern, re.Pattern):
+            pattern = pattern.pattern
+        stats.regex_attempts[self.pattern_names.get(pattern, repr(pattern))] += 1
+
+    def match(self, pattern, *arguments):
+        self.countAttempt(pattern)
+        return re.match(pattern, *arguments)
+
+    def search(self, pattern, *arguments):
+        self.countAttempt(pattern)
+        return re.search(pattern, *arguments)
+
+    def fullmatch(self, pattern, *arguments):
+        self.countAttempt(pattern)
+        return re.fullmatch(pattern, *arguments)
+
+    def finditer(self, pattern, *arguments):
+        self.countAttempt(pattern)
+        return re.finditer(pattern, *arguments)
+
+    def findall(self, pattern, *arguments):
+        self.countAttempt(pattern)
+        return re.findall(pattern, *arguments)
+
+    def sub(self, pattern, *arguments):
+        self.countAttempt(pattern)
+        return re.sub(pattern, *arguments)
+
+    def split(self, pattern, *arguments):
+        self.countAttempt(pattern)
+        return re.split(pattern, *arguments)
+
+def timePhase(phase: str, function):
+    @wraps(function)
+    def timedFunction(*arguments, **keyword_arguments):
+        stats = getActiveStats()
+        if stats is None:
+            return function(*arguments, **keyword_arguments)
+
+        stats.phase_calls[phase] += 1
+        if stats.phase_depths[phase]: # a nested (e.g. recursive) call; its time is part of the outer one
+            return function(*arguments, **keyword_arguments)
+
+        stats.phase_depths[phase] += 1
+        start_time = time.perf_counter()
+        try:
+            return function(*arguments, **keyword_arguments)
+        finally:
+            stats.phase_times[phase] += time.perf_counter() - start_time
+            stats.phase_depths[phase] -= 1
+    return timedFunction
+
+def countCalls(name: str, function):
+    @wraps(function)
+    def countedFunction(*arguments, **keyword_arguments):
+        stats = getActiveStats()
+        if stats is not None:
+            stats.counts[name] += 1
+        return function(*arguments, **keyword_arguments)
+    return countedFunction
+
+# Replaces the functions, compiled patterns & classes the parser looks up in its modules with the counting & timing wrappers, unless another instrumented parse has already done so
+def installWrappers():
+    global instrumented_parse_count
+
+    with instrumentation_lock:
+        instrumented_parse_count += 1
+        if instrumented_parse_count > 1:
+            return
+
+        from . import parser, blocks, inlines
+        modules = {"parser": parser, "blocks": blocks, "inlines": inlines}
+
+        def replace(namespace, name: str, replacement):
+            installed_originals.append((namespace, name, getattr(namespace, name)))
+            setattr(namespace, name, replacement)
+
+        for module_name in INSTRUMENTED_MODULES:
+            module = modules[module_name]
+            for name, value in list(vars(module).items()):
+                if isinstance(value, re.Pattern):
+                    replace(module, name, CountingPattern(name, value))
+                elif isinstance(value, dict) and value and all([isinstance(pattern, re.Pattern) for pattern in value.values()]): # e.g. HTML_BLOCK_END_RE
+                    replace(module, name, {key: CountingPattern(f"{name}[{key}]", pattern) for key, pattern in value.items()})
+                elif value is re:
+                    replace(module, name, CountingReModule())
+        for timed_phase, module_name, function_name in TIMED_FUNCTIONS:
+            replace(modules[module_name], function_name, timePhase(timed_phase, getattr(modules[module_name], function_name)))
+        for module_name, class_name, method_name in COUNTED_METHODS:
+            counted_class = getattr(modules[module_name], class_name)
+            replace(counted_class, method_name, countCalls(f"delimiter_stack.{method_name}", getattr(counted_class, method_name)))
+
+# Puts the originals back once the last instrumented parse has finished
+def removeWrappers():
+    global instrumented_parse_count
+
+    with instrumentation_lock:
+        instrumented_parse_count -= 1
+        if instrumented_parse_count:
+            return
+
+        for namespace, name, original in reversed(installed_originals):
+            setattr(namespace, name, original)
+        installed_originals.clear()
+
+class Stats:
+    def __init__(self):
+        self.phase_times: Counter = Counter() # seconds per phase
+        self.phase_calls: Counter = Counter()
+        self.counts: Counter = Counter() # lines, blocks, inline nodes, delimiter stack operations, ...
+        self.regex_attempts: Counter = Counter() # by pattern name
+
+        self.phase_depths: Counter = Counter() # nesting of the calls of each phase; only the outermost call is timed
+        self.instrumentation_depth = 0
+
+    def reset(self):
+        self.phase_times.clear()
+        self.phase_calls.clear()
+        self.counts.clear()
+        self.regex_attempts.clear()
+
+    # Makes the wrappers count into this Stats for as long as the "with" block runs in this thread; may be nested (e.g. reparse() falling back to parse()), only the outermost one counts as a phase
+    @contextmanager
+    def instrument(self, phase: str):
+        if self.instrumentation_depth:
+            yield
+            return
+
+        installWrappers()
+        outer_stats = getActiveStats()
+        active.stats = self
+
+        self.instrumentation_depth += 1
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[phase] += time.perf_counter() - start_time
+            self.phase_calls[phase] += 1
+            self.instrumentation_depth -= 1
+
+            active.stats = outer_stats
+            removeWrappers()
+
+    # Times the work done by an iterator (e.g. a renderer's iter_render()), but not the time the consumer takes between two items
+    def timeIterator(self, phase: str, iterator):
+        self.phase_calls[phase] += 1
+        while True:
+            start_time = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.phase_times[phase] += time.perf_counter() - start_time
+                return
+            self.phase_times[phase] += time.perf_counter() - start_time
+            yield item
+
+    # Counts the blocks & inline nodes of a document (or of anything with the attributes of a Node, e.g. an ArenaNode)
+    def countNodes(self, document, prefix: str = ""):
+        nodes_to_count = list(document.children)
+        while nodes_to_count:
+            node = nodes_to_count.pop()
+            if node.node_type in BLOCK_NODE_TYPES:
+                self.counts[prefix + "blocks"] += 1
+            else:
+                self.counts[prefix + "inline_nodes"] += 1
+            nodes_to_count.extend(node.children)
+
+    def as_dict(self):
+        return {
+            "phase_times": dict(self.phase_times),
+            "phase_calls": dict(self.phase_calls),
+            "counts": dict(self.counts),
+            "regex_attempts": dict(self.regex_attempts),
+        }
+
+    def report(self):
+        lines = [f"{'phase':<40}{'time':>12}{'calls':>10}"]
+        for phase, phase_time in sorted(self.phase_times.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {phase:<38}{phase_time * 1000:>10.1f}ms{self.phase_calls[phase]:>10}")
+
+        lines.append("counts")
+        for name, count in sorted(self.counts.items()):
+            lines.append(f"  {name:<38}{count:>12}")
+
+        lines.append("regex match attempts")
+        for name, count in self.regex_attempts.most_common():
+            lines.append(f"  {name:<38}{count:>12}")
+
+        return "\n".join(lines)
+
+# Decorates the Parser methods that parse a document: with stats enabled, the stats are reset and the method runs instrumented
+def instrumented(phase: str):
+    def decorator(method):
+        @wraps(method)
+        def instrumentedMethod(self, *arguments):
+            if self.stats is None or self.stats.instrumentation_depth:
+                return method(self, *arguments)
+
+            self.stats.reset()
+            with self.stats.instrument(phase):
+                document = method(self, *arguments)
+
+            self.stats.counts["lines"] = self.stats.phase_calls["block_parsing"] # the lines that have actually been parsed (reparse() skips most of them)
+            self.stats.countNodes(document)
+            return document
+        return instrumentedMethod
+    return decorator
@@ -0,0 +1,279 @@
+import bisect
+import threading
+import time
+from PyQt5 import QtCore
+
+from libs import parser, htmlrenderer
+
+# Parses & renders the preview of the editor in a background thread, so that typing stays responsive however large the document is.
+# MainWindow submits the edits of the text to a PreviewWorker that lives in its own QThread, numbered by a generation that increases with every submission. An edit comes with just the text it inserts, so that the GUI thread never has to copy the whole text; the worker keeps the text up to date on its own. The worker takes on all the edits that have been submitted while it was busy at once, stops rendering as soon as newer ones have been submitted, and MainWindow drops every result whose generation has been superseded by then.
+# The web view loads PREVIEW_PAGE only once; after that, the worker's result is the HTML of every top-level block on its own, and MainWindow sends only the blocks that differ from what the page shows (see diffFragments()) to the page's patchBlocks() function. Hence the page is neither reloaded nor re-laid out as a whole on every edit, and it keeps its scroll position.
+# Edits are not submitted right away either: a PreviewScheduler waits until the user has stopped typing for a moment, for longer the longer the last updates of the preview took, so that a burst of edits (e.g. a held key or a paste) results in a single update.
+# Documents of VIRTUALIZED_PREVIEW_SIZE characters or more are previewed virtualized: only the top-level blocks around the lines visible in the editor are rendered, every other block is replaced by a placeholder of about its height. Scrolling the editor submits a request without edits, which fills in the placeholders that have come into view (and scrolls the preview along); the HTML of blocks that have been rendered before comes from the renderer's fragment cache.
+# Usage: see MainWindow.__init__() in app.py
+
+# Loaded into the web view once. Every top-level block may render to any number of DOM nodes (e.g. an HTML block, or an empty paragraph rendering to none at all), so the page keeps the nodes of every block, rather than wrapping the blocks in elements of their own that the stylesheets do not know about
+PREVIEW_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<style id="jame-style"></style>
+<script>
+var blocks = []; // the DOM nodes of every top-level block
+var endMarker = null;
+
+function patchBlocks(start, removeCount, fragments) {
+    if (endMarker === null) {
+        endMarker = document.createComment("end of the preview");
+        document.body.appendChild(endMarker);
+    }
+
+    for (var blockIndex = start; blockIndex < start + removeCount; blockIndex++) {
+        blocks[blockIndex].forEach(function (node) { node.remove(); });
+    }
+
+    var nextNode = endMarker;
+    for (var blockIndex = start + removeCount; blockIndex < blocks.length; blockIndex++) {
+        if (blocks[blockIndex].length) {
+            nextNode = blocks[blockIndex][0];
+            break;
+        }
+    }
+
+    var insertedBlocks = fragments.map(function (fragment) {
+        var template = document.createElement("template");
+        template.innerHTML = fragment;
+        var nodes = Array.from(template.content.childNodes);
+        document.body.insertBefore(template.content, nextNode);
+        return nodes;
+    });
+    blocks.splice.apply(blocks, [start, removeCount].concat(insertedBlocks));
+}
+
+function scrollToBlock(blockIndex) {
+    var element = (blocks[blockIndex] || []).find(function (node) { return node.nodeType === Node.ELEMENT_NODE; });
+    if (element) {
+        element.scrollIntoView();
+    }
+}
+
+function setStyle(css) {
+    document.getElementById("jame-style").textContent = css;
+}
+</script>
+</head>
+<body>
+</body>
+</html>"""
+
+VIRTUALIZED_PREVIEW_SIZE = 1048576 # characters
+VIRTUALIZED_MARGIN = 50 # top-level blocks before & after the visible ones that are rendered as well
+PLACEHOLDER_LINE_HEIGHT = 1.5 # em per source line of a block; the estimated height of its placeholder
+PREVIEW_CACHE_CHARACTERS = 4194304 # bound of the HTML the worker's renderer keeps for the next update (see HTMLRenderer.retainFragments() as well); a few times the HTML of the largest document that is not virtualized
+
+# An edit is a tuple (position, chars removed, chars added), as reported by QTextDocument.contentsChange; None stands for "unknown", i.e. the document has to be parsed in full
+def mergeEdits(first_edit: tuple[int, int, int], second_edit: tuple[int, int, int]):
+    if first_edit is None or second_edit is None:
+        return None
+
+    first_position, first_removed, first_added = first_edit
+    second_position, second_removed, second_added = second_edit
+
+    # the range both edits touch, in the text after the first one; everything before it is unchanged, everything after it is only shifted
+    start = min(first_position, second_position)
+    end = max(first_position + first_added, second_position + second_removed)
+
+    return (start, end - first_added + first_removed - start, end - second_removed + second_added - start)
+
+# Returns the patch that turns the blocks "old_fragments" into "new_fragments": the index of the first block that differs, the number of old blocks to remove from there on & the new blocks to insert instead
+def diffFragments(old_fragments: list[str], new_fragments: list[str]):
+    # fragments of blocks that come from the renderer's fragment cache are the very same strings as last time, so most of these comparisons are identity checks
+    start = 0
+    common_length = min(len(old_fragments), len(new_fragments))
+    while start < common_length and old_fragments[start] == new_fragments[start]:
+        start += 1
+
+    old_end = len(old_fragments)
+    new_end = len(new_fragments)
+    while old_end > start and new_end > start and old_fragments[old_end - 1] == new_fragments[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+
+    return start, old_end - start, new_fragments[start:new_end]
+
+class PreviewRequest:
+    def __init__(self, generation: int, edit: tuple[int, int, str] = None, text: str = None, visible_lines: tuple[int, int] = None):
+        self.generation = generation
+        self.edit = edit # (position, chars removed, inserted text), relative to the text of the request before; or
+        self.text = text # the whole text, if the edit is not known; neither of them if only the visible lines have changed
+        self.visible_lines = visible_lines # the first & the last line visible in the editor
+
+class PreviewWorker(QtCore.QObject):
+    rendered = QtCore.pyqtSignal(int, object, float, int) # generation, HTML of every top-level block (a list of strings), seconds it took to parse & render, index of the first visible block if the preview is virtualized (-1 otherwise)
+    failed = QtCore.pyqtSignal(int, str) # generation, error message
+    requestSubmitted = QtCore.pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+
+        # both belong to the worker thread; MainWindow keeps a renderer of its own for the exports
+        self.parser = parser.Parser()
+        self.htmlRenderer = htmlrenderer.HTMLRenderer({"indent": 4, "include_html_backbone": False, "css_styling": "", "fragment_cache_size": 16384, "fragment_cache_characters": PREVIEW_CACHE_CHARACTERS}) # the styling is part of PREVIEW_PAGE
+
+        self.text: str = None # as of the last request that has been taken on
+        self.visible_lines: tuple[int, int] = (0, 0)
+        self.placeholders: dict[int, str] = {} # by line count; the same string for every placeholder of the same height, so that diffFragments() can compare them by identity
+
+        self.lock = threading.Lock() # guards pending_requests, which submit() adds to from the GUI thread
+        self.pending_requests: list[PreviewRequest] = []
+
+        # the worker lives in another thread than the one emitting this signal (see submit()); hence the slot is queued to run in the worker's thread
+        self.requestSubmitted.connect(self.processPendingRequest)
+
+    # Called from the GUI thread; returns right away. The first request has to come with the whole text
+    def submit(self, request: PreviewRequest):
+        with self.lock:
+            already_pending = bool(self.pending_requests)
+            self.pending_requests.append(request)
+
+        if not already_pending: # otherwise, processPendingRequest() is already queued & will take on this request, too
+            self.requestSubmitted.emit()
+
+    def isSuperseded(self):
+        with self.lock:
+            return bool(self.pending_requests)
+
+    @QtCore.pyqtSlot()
+    def processPendingRequest(self):
+        with self.lock:
+            requests = self.pending_requests
+            self.pending_requests = []
+        if not requests:
+            return
+
+        start_time = time.perf_counter()
+        request = requests[-1]
+        try:
+            document = self.parseRequests(requests)
+            # parsing cannot be stopped halfway through (the parser needs to finish to re-parse the next edit incrementally), but rendering can: a superseded request is not rendered any further
+            if self.isSuperseded():
+                return
+
+            for visible_request in requests:
+                if visible_request.visible_lines is not None:
+                    self.visible_lines = visible_request.visible_lines
+
+            first_rendered_block, end_rendered_block, first_visible_block = 0, len(document.children), -1
+            if len(self.text) >= VIRTUALIZED_PREVIEW_SIZE and self.parser.block_boundaries is not None and len(self.parser.block_boundaries) == len(document.children):
+                first_rendered_block, end_rendered_block, first_visible_block = self.getRenderedBlocks()
+
+            fragments = []
+            for block_index, block in enumerate(document.children):
+                if block_index < first_rendered_block or block_index >= end_rendered_block:
+                    fragments.append(self.getPlaceholder(block_index))
+                    continue
+
+                if self.isSuperseded():
+                    return
+                fragments.append(self.htmlRenderer.renderFragment(block))
+            self.htmlRenderer.retainFragments(document.children) # the preview only ever shows this one document; the HTML of blocks edited away is of no use any more
+        except Exception as error:
+            self.parser = parser.Parser() # the state of the last parse may be broken; the next request is parsed in full
+            self.failed.emit(request.generation, f"{type(error).__name__}: {error}")
+            return
+
+        self.rendered.emit(request.generation, fragments, time.perf_counter() - start_time, first_visible_block)
+
+    # The top-level blocks to render in a virtualized preview: returns the first one & the one after the last, and the first one that is visible in the editor
+    def getRenderedBlocks(self):
+        first_line, last_line = self.visible_lines
+        boundaries = self.parser.block_boundaries
+
+        first_visible_block = max(bisect.bisect_right(boundaries, first_line, key=lambda boundary: boundary.line_index) - 1, 0)
+        last_visible_block = max(bisect.bisect_right(boundaries, last_line, key=lambda boundary: boundary.line_index) - 1, 0)
+
+        return max(first_visible_block - VIRTUALIZED_MARGIN, 0), last_visible_block + VIRTUALIZED_MARGIN + 1, first_visible_block
+
+    def getPlaceholder(self, block_index: int):
+        boundaries = self.parser.block_boundaries
+        end_line = boundaries[block_index + 1].line_index if block_index + 1 < len(boundaries) else len(self.parser.lines)
+        line_count = max(end_line - boundaries[block_index].line_index, 1) # including the blank lines after the block, which make up for its margins
+
+        placeholder = self.placeholders.get(line_count)
+        if placeholder is None:
+            placeholder = f"<div class=\"jame-placeholder\" style=\"height: {line_count * PLACEHOLDER_LINE_HEIGHT}em\"></div>"
+            self.placeholders[line_count] = placeholder
+        return placeholder
+
+    # Applies the edits of the requests to the text & re-parses the range they cover (or the whole text, if any of them has not come with its edit)
+    def parseRequests(self, requests: list[PreviewRequest]):
+        text = self.text
+        full_parse = False
+        edit = None # covering all the edits, as (position, chars removed, chars added)
+
+        for request in requests:
+            if request.text is not None:
+                text = request.text
+                full_parse = True
+                continue
+            if request.edit is None: # only the visible lines have changed
+                continue
+
+            position, chars_removed, inserted_text = request.edit
+            text = text[:position] + inserted_text + text[position + chars_removed:]
+            request_edit = (position, chars_removed, len(inserted_text))
+            edit = request_edit if edit is None else mergeEdits(edit, request_edit)
+
+        self.text = text
+
+        if not full_parse and edit is None and self.parser.document is not None and self.parser.markdown_input == text: # nothing to parse
+            return self.parser.document
+
+        if not full_parse and edit is not None and self.parser.markdown_input is not None:
+            position, chars_removed, chars_added = edit
+            document = self.parser.reparse(position, chars_removed, text[position:position + chars_added])
+            if self.parser.markdown_input == text:
+                return document
+
+        return self.parser.parse(text)
+
+DEBOUNCE_FACTOR = 1.5 # the preview is updated once there have been no edits for this many times as long as an update takes
+MAX_DEBOUNCE_DELAY = 0.75 # seconds
+MAX_STALENESS = 1.5 # seconds; the preview is updated at least this often while the user keeps on typing
+TIME_SMOOTHING = 0.3 # weight of the latest time in the moving averages of the update times
+
+# Debounces the edits of the text: flush() is called once no edits have been scheduled for a delay that adapts to how long an update of the preview takes (next to nothing for small documents, up to MAX_DEBOUNCE_DELAY for huge ones)
+class PreviewScheduler(QtCore.QObject):
+    def __init__(self, flush, parent: QtCore.QObject = None):
+        super().__init__(parent)
+        self.flush = flush # takes the edits on; called in the GUI thread
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.handleTimeout)
+
+        self.first_edit_time: float = None # of the edits that have not been flushed yet
+        # moving averages (in seconds) of the time flush() takes in the GUI thread & of the time the PreviewWorker takes to parse & render
+        self.flush_time = 0.0
+        self.render_time = 0.0
+
+    def getDelay(self):
+        return min(DEBOUNCE_FACTOR * (self.flush_time + self.render_time), MAX_DEBOUNCE_DELAY)
+
+    # Called for every edit; (re)starts the timer
+    def schedule(self):
+        now = time.monotonic()
+        if self.first_edit_time is None:
+            self.first_edit_time = now
+
+        delay = min(self.getDelay(), self.first_edit_time + MAX_STALENESS - now) # however long the burst of edits, the preview falls behind by at most MAX_STALENESS
+        self.timer.start(max(int(delay * 1000), 0)) # a delay of 0 still collapses the edits that are already waiting in the event queue (e.g. of a paste)
+
+    def handleTimeout(self):
+        self.first_edit_time = None
+
+        start_time = time.perf_counter()
+        self.flush()
+        self.flush_time += TIME_SMOOTHING * (time.perf_counter() - start_time - self.flush_time)
+
+    def recordRenderTime(self, seconds: float):
+        self.render_time += TIME_SMOOTHING * (seconds - self.render_time)
@@ -0,0 +1,124 @@
+# Normalizes HTML before the output of the renderer is compared with the expected output of a spec example, in the way of the normalization of the official spec test runner (spec_tests.py of commonmark-spec): whitespace is collapsed outside of <pre>, whitespace around block-level tags is dropped, attributes are sorted, character references are resolved and "<br />" & "<br>" are the same
+import html
+import re
+from html.entities import name2codepoint
+from html.parser import HTMLParser
+
+BLOCK_TAGS = {"article", "header", "aside", "hgroup", "blockquote", "hr", "iframe", "body", "li", "map", "button", "object", "canvas", "ol", "caption", "output", "col", "p", "colgroup", "pre", "dd", "progress", "div", "section", "dl", "table", "td", "dt", "tbody", "embed", "textarea", "fieldset", "tfoot", "figcaption", "th", "figure", "thead", "footer", "tr", "form", "ul", "h1", "h2", "h3", "h4", "h5", "h6", "video", "script", "style"}
+
+CHARACTERS_TO_ESCAPE = {"<": "&lt;", ">": "&gt;", "&": "&amp;", "\"": "&quot;"} # a reference to any other character is replaced by the character itself
+
+WHITESPACE_RE = re.compile(r"\s+")
+HTML_CHUNK_RE = re.compile(r"(<!\[CDATA\[.*?\]\]>|<[^>]*>|[^<]+)", re.DOTALL) # HTMLParser cannot handle CDATA sections; they are passed through as they are
+
+class NormalizingHTMLParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.output = []
+        self.last = "starttag" # kind of the last thing that has been parsed
+        self.last_tag = ""
+        self.in_pre = False
+
+    def stripOutput(self): # removes the whitespace at the end of the output so far
+        while self.output and not self.output[-1].strip():
+            self.output.pop()
+        if self.output:
+            self.output[-1] = self.output[-1].rstrip()
+
+    def handle_data(self, data):
+        after_tag = self.last in ["starttag", "endtag"]
+        after_block_tag = after_tag and self.last_tag in BLOCK_TAGS
+
+        if after_tag and self.last_tag == "br":
+            data = data.lstrip("\n")
+        if not self.in_pre:
+            data = WHITESPACE_RE.sub(" ", data)
+            if after_block_tag and self.last == "starttag":
+                data = data.lstrip()
+            elif after_block_tag and self.last == "endtag":
+                data = data.strip()
+
+        self.output.append(data)
+        self.last = "data"
+
+    def handle_starttag(self, tag, attributes):
+        if tag == "pre":
+            self.in_pre = True
+        if tag in BLOCK_TAGS:
+            self.stripOutput()
+
+        self.output.append("<" + tag)
+        for name, value in sorted(attributes, key=lambda attribute: (attribute[0], attribute[1] or "")):
+            if value is None:
+                self.output.append(" " + name)
+            else:
+                self.output.append(f" {name}=\"{html.escape(value, quote=True)}\"")
+        self.output.append(">")
+
+        self.last_tag = tag
+        self.last = "starttag"
+
+    def handle_startendtag(self, tag, attributes): # "<br />" is the same as "<br>"
+        self.handle_starttag(tag, attributes)
+        self.last = "endtag"
+
+    def handle_endtag(self, tag):
+        if tag == "pre":
+            self.in_pre = False
+        elif tag in BLOCK_TAGS:
+            self.stripOutput()
+
+        self.output.append(f"</{tag}>")
+        self.last_tag = tag
+        self.last = "endtag"
+
+    def handle_comment(self, data):
+        self.output.append(f"<!--{data}-->")
+        self.last = "comment"
+
+    def handle_decl(self, data):
+        self.output.append(f"<!{data}>")
+        self.last = "decl"
+
+    def unknown_decl(self, data):
+        self.output.append(f"<!{data}>")
+        self.last = "decl"
+
+    def handle_pi(self, data):
+        self.output.append(f"<?{data}>")
+        self.last = "pi"
+
+    def handle_entityref(self, name):
+        character = None
+        if name in name2codepoint:
+            character = chr(name2codepoint[name])
+        self.outputCharacter(character, f"&{name};")
+
+    def handle_charref(self, name):
+        try:
+            if name[:1] in ["x", "X"]:
+                character = chr(int(name[1:], 16))
+            else:
+                character = chr(int(name))
+        except (ValueError, OverflowError):
+            character = None
+        self.outputCharacter(character, f"&#{name};")
+
+    def outputCharacter(self, character: str, reference: str):
+        if character is None: # not a valid reference; kept as it is
+            self.output.append(reference)
+        else:
+            self.output.append(CHARACTERS_TO_ESCAPE.get(character, character))
+        self.last = "ref"
+
+def normalizeHTML(html_string: str):
+    parser = NormalizingHTMLParser()
+
+    for chunk in HTML_CHUNK_RE.finditer(html_string):
+        if chunk.group(0).startswith("<![CDATA["):
+            parser.output.append(chunk.group(0))
+        else:
+            parser.feed(chunk.group(0))
+    parser.close()
+
+    return "".join(parser.output)
@@ -0,0 +1,72 @@
+# Inputs that make naive Markdown parsers take quadratic (or worse) time, after the pathological tests of commonmark.js & cmark.
+# Every case generates its input for a size "n" and has a regular expression the (normalized) HTML has to match; the runner (see runner.py) parses each of them at several sizes, to find out how the time grows with the input
+import re
+
+class PathologicalCase:
+    def __init__(self, name: str, generate_input, generate_expected_pattern):
+        self.name = name
+        self.generate_input = generate_input # n -> Markdown input
+        self.generate_expected_pattern = generate_expected_pattern # n -> regular expression for the HTML
+
+    def getInput(self, n: int):
+        return self.generate_input(n)
+
+    def matchesExpected(self, n: int, normalized_html: str):
+        return re.fullmatch(self.generate_expected_pattern(n), normalized_html, re.DOTALL) is not None
+
+PATHOLOGICAL_CASES = [
+    PathologicalCase("nested strong emphasis",
+        lambda n: "*a **a " * n + "b** a*" * n,
+        lambda n: r"<p>" + r"(<em>a <strong>a ){%d}b(</strong> a</em>){%d}" % (n, n) + r"</p>"),
+    PathologicalCase("many emphasis closers without openers",
+        lambda n: "a_ " * n,
+        lambda n: r"<p>(a_ ){%d}a_</p>" % (n - 1)),
+    PathologicalCase("many emphasis openers without closers",
+        lambda n: "_a " * n,
+        lambda n: r"<p>(_a ){%d}_a</p>" % (n - 1)),
+    PathologicalCase("many link closers without openers",
+        lambda n: "a]" * n,
+        lambda n: r"<p>(a\]){%d}</p>" % n),
+    PathologicalCase("many link openers without closers",
+        lambda n: "[a" * n,
+        lambda n: r"<p>(\[a){%d}</p>" % n),
+    PathologicalCase("mismatched openers and closers",
+        lambda n: "*a_ " * n,
+        lambda n: r"<p>(\*a_ ){%d}\*a_</p>" % (n - 1)),
+    PathologicalCase("openers and closers multiple of 3",
+        lambda n: "a**b" + "c* " * n,
+        lambda n: r"<p>a\*\*b(c\* ){%d}c\*</p>" % (n - 1)),
+    PathologicalCase("link openers and emphasis closers",
+        lambda n: "[ a_" * n,
+        lambda n: r"<p>(\[ a_){%d}</p>" % n),
+    PathologicalCase("pattern [ (]( repeated",
+        lambda n: "[ (](" * n,
+        lambda n: r"<p>(\[ \(\]\(){%d}</p>" % n),
+    PathologicalCase("nested brackets",
+        lambda n: "[" * n + "a" + "]" * n,
+        lambda n: r"<p>\[{%d}a\]{%d}</p>" % (n, n)),
+    PathologicalCase("nested block quotes",
+        lambda n: "> " * n + "a\n",
+        lambda n: r"(<blockquote>){%d}<p>a</p>(</blockquote>){%d}" % (n, n)),
+    PathologicalCase("deeply nested lists",
+        lambda n: "".join(["  " * i + "* a\n" for i in range(n)]),
+        lambda n: r"(<ul><li>a){%d}(</li></ul>){%d}" % (n, n)),
+    PathologicalCase("backticks of increasing length",
+        lambda n: "".join(["e" + "`" * i for i in range(1, n // 8)]), # grows with the square of n
+        lambda n: r"<p>[e`]*</p>"),
+    PathologicalCase("unclosed links A",
+        lambda n: "[a](<b" * n,
+        lambda n: r"<p>(\[a\]\(&lt;b){%d}</p>" % n),
+    PathologicalCase("unclosed links B",
+        lambda n: "[a](b" * n,
+        lambda n: r"<p>(\[a\]\(b){%d}</p>" % n),
+    PathologicalCase("unclosed HTML comments",
+        lambda n: "</" + "<!--" * n,
+        lambda n: r"<p>&lt;/(&lt;!--){%d}</p>" % n),
+    PathologicalCase("many references to one definition",
+        lambda n: "[a]: /url\n\n" + "[a] " * n,
+        lambda n: r"<p>(<a href=\"/url\">a</a> ){%d}<a href=\"/url\">a</a></p>" % (n - 1)),
+    PathologicalCase("many link reference definitions",
+        lambda n: "".join([f"[{i}]: /url{i}\n" for i in range(n)]) + "\n[0]\n",
+        lambda n: r"<p><a href=\"/url0\">0</a></p>"),
+]
@@ -0,0 +1,8 @@
+# Inputs that the parser once got wrong (outside of the spec examples); the runner (see runner.py) checks them along with the spec examples, in a section of their own
+REGRESSION_SECTION = "Regressions"
+
+REGRESSION_EXAMPLES = [
+    # an inline link removes its destination from the raw content, which moves the backtick strings after it (see BacktickRunIndex in libs/inlines.py)
+    {"markdown": "`a` [x](/very/long/url) `b`\n", "html": "<p><code>a</code> <a href=\"/very/long/url\">x</a> <code>b</code></p>\n"},
+    {"markdown": "`a` [x](/u)```\n", "html": "<p><code>a</code> <a href=\"/u\">x</a>```</p>\n"},
+]
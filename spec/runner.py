@@ -0,0 +1,244 @@
+#!/bin/python3
+
+# Runs the examples of the CommonMark 0.30 spec (vendored in commonmark-0.30.json) together with the regression examples of regressions.py, and the pathological inputs of pathological.py through the Parser and the HTMLRenderer, and reports which examples pass, the differences of the (normalized) HTML of those that do not, and how long each of them took.
+# Every input is parsed in a separate worker process, which is killed (and replaced) once an input takes longer than --timeout. Pathological inputs are parsed at several sizes; a case whose time grows clearly faster than its size (when timed a second time, too) is flagged as super-linear (and makes the exit status 1).
+# Usage (from the root directory of this project): python -m spec.runner [--example N ...] [--section NAME] [--diffs] [--timeout SECONDS] [--size N] [--scales N] [--repeat N] [--spec-only | --pathological-only] [--json PATH]
+import argparse
+import difflib
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+from spec.normalize import normalizeHTML
+from spec.pathological import PATHOLOGICAL_CASES
+from spec.regressions import REGRESSION_EXAMPLES, REGRESSION_SECTION
+
+SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "commonmark-0.30.json")
+
+# outcome of an input
+PASSED = "pass"
+FAILED = "fail"
+ERROR = "error"
+TIMEOUT = "timeout"
+
+SUPER_LINEAR_EXPONENT = 1.4 # growth exponent of the time with the input length above which a case is flagged; see runPathologicalCases()
+TIMING_NOISE_FLOOR = 0.05 # seconds; cases that are faster than this at their largest size are never flagged, as their times are mostly noise
+
+def runWorker(connection):
+    from libs.parser import Parser
+    from libs.htmlrenderer import HTMLRenderer
+
+    while True:
+        markdown_input = connection.recv()
+        if markdown_input is None:
+            return
+
+        start_time = time.perf_counter()
+        try:
+            html_output = HTMLRenderer({"indent": 4, "include_html_backbone": False, "css_styling": "", "fragment_cache_size": 0}).render(Parser().parse(markdown_input))
+            connection.send((PASSED, html_output, time.perf_counter() - start_time))
+        except Exception as error: # "pass" only means that there has been no error here; whether the output is right is up to the runner
+            connection.send((ERROR, f"{type(error).__name__}: {error}", time.perf_counter() - start_time))
+
+# Parses & renders inputs in a worker process, so that an input that takes too long can be stopped
+class RenderWorker:
+    def __init__(self):
+        self.process = None
+        self.connection = None
+        self.start()
+
+    def start(self):
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=runWorker, args=(worker_connection,), daemon=True)
+        self.process.start()
+        worker_connection.close()
+
+    def restart(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+        self.start()
+
+    # Returns the outcome (PASSED meaning "no error"), the HTML (or the error message) and the time it took
+    def render(self, markdown_input: str, timeout: float):
+        start_time = time.perf_counter()
+        self.connection.send(markdown_input)
+
+        if not self.connection.poll(timeout):
+            self.restart()
+            return TIMEOUT, f"took longer than {timeout}s", time.perf_counter() - start_time
+
+        try:
+            return self.connection.recv()
+        except EOFError: # the worker crashed (e.g. the C stack overflowed)
+            self.restart()
+            return ERROR, "worker process crashed", time.perf_counter() - start_time
+
+    def close(self):
+        self.connection.send(None)
+        self.process.join()
+
+def loadSpecExamples(example_numbers: list[int], section: str):
+    with open(SPEC_PATH, "r", encoding="utf-8") as spec_file:
+        examples = json.load(spec_file)
+    examples += [{"example": f"r{index + 1}", "section": REGRESSION_SECTION, **example} for index, example in enumerate(REGRESSION_EXAMPLES)]
+
+    if example_numbers:
+        examples = [example for example in examples if example["example"] in example_numbers]
+    if section:
+        examples = [example for example in examples if section.lower() in example["section"].lower()]
+    return examples
+
+def getDiff(expected_html: str, actual_html: str):
+    # one tag per line, so that the diff points to the differing element
+    expected_lines = expected_html.replace("><", ">\n<").splitlines()
+    actual_lines = actual_html.replace("><", ">\n<").splitlines()
+    return "\n".join(difflib.unified_diff(expected_lines, actual_lines, "expected", "actual", lineterm=""))
+
+def runSpecExamples(worker: RenderWorker, examples: list[dict], timeout: float, show_diffs: bool):
+    results = []
+
+    for example in examples:
+        outcome, output, elapsed_time = worker.render(example["markdown"], timeout)
+
+        result = {"example": example["example"], "section": example["section"], "outcome": outcome, "time": elapsed_time}
+        if outcome == PASSED:
+            expected_html = normalizeHTML(example["html"])
+            actual_html = normalizeHTML(output)
+            if actual_html != expected_html:
+                result["outcome"] = FAILED
+                result["diff"] = getDiff(expected_html, actual_html)
+        else:
+            result["message"] = output
+        results.append(result)
+
+        if show_diffs and result["outcome"] != PASSED:
+            print(f"Example {example['example']} ({example['section']}): {result['outcome']}")
+            print("  " + repr(example["markdown"]))
+            print(result.get("diff") or result["message"])
+            print()
+
+    sections = {}
+    for result in results:
+        passed_count, total_count = sections.get(result["section"], (0, 0))
+        sections[result["section"]] = (passed_count + (result["outcome"] == PASSED), total_count + 1)
+
+    print(f"{'section':<40}{'passed':>10}")
+    for section, (passed_count, total_count) in sections.items():
+        print(f"{section:<40}{passed_count:>5} / {total_count}")
+
+    counts = {outcome: sum([result["outcome"] == outcome for result in results]) for outcome in [PASSED, FAILED, ERROR, TIMEOUT]}
+    print(f"\n{counts[PASSED]} of {len(results)} examples pass ({counts[FAILED]} wrong output, {counts[ERROR]} errors, {counts[TIMEOUT]} timeouts); total time {sum([result['time'] for result in results]):.2f}s")
+
+    print("\nslowest examples:")
+    for result in sorted(results, key=lambda result: result["time"], reverse=True)[:10]:
+        print(f"  example {result['example']:>4} ({result['section']}): {result['time'] * 1000:.1f}ms")
+
+    return results
+
+# Parses the case at the sizes n, 2n, 4n, ... (taking the fastest of "repeat" runs at every size); returns the lengths of the inputs, the times (None from a size that timed out on) and the outcome at the smallest size
+def timePathologicalCase(worker: RenderWorker, case, size: int, scale_count: int, repeat: int, timeout: float):
+    input_lengths = []
+    times = []
+    output_outcome = None
+    for scale in range(scale_count):
+        n = size * 2 ** scale
+        markdown_input = case.getInput(n)
+
+        best_time = None
+        for _ in range(repeat):
+            outcome, output, elapsed_time = worker.render(markdown_input, timeout)
+            if outcome == TIMEOUT:
+                best_time = None
+                break
+            if best_time is None or elapsed_time < best_time:
+                best_time = elapsed_time
+
+        if output_outcome is None: # the output is only checked at the smallest size
+            output_outcome = outcome
+            if outcome == PASSED and not case.matchesExpected(n, normalizeHTML(output)):
+                output_outcome = FAILED
+
+        input_lengths.append(len(markdown_input))
+        times.append(best_time)
+        if best_time is None:
+            break
+
+    return input_lengths, times, output_outcome
+
+# the growth exponent relates the times to the lengths of the inputs (not to n, as some inputs grow faster than n): 1 means linear, 2 quadratic
+def getGrowthExponent(input_lengths: list[int], times: list[float]):
+    return math.log(max(times[-1], 1e-9) / max(times[0], 1e-9)) / math.log(input_lengths[-1] / input_lengths[0])
+
+# Times every case of pathological.py; returns their results and whether any case has been flagged
+def runPathologicalCases(worker: RenderWorker, size: int, scale_count: int, repeat: int, timeout: float):
+    results = []
+    any_flagged = False
+
+    print(f"\n{'pathological case':<42}{'output':>8}" + "".join([f"{'n=' + str(size * 2 ** scale):>12}" for scale in range(scale_count)]) + f"{'growth':>9}")
+    for case in PATHOLOGICAL_CASES:
+        input_lengths, times, output_outcome = timePathologicalCase(worker, case, size, scale_count, repeat, timeout)
+
+        exponent = None
+        flag = ""
+        if times[-1] is None:
+            flag = "TIMEOUT"
+        elif len(times) > 1:
+            exponent = getGrowthExponent(input_lengths, times)
+            if exponent > SUPER_LINEAR_EXPONENT and times[-1] > TIMING_NOISE_FLOOR:
+                # a single slow run at the smallest size (or a garbage collection at the largest) can make a linear case look super-linear; the case is timed again, and the faster time at every size counts
+                _, retimed_times, _ = timePathologicalCase(worker, case, size, scale_count, repeat, timeout)
+                if None not in retimed_times:
+                    times = [min(elapsed_time, retimed_time) for elapsed_time, retimed_time in zip(times, retimed_times)]
+                    exponent = getGrowthExponent(input_lengths, times)
+
+            if exponent > SUPER_LINEAR_EXPONENT and times[-1] > TIMING_NOISE_FLOOR:
+                flag = "SUPER-LINEAR"
+        any_flagged = any_flagged or bool(flag)
+
+        time_columns = "".join([f"{'-' if elapsed_time is None else f'{elapsed_time:.3f}s':>12}" for elapsed_time in times]) + " " * 12 * (scale_count - len(times))
+        print(f"{case.name:<42}{output_outcome:>8}{time_columns}{'' if exponent is None else f'{exponent:.2f}':>9}  {flag}")
+        results.append({"case": case.name, "outcome": output_outcome, "input_lengths": input_lengths, "times": times, "growth_exponent": exponent, "flag": flag})
+
+    if any_flagged:
+        print(f"\nflagged: time grows with the input length with an exponent above {SUPER_LINEAR_EXPONENT} (1 = linear, 2 = quadratic), or an input timed out")
+    return results, any_flagged
+
+def main(argv: list[str] = None):
+    argument_parser = argparse.ArgumentParser(prog="python -m spec.runner", description="Runs the CommonMark spec examples and pathological inputs through the parser.")
+    argument_parser.add_argument("--example", type=int, nargs="+", help="run only these spec examples")
+    argument_parser.add_argument("--section", help="run only the spec examples of sections containing this")
+    argument_parser.add_argument("--diffs", action="store_true", help="print the differences of every example that does not pass")
+    argument_parser.add_argument("--timeout", type=float, default=5, help="seconds an input may take (default: 5)")
+    argument_parser.add_argument("--size", type=int, default=1000, help="smallest size of the pathological inputs (default: 1000)")
+    argument_parser.add_argument("--scales", type=int, default=3, help="number of sizes (each twice the last) the pathological inputs are run at (default: 3)")
+    argument_parser.add_argument("--repeat", type=int, default=3, help="number of runs at every size of which the fastest counts (default: 3)")
+    argument_parser.add_argument("--json", metavar="PATH", help="also write all results to this file")
+    only_group = argument_parser.add_mutually_exclusive_group()
+    only_group.add_argument("--spec-only", action="store_true", help="skip the pathological inputs")
+    only_group.add_argument("--pathological-only", action="store_true", help="skip the spec examples")
+    arguments = argument_parser.parse_args(argv)
+
+    worker = RenderWorker()
+    all_results = {}
+    any_flagged = False
+
+    try:
+        if not arguments.pathological_only:
+            all_results["spec"] = runSpecExamples(worker, loadSpecExamples(arguments.example, arguments.section), arguments.timeout, arguments.diffs)
+        if not arguments.spec_only and not arguments.example and not arguments.section:
+            all_results["pathological"], any_flagged = runPathologicalCases(worker, arguments.size, max(arguments.scales, 1), max(arguments.repeat, 1), arguments.timeout)
+    finally:
+        worker.close()
+
+    if arguments.json:
+        with open(arguments.json, "w") as results_file:
+            json.dump(all_results, results_file, indent=1)
+
+    return 1 if any_flagged else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+from PyQt5 import QtGui
+
+# Word, character & line counts of the editor's document for the status bar, kept up to date from QTextDocument.contentsChange: only the blocks (i.e. lines) an edit touches are counted again, whatever the size of the document.
+# Usage: statistics = TextStatistics(document); connect document.contentsChange to statistics.update; read statistics.words, .characters & .lines
+class TextStatistics:
+    def __init__(self, document: QtGui.QTextDocument):
+        self.document = document
+
+        # per block, in the order of the document
+        self.block_words: list[int] = []
+        self.block_characters: list[int] = []
+
+        self.words = 0
+        self.characters = 0 # including the line breaks, like len(document.toPlainText())
+        self.lines = 0 # like len(document.toPlainText().splitlines()), i.e. an empty last line does not count
+
+        self.recount()
+
+    def recount(self):
+        self.block_words = []
+        self.block_characters = []
+
+        block = self.document.begin()
+        while block.isValid():
+            block_text = block.text()
+            self.block_words.append(len(block_text.split()))
+            self.block_characters.append(len(block_text))
+            block = block.next()
+
+        self.updateTotals(sum(self.block_words), sum(self.block_characters))
+
+    def updateTotals(self, words: int, block_characters: int):
+        block_count = len(self.block_characters)
+
+        self.words = words
+        self.characters = block_characters + block_count - 1
+        self.lines = block_count - (self.block_characters[-1] == 0)
+
+    # Connected to QTextDocument.contentsChange
+    def update(self, position: int, chars_removed: int, chars_added: int):
+        # the blocks from the one containing "position" to the one containing the end of the edit replace those the edit touched before; all blocks before & after them are unchanged
+        first_block = self.document.findBlock(position)
+        last_block = self.document.findBlock(position + chars_added)
+        if not last_block.isValid(): # Qt reports some edits (e.g. setText()) including the final paragraph separator
+            last_block = self.document.lastBlock()
+        if not first_block.isValid():
+            self.recount()
+            return
+
+        first_index = first_block.blockNumber()
+        last_index = last_block.blockNumber()
+        old_last_index = last_index - (self.document.blockCount() - len(self.block_characters)) # index of the last touched block before the edit
+        if old_last_index < first_index - 1 or old_last_index >= len(self.block_characters): # does not add up; start over
+            self.recount()
+            return
+
+        new_words = []
+        new_characters = []
+        block = first_block
+        while block.isValid() and block.blockNumber() <= last_index:
+            block_text = block.text()
+            new_words.append(len(block_text.split()))
+            new_characters.append(len(block_text))
+            block = block.next()
+
+        words = self.words - sum(self.block_words[first_index:old_last_index + 1]) + sum(new_words)
+        block_characters = self.characters - (len(self.block_characters) - 1) - sum(self.block_characters[first_index:old_last_index + 1]) + sum(new_characters)
+
+        self.block_words[first_index:old_last_index + 1] = new_words
+        self.block_characters[first_index:old_last_index + 1] = new_characters
+        self.updateTotals(words, block_characters)